@@ -2,7 +2,7 @@ from typing import Any, List
 import logging
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 import os
 
@@ -126,12 +126,14 @@ def expand_numbered_elements(context: dict, template_schema) -> dict:
 
 @router.get("/", response_model=List[schemas.Document])
 def read_documents(
+    response: Response,
     db: Session = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
     search: str = None,
     start_date: str = None, # Using str to allow flexibility, or datetime if validated
     end_date: str = None,
+    cursor: str = None, # X-Next-Cursor of the previous page; replaces skip
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     logger.info(f"read_documents called by user {current_user.id}")
@@ -160,7 +162,8 @@ def read_documents(
                 limit=limit,
                 search=search,
                 start_date=start_dt,
-                end_date=end_dt
+                end_date=end_dt,
+                cursor=cursor
             )
             # logger.debug(f"superuser calling get_multi_filtered, found {len(documents)} docs")
         else:
@@ -171,10 +174,15 @@ def read_documents(
                 limit=limit,
                 search=search,
                 start_date=start_dt,
-                end_date=end_dt
+                end_date=end_dt,
+                cursor=cursor
             )
             # logger.debug(f"user calling get_multi_by_owner, found {len(documents)} docs")
+        if documents and len(documents) == limit:
+            response.headers["X-Next-Cursor"] = crud.document.next_cursor(db, documents[-1])
         return documents
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         import traceback
         import os
@@ -234,10 +242,10 @@ def create_document(
     file_path = os.path.join(output_dir, filename)
     
     try:
-        from docxtpl import DocxTemplate
-        
-        # Load template with docxtpl
-        doc = DocxTemplate(template.file_path)
+        from app.services.template_cache import template_cache
+
+        # Load template with docxtpl (parsed and compiled once, cloned per render)
+        doc = template_cache.get(template.id, template.file_path)
         
         # Context setup
         context = document_in.variables or {}
@@ -298,7 +306,7 @@ def create_document(
     ai_review_summary = None
     try:
         from app.utils import review_document_with_ai
-        review_result = review_document_with_ai(file_path)
+        review_result = review_document_with_ai(file_path, db=db)
         ai_review_summary = review_result.get("summary", "Revisado por IA.")
         logger.info(f"AI review completed: {ai_review_summary}")
     except Exception as ai_err:
@@ -326,38 +334,25 @@ def create_document(
 
 def convert_to_pdf(docx_path: str, pdf_path: str):
     """
-    Convert a docx file to pdf using LibreOffice (Linux) or docx2pdf (Windows).
+    Convert a docx file to pdf using the LibreOffice worker pool (Linux) or docx2pdf (Windows).
     """
     import platform
-    import subprocess
-    import sys
-    
+
     if platform.system() == "Linux":
-        # Check for LibreOffice
-        output_dir = os.path.dirname(pdf_path)
-        cmd = [
-            "libreoffice",
-            "--headless",
-            "--convert-to",
-            "pdf",
-            docx_path,
-            "--outdir",
-            output_dir
-        ]
-        logger.info(f"Converting to PDF using LibreOffice: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.error(f"LibreOffice failed: {result.stderr}")
-            raise HTTPException(status_code=500, detail=f"LibreOffice conversion failed: {result.stderr}")
-            
-        # Verify and rename if LibreOffice created a file with a different name but same base docx name
-        expected_output = os.path.join(output_dir, os.path.basename(docx_path).replace(".docx", ".pdf"))
-        if os.path.exists(expected_output) and expected_output != pdf_path:
-            import shutil
-            shutil.move(expected_output, pdf_path)
-        elif not os.path.exists(pdf_path):
-             raise HTTPException(status_code=500, detail="LibreOffice conversion completed but PDF was not found at expected location.")
-             
+        from app.services.office_pool import (
+            office_pool, OfficePoolError, OfficePoolBusy, OfficeConversionTimeout
+        )
+        logger.info(f"Converting to PDF using LibreOffice pool: {docx_path}")
+        try:
+            office_pool.convert(docx_path, pdf_path)
+        except OfficePoolBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except OfficeConversionTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except OfficePoolError as e:
+            logger.error(f"LibreOffice failed: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
     else:
         try:
             import pythoncom
@@ -379,6 +374,19 @@ def convert_to_pdf(docx_path: str, pdf_path: str):
                 pass
 
 
+def get_pdf_rendition(docx_path: str) -> str:
+    """
+    Return the cached PDF rendition of a docx file, converting it on a cache miss.
+    """
+    from app.services.office_pool import converter_version
+    from app.services.rendition_cache import rendition_cache
+
+    try:
+        return rendition_cache.get_pdf(docx_path, convert_to_pdf, converter_version())
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{id}/download")
 def download_document(
     *,
@@ -414,26 +422,15 @@ def download_document(
         
     # Handle PDF format
     if format.lower() == "pdf":
-        pdf_path = file_path.replace(".docx", ".pdf")
-        
-        # Check if PDF already exists (simple caching)
-        if not os.path.exists(pdf_path):
-            logger.info(f"Converting {file_path} to PDF...")
-            # We need to ensure the path is absolute for COM interop usually
-            abs_docx_path = os.path.abspath(file_path)
-            abs_pdf_path = os.path.abspath(pdf_path)
-            
-            convert_to_pdf(abs_docx_path, abs_pdf_path)
-            
-            if not os.path.exists(abs_pdf_path):
-                 raise HTTPException(status_code=500, detail="PDF file was not created after conversion attempt.")
-                 
-            logger.info(f"PDF created at {abs_pdf_path}")
-            
+        # Content-addressed rendition: converts only when the DOCX bytes changed
+        pdf_path = get_pdf_rendition(file_path)
+        filename = os.path.basename(file_path).replace(".docx", ".pdf")
+
         # Serve the PDF
         file_path = pdf_path
         media_type = 'application/pdf'
     else:
+        filename = os.path.basename(file_path)
         media_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
 
     try:
@@ -441,7 +438,6 @@ def download_document(
         with open(file_path, "rb") as f:
             file_content = f.read()
         
-        filename = os.path.basename(file_path)
         logger.info(f"Serving file: {filename} ({len(file_content)} bytes)")
         
         return Response(
@@ -478,103 +474,72 @@ def bulk_download_documents(
     """
     Download multiple documents in a ZIP file.
     """
-    import zipfile
-    import io
+    import itertools
     import traceback
-    from app.services.document_export import export_documents_to_excel
-    
+    from app.services.zip_stream import prefetch, stream_zip
+
     try:
+        documents = crud.document.get_multi_by_ids(
+            db, ids=bulk_in.ids, owner_id=None if current_user.is_superuser else current_user.id
+        )
+
+        files = []
+        for document in documents:
+            file_path = document.generated_file_path
+            if not file_path:
+                continue
+
+            if not os.path.isabs(file_path):
+                file_path = os.path.join(settings.BASE_DIR, file_path)
+
+            if os.path.exists(file_path):
+                files.append((document.title, file_path))
+
+        def arcname(title: str, extension: str) -> str:
+            return title if title.lower().endswith(extension) else title + extension
+
         if bulk_in.format == "pdf":
-            zip_buffer = io.BytesIO()
-            with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_STORED, False) as zip_file:
-                for doc_id in bulk_in.ids:
-                    document = crud.document.get(db, id=doc_id)
-                    if not document or not document.generated_file_path:
-                        continue
-                    
-                    if not current_user.is_superuser and (document.user_id != current_user.id):
-                        continue
-                    
-                    file_path = document.generated_file_path
-                    if not os.path.isabs(file_path):
-                        file_path = os.path.join(settings.BASE_DIR, file_path)
-                    
-                    if os.path.exists(file_path):
-                        pdf_path = file_path.replace(".docx", ".pdf")
-                        if not os.path.exists(pdf_path):
-                            logger.info(f"Bulk: Converting {file_path} to PDF...")
-                            try:
-                                convert_to_pdf(os.path.abspath(file_path), os.path.abspath(pdf_path))
-                            except Exception as conv_err:
-                                logger.error(f"Error converting {file_path} in bulk: {conv_err}")
-                                continue # Skip this one if conversion fails
-                        
-                        if os.path.exists(pdf_path):
-                            arcname = f"{document.title}"
-                            if not arcname.lower().endswith(".pdf"):
-                                arcname += ".pdf"
-                            zip_file.write(pdf_path, arcname)
-
-            zip_buffer.seek(0)
-            zip_content = zip_buffer.getvalue()
-            if not zip_content or len(zip_content) < 100:
-                raise HTTPException(status_code=400, detail="No se pudieron generar los PDFs o no hay archivos válidos.")
-            
-            filename = f"documentos_pdf_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-            return Response(
-                content=zip_content,
-                media_type='application/zip',
-                headers={
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Content-Length': str(len(zip_content))
-                }
-            )
+            import platform
 
-        # Default to Word (ZIP)
-        zip_buffer = io.BytesIO()
-        
-        # Use ZIP_STORED to avoid dependencies on zlib if there are issues
-        with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_STORED, False) as zip_file:
-            for doc_id in bulk_in.ids:
-                document = crud.document.get(db, id=doc_id)
-                if not document:
-                    continue
-                    
-                if not current_user.is_superuser and (document.user_id != current_user.id):
-                    continue
-                    
-                file_path = document.generated_file_path
-                if not file_path:
-                    continue
-
-                if not os.path.isabs(file_path):
-                    file_path = os.path.join(settings.BASE_DIR, file_path)
-                    
-                if os.path.exists(file_path):
-                    arcname = f"{document.title}"
-                    if not arcname.lower().endswith(".docx"):
-                        arcname += ".docx"
-                    zip_file.write(file_path, arcname)
-
-        zip_buffer.seek(0)
-        zip_content = zip_buffer.getvalue()
-        
-        if not zip_content or len(zip_content) < 100: # A zip with no files is ~22 bytes
+            def ensure_pdf(file_path):
+                try:
+                    return get_pdf_rendition(file_path)
+                except Exception as conv_err:
+                    logger.error(f"Error converting {file_path} in bulk: {conv_err}")
+                    return None # Skip this one if conversion fails
+
+            # Conversions run ahead of the ZIP writer on the office pool (Word/COM stays sequential)
+            max_workers = settings.PDF_WORKERS if platform.system() == "Linux" else 1
+            converted = prefetch(ensure_pdf, [path for _, path in files], max_workers)
+            entries = (
+                (arcname(title, ".pdf"), pdf_path)
+                for (title, _), (_, pdf_path) in zip(files, converted)
+            )
+            prefix = "documentos_pdf"
+            empty_detail = "No se pudieron generar los PDFs o no hay archivos válidos."
+        else:
+            # Default to Word (ZIP)
+            entries = ((arcname(title, ".docx"), path) for title, path in files)
+            prefix = "documentos"
+            empty_detail = "No se encontraron archivos válidos para descargar o no tienes permisos."
+
+        # Wait for the first usable file before answering, so an empty selection is still a 400
+        first_entry = next((entry for entry in entries if entry[1]), None)
+        if first_entry is None:
             logger.warning(f"Bulk download requested for IDs {bulk_in.ids} by user {current_user.id} but no files were added.")
-            raise HTTPException(status_code=400, detail="No se encontraron archivos válidos para descargar o no tienes permisos.")
+            raise HTTPException(status_code=400, detail=empty_detail)
 
-        filename = f"documentos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
-        
-        logger.info(f"Serving bulk ZIP: {filename} ({len(zip_content)} bytes) for user {current_user.id}")
-        
-        return Response(
-            content=zip_content,
+        filename = f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+
+        logger.info(f"Streaming bulk ZIP: {filename} ({len(files)} files) for user {current_user.id}")
+
+        return StreamingResponse(
+            stream_zip(itertools.chain([first_entry], entries)),
             media_type='application/zip',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Length': str(len(zip_content))
-            }
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         error_msg = traceback.format_exc()
         logger.error(f"Error in bulk download: {error_msg}")
@@ -609,10 +574,10 @@ def preview_document(
     import tempfile
     
     try:
-        from docxtpl import DocxTemplate
-        
-        # Load template with docxtpl
-        doc = DocxTemplate(template.file_path)
+        from app.services.template_cache import template_cache
+
+        # Load template with docxtpl (parsed and compiled once, cloned per render)
+        doc = template_cache.get(template.id, template.file_path)
         
         # Context setup
         context = document_in.variables or {}
@@ -1,25 +1,25 @@
 import os
-import shutil
 import uuid
+import hashlib
 import logging
 from typing import List, Any, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query, Header
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Header
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session, selectinload
 from app.api import deps
 from app.models.extractor import (
     ExtractorProject, DocType, DocField, ExtractedDocument, 
     DocumentFieldValue, ExtractionRule, ExtractionAlert, ExtractorSetting
 )
 from app.schemas import extractor as schemas
-from app.services.ai.ocr_service import ocr_service
-from app.services.ai.classifier import classifier_service
-from app.services.ai.extractor import extractor_service
 from app.services.ai.rules_engine import rules_engine
+from app.services.ai.pipeline import extraction_pipeline
 from app.services.ai.excel_export import (
-    export_project_to_excel, 
-    export_project_to_csv, 
-    export_project_to_json
+    stream_project_excel,
+    stream_project_csv,
+    stream_project_json,
+    stream_project_ndjson
 )
 from app.core.config import settings
 
@@ -156,105 +156,72 @@ def save_doc_fields(
 
 # --- Processing Logic (The "Arrollado") ---
 
-async def process_document_task(db_session_factory, doc_id: int, project_id: int):
-    # Usamos una sesión fresca para el background task
-    db = db_session_factory()
-    try:
-        doc = db.query(ExtractedDocument).filter(ExtractedDocument.id == doc_id).first()
-        project = db.query(ExtractorProject).filter(ExtractorProject.id == project_id).first()
-        if not doc or not project:
-            return
-
-        doc.status = "processing"
-        db.commit()
-
-        # 1. OCR
-        ocr_result = await ocr_service.get_text(db, doc.file_path)
-        doc.ocr_text = ocr_result["text"]
-        doc.page_count = ocr_result["page_count"]
-        doc.ocr_provider = ocr_result["provider"]
-        db.commit()
+def enqueue_documents(db: Session, doc_ids: List[int], project_id: int) -> int:
+    # Los trabajos quedan en la tabla processing_jobs; el pipeline los toma con
+    # concurrencia limitada por etapa y los retoma tras un reinicio.
+    extraction_pipeline.start(deps.SessionLocal)
+    return extraction_pipeline.enqueue(db, doc_ids, project_id)
 
-        # 2. Classification
-        doc_types = db.query(DocType).filter(DocType.project_id == project_id).order_by(DocType.sort_order).all()
-        if doc_types:
-            type_id, conf = await classifier_service.classify(
-                db, doc.ocr_text, doc_types, 
-                project.connector_llm, project.llm_classify_model
-            )
-            doc.doc_type_id = type_id
-            doc.classification_confidence = conf
-            db.commit()
-
-        # 3. Extraction
-        if doc.doc_type_id:
-            fields = db.query(DocField).filter(DocField.doc_type_id == doc.doc_type_id).all()
-            if fields:
-                doc_type = db.query(DocType).filter(DocType.id == doc.doc_type_id).first()
-                extracted_data = await extractor_service.extract_fields(
-                    db, doc.ocr_text, fields, doc_type,
-                    project.connector_llm, project.llm_extract_model
-                )
-                
-                # Guardar valores
-                for item in extracted_data:
-                    val = DocumentFieldValue(
-                        document_id=doc.id,
-                        field_id=item["field_id"],
-                        field_name=item["field_name"],
-                        field_label=item["field_label"],
-                        raw_value=item["raw_value"],
-                        normalized_value=item["raw_value"], # Por ahora igual
-                        confidence=item["confidence"],
-                        source_text=item["source_text"]
-                    )
-                    db.add(val)
-                db.commit()
-
-        # 4. Rules Engine
-        try:
-            await rules_engine.apply_rules(db, doc.id)
-        except Exception as re_err:
-            logger.error(f"Error applying rules: {re_err}")
-        # Refresh doc to get field values
-        db.refresh(doc)
-        
-        # Determine if everything is high confidence
-        is_high_confidence = True
-        threshold = project.confidence_threshold or 0.8
-        
-        if doc.classification_confidence and doc.classification_confidence < threshold:
-            is_high_confidence = False
-        
-        if doc.field_values:
-            for val in doc.field_values:
-                if val.confidence and val.confidence < threshold:
-                    is_high_confidence = False
-                    break
-        else:
-            # If no fields were extracted but were expected, maybe it needs review
-            is_high_confidence = False
-
-        if is_high_confidence:
-            doc.review_status = "approved"
-        else:
-            doc.review_status = "pending"
-
-        doc.status = "completed"
-        db.commit()
+@router.get("/projects/{id}/queue")
+def read_project_queue(
+    id: int,
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    """Processing jobs of the project grouped by status."""
+    project = db.query(ExtractorProject).filter(ExtractorProject.id == id, ExtractorProject.owner_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return extraction_pipeline.stats(db, project_id=id)
 
-    except Exception as e:
-        logger.error(f"Error processing document {doc_id}: {e}")
-        doc.status = "error"
-        doc.error_message = str(e)
-        db.commit()
-    finally:
-        db.close()
+@router.get("/projects/{id}/classification-stats")
+def read_classification_stats(
+    id: int,
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    """Classified documents grouped by source (llm, local_keyword, local_tfidf)."""
+    project = db.query(ExtractorProject).filter(ExtractorProject.id == id, ExtractorProject.owner_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    rows = db.query(
+        ExtractedDocument.classification_source, func.count(ExtractedDocument.id)
+    ).filter(
+        ExtractedDocument.project_id == id,
+        ExtractedDocument.doc_type_id.isnot(None),
+    ).group_by(ExtractedDocument.classification_source).all()
+    by_source = {}
+    for source, count in rows:
+        # Documentos anteriores a la columna: siempre los clasificó el LLM
+        by_source[source or "llm"] = by_source.get(source or "llm", 0) + count
+    total = sum(by_source.values())
+    local = sum(count for source, count in by_source.items() if source.startswith("local"))
+    return {
+        "total": total,
+        "by_source": by_source,
+        "llm_calls_saved": local,
+        "local_rate": (local / total) if total else 0.0,
+    }
+
+@router.get("/projects/{id}/search", response_model=List[schemas.SearchHit])
+def search_project_documents(
+    id: int,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    """Full-text search over the OCR text and extracted values of a project, best matches first."""
+    from app.services.ai.search import document_search
+    project = db.query(ExtractorProject).filter(ExtractorProject.id == id, ExtractorProject.owner_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return document_search.search(db, id, q, limit=limit, offset=offset)
 
 @router.post("/projects/{id}/upload")
 async def upload_documents(
     id: int,
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     db: Session = Depends(deps.get_db),
     current_user = Depends(deps.get_current_extractor_user),
@@ -283,8 +250,12 @@ async def upload_documents(
         saved_name = f"{file_id}{ext}"
         file_path = os.path.join(upload_dir, saved_name)
         
+        # Copia por bloques calculando el hash del contenido en la misma pasada
+        digest = hashlib.sha256()
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            for chunk in iter(lambda: file.file.read(1024 * 1024), b""):
+                digest.update(chunk)
+                buffer.write(chunk)
         
         doc = ExtractedDocument(
             project_id=id,
@@ -292,6 +263,7 @@ async def upload_documents(
             file_name=file.filename,
             file_ext=ext,
             file_size=os.path.getsize(file_path),
+            file_hash=digest.hexdigest(),
             status="pending"
         )
         db.add(doc)
@@ -299,8 +271,8 @@ async def upload_documents(
         db.refresh(doc)
         docs_created.append(doc)
 
-        # Encolar procesamiento
-        background_tasks.add_task(process_document_task, deps.SessionLocal, doc.id, id)
+    # Encolar procesamiento
+    enqueue_documents(db, [d.id for d in docs_created], id)
 
     msg = f"{len(docs_created)} archivos subidos y en cola"
     if docs_skipped:
@@ -332,7 +304,6 @@ def update_project(
 @router.post("/projects/{id}/process-folder")
 async def process_project_folder(
     id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     current_user = Depends(deps.get_current_extractor_user),
 ) -> Any:
@@ -351,6 +322,9 @@ async def process_project_folder(
         full_pattern = os.path.join(project.root_folder, pattern)
         files.extend(glob.glob(full_pattern, recursive=True))
 
+    from starlette.concurrency import run_in_threadpool
+    from app.utils import compute_file_hash
+
     docs_created = []
     for file_path in files:
         # Evitar duplicados (por ruta)
@@ -358,12 +332,14 @@ async def process_project_folder(
         if existing:
             continue
 
+        # El hash se calcula en un hilo para no bloquear el event loop con archivos grandes
         doc = ExtractedDocument(
             project_id=id,
             file_path=file_path,
             file_name=os.path.basename(file_path),
             file_ext=os.path.splitext(file_path)[1],
             file_size=os.path.getsize(file_path),
+            file_hash=await run_in_threadpool(compute_file_hash, file_path),
             status="pending",
             review_status="none"
         )
@@ -371,8 +347,8 @@ async def process_project_folder(
         db.commit()
         db.refresh(doc)
         docs_created.append(doc)
-        background_tasks.add_task(process_document_task, deps.SessionLocal, doc.id, id)
 
+    enqueue_documents(db, [d.id for d in docs_created], id)
     return {"message": f"Started processing {len(docs_created)} new files", "count": len(docs_created)}
 
 # --- Results & Review ---
@@ -403,7 +379,72 @@ def read_project_documents(
     db: Session = Depends(deps.get_db),
     current_user = Depends(deps.get_current_extractor_user),
 ) -> Any:
-    return db.query(ExtractedDocument).filter(ExtractedDocument.project_id == id).all()
+    return db.query(ExtractedDocument).options(
+        selectinload(ExtractedDocument.field_values)
+    ).filter(ExtractedDocument.project_id == id).all()
+
+@router.get("/projects/{id}/documents/summary", response_model=List[schemas.ExtractedDocumentSummary])
+def read_project_documents_summary(
+    id: int,
+    response: Response,
+    status: Optional[str] = None,
+    review_status: Optional[str] = None,
+    doc_type_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    """
+    Lightweight document list: only the list columns plus alert counts
+    aggregated in SQL. The total before pagination goes in X-Total-Count;
+    OCR text and field values stay on GET /documents/{doc_id}.
+    """
+    project = db.query(ExtractorProject).filter(ExtractorProject.id == id, ExtractorProject.owner_id == current_user.id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    filters = [ExtractedDocument.project_id == id]
+    if status:
+        filters.append(ExtractedDocument.status == status)
+    if review_status:
+        filters.append(ExtractedDocument.review_status == review_status)
+    if doc_type_id is not None:
+        filters.append(ExtractedDocument.doc_type_id == doc_type_id)
+
+    alerts = db.query(
+        ExtractionAlert.document_id.label("document_id"),
+        func.count(ExtractionAlert.id).label("alert_count"),
+        func.sum(case((ExtractionAlert.is_resolved.is_(True), 0), else_=1)).label("open_alert_count"),
+    ).join(
+        ExtractedDocument, ExtractedDocument.id == ExtractionAlert.document_id
+    ).filter(*filters).group_by(ExtractionAlert.document_id).subquery()
+
+    rows = db.query(
+        ExtractedDocument.id,
+        ExtractedDocument.project_id,
+        ExtractedDocument.file_name,
+        ExtractedDocument.file_ext,
+        ExtractedDocument.file_size,
+        ExtractedDocument.page_count,
+        ExtractedDocument.status,
+        ExtractedDocument.review_status,
+        ExtractedDocument.doc_type_id,
+        DocType.name.label("doc_type_name"),
+        ExtractedDocument.classification_confidence,
+        ExtractedDocument.classification_source,
+        ExtractedDocument.error_message,
+        ExtractedDocument.created_at,
+        ExtractedDocument.updated_at,
+        func.coalesce(alerts.c.alert_count, 0).label("alert_count"),
+        func.coalesce(alerts.c.open_alert_count, 0).label("open_alert_count"),
+    ).outerjoin(
+        DocType, DocType.id == ExtractedDocument.doc_type_id
+    ).outerjoin(
+        alerts, alerts.c.document_id == ExtractedDocument.id
+    ).filter(*filters).order_by(ExtractedDocument.id).offset(skip).limit(limit).all()
+
+    response.headers["X-Total-Count"] = str(db.query(func.count(ExtractedDocument.id)).filter(*filters).scalar())
+    return rows
 
 @router.get("/projects/{id}/export")
 def export_project(
@@ -430,7 +471,7 @@ def download_project(
     from pydantic import ValidationError
     from app.core import security as core_security
     from app.schemas.token import TokenPayload as TP
-    from app.models.user import User as UserModel
+    from app.services.user_cache import user_cache
     
     try:
         payload = jose_jwt.decode(token, settings.SECRET_KEY, algorithms=[core_security.ALGORITHM])
@@ -438,7 +479,7 @@ def download_project(
     except (JWTError, ValidationError):
         raise HTTPException(status_code=401, detail="Invalid token")
         
-    user = db.query(UserModel).filter(UserModel.id == token_data.sub).first()
+    user = user_cache.get(db, token_data.sub)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
         
@@ -449,45 +490,45 @@ def download_project(
     return _do_export(db, id, format, filter)
 
 
+EXPORT_FORMATS = {
+    "excel": (stream_project_excel, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv": (stream_project_csv, "text/csv", "csv"),
+    "json": (stream_project_json, "application/json", "json"),
+    "ndjson": (stream_project_ndjson, "application/x-ndjson", "ndjson"),
+}
+
+def _stream_export(db: Session, stream, project_id: int, filter: str):
+    # The response is written after the request session is closed: use our own
+    session = Session(bind=db.get_bind())
+    try:
+        yield from stream(session, project_id, filter)
+    finally:
+        session.close()
+
 def _do_export(db: Session, project_id: int, format: str, filter: str):
     """Shared export logic used by both endpoints."""
     project = db.query(ExtractorProject).filter(ExtractorProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    if format == "excel":
-        file_data = export_project_to_excel(db, project_id, filter)
-        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        ext = "xlsx"
-    elif format == "csv":
-        file_data = export_project_to_csv(db, project_id, filter)
-        media_type = "text/csv"
-        ext = "csv"
-    elif format == "json":
-        file_data = export_project_to_json(db, project_id, filter)
-        media_type = "application/json"
-        ext = "json"
-    else:
+    if format not in EXPORT_FORMATS:
         raise HTTPException(status_code=400, detail="Unsupported format")
+    stream, media_type, ext = EXPORT_FORMATS[format]
 
     from urllib.parse import quote
     filename = f"reporte_simplaw_{project_id}.{ext}"
     
-    from fastapi import Response
-    content = file_data.getvalue()
-    
     # Safe filename for Content-Disposition (RFC 6266)
     encoded_filename = quote(filename)
     
-    logger.info(f"EXPORT INICIADO: Proyecto={project_id}, Formato={format}, Tamaño={len(content)} bytes")
+    logger.info(f"EXPORT INICIADO: Proyecto={project_id}, Formato={format}")
     
-    return Response(
-        content=content,
+    return StreamingResponse(
+        _stream_export(db, stream, project_id, filter),
         media_type=media_type,
         headers={
             "Content-Disposition": f'attachment; filename="{filename}"; filename*=UTF-8\'\'{encoded_filename}',
-            "Content-Length": str(len(content)),
-            "Access-Control-Expose-Headers": "Content-Disposition, Content-Length"
+            "Access-Control-Expose-Headers": "Content-Disposition"
         }
     )
 
@@ -524,6 +565,20 @@ def create_rule(
     db.refresh(rule)
     return rule
 
+@router.post("/projects/{project_id}/rules/apply")
+def apply_project_rules(
+    project_id: int,
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    """Re-run the simple (non-LLM) rules over every document of the project."""
+    project = db.query(ExtractorProject).filter(
+        ExtractorProject.id == project_id, ExtractorProject.owner_id == current_user.id
+    ).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return {"alerts_created": rules_engine.apply_rules_batch(db, project_id)}
+
 @router.put("/rules/{rule_id}", response_model=schemas.ExtractionRule)
 def update_rule(
     rule_id: int,
@@ -579,8 +634,29 @@ def save_setting(
     db.add(setting)
     db.commit()
     db.refresh(setting)
+    from app.services.ai.settings_cache import settings_cache
+    settings_cache.invalidate()
     return setting
 
+@router.get("/llm-cache/stats")
+def read_llm_cache_stats(
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    """Size and hit rate of the persistent LLM response cache."""
+    from app.services.ai.llm_cache import llm_cache
+    return llm_cache.stats(db)
+
+@router.delete("/llm-cache")
+def clear_llm_cache(
+    db: Session = Depends(deps.get_db),
+    current_user = Depends(deps.get_current_extractor_user),
+) -> Any:
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    from app.services.ai.llm_cache import llm_cache
+    return {"removed": llm_cache.clear(db)}
+
 @router.get("/documents/{doc_id}/file")
 def serve_document_file(
     doc_id: int,
@@ -593,7 +669,7 @@ def serve_document_file(
     from pydantic import ValidationError
     from app.core import security as core_security
     from app.schemas.token import TokenPayload as TP
-    from app.models.user import User as UserModel
+    from app.services.user_cache import user_cache
     
     final_token = token
     if not final_token and authorization:
@@ -610,7 +686,7 @@ def serve_document_file(
     except (JWTError, ValidationError):
         raise HTTPException(status_code=401, detail="Invalid token")
 
-    user = db.query(UserModel).filter(UserModel.id == token_data.sub).first()
+    user = user_cache.get(db, token_data.sub)
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
         
@@ -628,7 +704,6 @@ def serve_document_file(
 @router.post("/documents/{doc_id}/reprocess")
 async def reprocess_document(
     doc_id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     current_user = Depends(deps.get_current_extractor_user),
 ) -> Any:
@@ -651,13 +726,12 @@ async def reprocess_document(
     db.commit()
     
     # Enqueue processing
-    background_tasks.add_task(process_document_task, deps.SessionLocal, doc.id, doc.project_id)
+    enqueue_documents(db, [doc.id], doc.project_id)
     
     return {"message": "Document reprocessing started"}
 @router.post("/projects/{id}/reprocess")
 async def reprocess_project_documents(
     id: int,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(deps.get_db),
     current_user = Depends(deps.get_current_extractor_user),
 ) -> Any:
@@ -680,8 +754,7 @@ async def reprocess_project_documents(
     db.commit()
     
     # Enqueue processing for each
-    for doc in docs:
-        background_tasks.add_task(process_document_task, deps.SessionLocal, doc.id, id)
+    enqueue_documents(db, [d.id for d in docs], id)
     
     return {"message": f"Reprocessing started for {len(docs)} documents"}
 @router.delete("/documents/{doc_id}")
@@ -100,6 +100,9 @@ def delete_template(
         raise HTTPException(status_code=400, detail="Not enough permissions")
         
     template = crud.template.remove(db, id=id)
+
+    from app.services.template_cache import template_cache
+    template_cache.invalidate(id)
     return template
 
 
@@ -246,7 +249,7 @@ def analyze_template_ai(
     try:
         from app.utils import extract_text_from_file, generate_template_proposal
         text = extract_text_from_file(template.file_path)
-        analysis = generate_template_proposal(text, user_prompt=request.user_prompt)
+        analysis = generate_template_proposal(text, user_prompt=request.user_prompt, db=db)
         return analysis
     except Exception as e:
         import traceback
@@ -289,7 +292,7 @@ def auto_condition_template_ai(
             return {"conditional_blocks": []}
             
         # 2. IA agrupa y devuelve bloques
-        blocks = generate_conditional_blocks_proposal(indexed_text, user_prompt=request.user_prompt)
+        blocks = generate_conditional_blocks_proposal(indexed_text, user_prompt=request.user_prompt, db=db)
         
         # 3. Inyectar modificaciones en el Word
         if blocks:
@@ -394,7 +397,8 @@ def batch_generate_documents(
     current_user: models.User = Depends(deps.get_current_active_user),
 ) -> Any:
     """
-    Generate multiple documents from an uploaded Excel file.
+    Start generating documents from an uploaded Excel file.
+    Returns a job immediately; poll /batch-generate/{job_id} for progress.
     """
     template = crud.template.get(db, id=id)
     if not template:
@@ -402,107 +406,72 @@ def batch_generate_documents(
         
     if not os.path.exists(template.file_path):
         raise HTTPException(status_code=404, detail="Template file not found on disk")
-        
-    import openpyxl
-    from docxtpl import DocxTemplate
-    from datetime import datetime
-    
-    from io import BytesIO
-    import logging
-    logger = logging.getLogger(__name__)
 
-    try:
-        # Read file into memory to avoid potential issues with SpooledTemporaryFile
-        file_content = file.file.read()
-        if not file_content:
-             raise HTTPException(status_code=400, detail="El archivo Excel está vacío.")
-             
-        wb = openpyxl.load_workbook(BytesIO(file_content))
-        ws = wb.active
-        
-        headers = [cell.value for cell in ws[1]]
-        
-        # Identify variable columns
-        # We expect headers to match variable names. "output_filename" is special.
-        
-        results = {
-            "total": 0,
-            "success": 0,
-            "failed": 0,
-            "generated_docs": [],
-            "errors": []
-        }
-        
-        output_dir = settings.GENERATED_DOCS_DIR
-        
-        for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), 2):
-            if not any(row): continue # Skip empty rows
-            
-            results["total"] += 1
-            
-            row_data = dict(zip(headers, row))
-            
-            # Extract context variables - Filter out None keys and output_filename
-            context = {str(k): v for k, v in row_data.items() if k is not None and k != "output_filename" and v is not None}
-            
-            # Convert Sí/No to Boolean for conditional blocks
-            for k, v in list(context.items()):
-                if isinstance(v, str):
-                    if v.strip().lower() in ('sí', 'si', 'yes', 'true'):
-                        context[k] = True
-                    elif v.strip().lower() in ('no', 'false'):
-                        context[k] = False
-
-            # Ensure output_filename is handled correctly if it exists
-            custom_filename = row_data.get("output_filename")
-            if not custom_filename:
-                safe_title = "".join([c for c in template.title if c.isalnum() or c in (' ', '-', '_')]).strip()
-                custom_filename = f"{safe_title}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{row_idx}"
-            
-            safe_filename = "".join([c for c in str(custom_filename) if c.isalnum() or c in (' ', '-', '_', '.')]).strip()
-            if not safe_filename.endswith(".docx"):
-                safe_filename += ".docx"
-                
-            full_filename = f"{current_user.id}_{id}_{safe_filename}"
-            file_path = os.path.join(output_dir, full_filename)
-            
-            try:
-                # 1. Render Document
-                if not template.file_path.lower().endswith(".docx"):
-                    raise Exception(f"La generación masiva solo es compatible con plantillas Word (.docx). Esta plantilla es {os.path.splitext(template.file_path)[1]}")
-
-                doc = DocxTemplate(template.file_path)
-                
-                # Default context additions
-                if "date" not in context:
-                     from datetime import timezone, timedelta
-                     bogota_tz = timezone(timedelta(hours=-5))
-                     context["date"] = datetime.now(bogota_tz).strftime("%Y-%m-%d")
-                     
-                doc.render(context)
-                doc.save(file_path)
-                
-                # 2. Save to DB
-                db_doc = models.Document(
-                    title=str(custom_filename).replace(".docx", ""),
-                    template_id=id,
-                    user_id=current_user.id,
-                    generated_file_path=file_path
-                )
-                db.add(db_doc)
-                db.commit()
-                db.refresh(db_doc)
-                
-                results["success"] += 1
-                results["generated_docs"].append({"id": db_doc.id, "title": db_doc.title})
-                
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                results["failed"] += 1
-                results["errors"].append(f"Row {row_idx}: {str(e)}")
-                
-        return results
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Error processing Excel file: {str(e)}")
+    if not template.file_path.lower().endswith(".docx"):
+        raise HTTPException(
+            status_code=400,
+            detail=f"La generación masiva solo es compatible con plantillas Word (.docx). Esta plantilla es {os.path.splitext(template.file_path)[1]}"
+        )
+
+    # Read file into memory to avoid potential issues with SpooledTemporaryFile
+    file_content = file.file.read()
+    if not file_content:
+        raise HTTPException(status_code=400, detail="El archivo Excel está vacío.")
+
+    from app.services.batch_generation import batch_generation_service
+    job = batch_generation_service.submit(deps.SessionLocal, template, current_user.id, file_content)
+    return job.to_dict()
+
+
+def _get_batch_job(template_id: int, job_id: str, current_user: models.User):
+    from app.services.batch_generation import batch_generation_service
+
+    job = batch_generation_service.get_job(job_id)
+    if not job or job.template_id != template_id:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    if not current_user.is_superuser and job.user_id != current_user.id:
+        raise HTTPException(status_code=400, detail="Not enough permissions")
+    return job
+
+
+@router.get("/{id}/batch-generate/{job_id}", response_model=dict)
+def read_batch_job(
+    *,
+    id: int,
+    job_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Get progress and per-row results of a batch generation job.
+    """
+    return _get_batch_job(id, job_id, current_user).to_dict()
+
+
+@router.get("/{id}/batch-generate/{job_id}/stream")
+async def stream_batch_job(
+    *,
+    id: int,
+    job_id: str,
+    current_user: models.User = Depends(deps.get_current_active_user),
+) -> Any:
+    """
+    Stream job progress as NDJSON, one line per change, until the job ends.
+    """
+    import json
+    import asyncio
+    from fastapi.responses import StreamingResponse
+
+    job = _get_batch_job(id, job_id, current_user)
+
+    async def progress():
+        last_version = -1
+        while True:
+            finished = job.finished
+            if job.version != last_version:
+                last_version = job.version
+                yield json.dumps(job.to_dict()) + "\n"
+            if finished:
+                break
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(progress(), media_type="application/x-ndjson")
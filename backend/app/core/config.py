@@ -22,7 +22,87 @@ class Settings:
     
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
-    
+
+    # LibreOffice worker pool used for DOCX -> PDF conversion
+    PDF_WORKERS: int = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PDF_WORKER_MAX_JOBS: int = int(os.getenv("PDF_WORKER_MAX_JOBS", "200"))
+    PDF_JOB_TIMEOUT: int = int(os.getenv("PDF_JOB_TIMEOUT", "120"))
+    PDF_QUEUE_SIZE: int = int(os.getenv("PDF_QUEUE_SIZE", "32"))
+    PDF_CACHE_MAX_MB: int = int(os.getenv("PDF_CACHE_MAX_MB", "1024"))
+
+    # Compiled docxtpl templates kept in memory per process
+    TEMPLATE_CACHE_SIZE: int = int(os.getenv("TEMPLATE_CACHE_SIZE", "64"))
+
+    # Process pool used by batch generation from Excel
+    BATCH_WORKERS: int = int(os.getenv("BATCH_WORKERS", str(os.cpu_count() or 1)))
+    BATCH_CHUNK_SIZE: int = int(os.getenv("BATCH_CHUNK_SIZE", "25"))
+
+    # Extraction pipeline: documents in flight and concurrency per stage
+    PIPELINE_MAX_IN_FLIGHT: int = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "16"))
+    PIPELINE_OCR_CONCURRENCY: int = int(os.getenv("PIPELINE_OCR_CONCURRENCY", "8"))
+    PIPELINE_CLASSIFY_CONCURRENCY: int = int(os.getenv("PIPELINE_CLASSIFY_CONCURRENCY", "8"))
+    PIPELINE_EXTRACT_CONCURRENCY: int = int(os.getenv("PIPELINE_EXTRACT_CONCURRENCY", "4"))
+    PIPELINE_RULES_CONCURRENCY: int = int(os.getenv("PIPELINE_RULES_CONCURRENCY", "4"))
+    PIPELINE_POLL_SECONDS: float = float(os.getenv("PIPELINE_POLL_SECONDS", "2"))
+    PIPELINE_STALE_SECONDS: int = int(os.getenv("PIPELINE_STALE_SECONDS", "900"))
+    PIPELINE_MAX_ATTEMPTS: int = int(os.getenv("PIPELINE_MAX_ATTEMPTS", "3"))
+    # Concurrent classifications grouped into one LLM request
+    CLASSIFY_BATCH_SIZE: int = int(os.getenv("CLASSIFY_BATCH_SIZE", "8"))
+    CLASSIFY_BATCH_WINDOW_SECONDS: float = float(os.getenv("CLASSIFY_BATCH_WINDOW_SECONDS", "0.5"))
+    # Long documents are extracted in overlapping chunks and merged
+    EXTRACT_CHUNK_THRESHOLD_CHARS: int = int(os.getenv("EXTRACT_CHUNK_THRESHOLD_CHARS", "40000"))
+    EXTRACT_CHUNK_CHARS: int = int(os.getenv("EXTRACT_CHUNK_CHARS", "20000"))
+    EXTRACT_CHUNK_OVERLAP_CHARS: int = int(os.getenv("EXTRACT_CHUNK_OVERLAP_CHARS", "1500"))
+    EXTRACT_CHUNK_CONCURRENCY: int = int(os.getenv("EXTRACT_CHUNK_CONCURRENCY", "4"))
+    EXTRACT_MIN_CHUNK_CONFIDENCE: float = float(os.getenv("EXTRACT_MIN_CHUNK_CONFIDENCE", "0.6"))
+
+    # BM25 passage retrieval per field group before extraction
+    RETRIEVAL_ENABLED: bool = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+    RETRIEVAL_MIN_CHARS: int = int(os.getenv("RETRIEVAL_MIN_CHARS", "15000"))
+    RETRIEVAL_PASSAGE_CHARS: int = int(os.getenv("RETRIEVAL_PASSAGE_CHARS", "1200"))
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+    RETRIEVAL_FIELDS_PER_GROUP: int = int(os.getenv("RETRIEVAL_FIELDS_PER_GROUP", "5"))
+    RETRIEVAL_MAX_CONTEXT_CHARS: int = int(os.getenv("RETRIEVAL_MAX_CONTEXT_CHARS", "15000"))
+    # Mejor puntaje BM25 desde el cual un "No encontrado" en los pasajes se acepta
+    RETRIEVAL_MIN_SCORE: float = float(os.getenv("RETRIEVAL_MIN_SCORE", "1.0"))
+
+    # Documents evaluated per pass when rules run over a whole project
+    RULES_BATCH_SIZE: int = int(os.getenv("RULES_BATCH_SIZE", "2000"))
+    RULES_LLM_CONCURRENCY: int = int(os.getenv("RULES_LLM_CONCURRENCY", "4"))
+
+    # Project exports are read and written in windows of documents
+    EXPORT_WINDOW_SIZE: int = int(os.getenv("EXPORT_WINDOW_SIZE", "500"))
+    EXPORT_CHUNK_BYTES: int = int(os.getenv("EXPORT_CHUNK_BYTES", str(256 * 1024)))
+
+    # Lexical pre-classifier that runs before the LLM
+    LOCAL_CLASSIFY_HEAD_CHARS: int = int(os.getenv("LOCAL_CLASSIFY_HEAD_CHARS", "3000"))
+    LOCAL_CLASSIFY_KEYWORD_CHARS: int = int(os.getenv("LOCAL_CLASSIFY_KEYWORD_CHARS", "400"))
+    LOCAL_CLASSIFY_MIN_SIMILARITY: float = float(os.getenv("LOCAL_CLASSIFY_MIN_SIMILARITY", "0.1"))
+    LOCAL_CLASSIFY_MAX_EXAMPLES: int = int(os.getenv("LOCAL_CLASSIFY_MAX_EXAMPLES", "500"))
+    OCR_WORKERS: int = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+    OCR_MIN_PAGES_PER_SHARD: int = int(os.getenv("OCR_MIN_PAGES_PER_SHARD", "16"))
+    AZURE_OCR_CONCURRENCY: int = int(os.getenv("AZURE_OCR_CONCURRENCY", "4"))
+    AZURE_OCR_POLL_SECONDS: float = float(os.getenv("AZURE_OCR_POLL_SECONDS", "1"))
+    AZURE_OCR_RETRY_TOTAL: int = int(os.getenv("AZURE_OCR_RETRY_TOTAL", "6"))
+    # "page": only low-text pages go to Azure; "document": whole PDF as before
+    OCR_ROUTING_MODE: str = os.getenv("OCR_ROUTING_MODE", "page")
+
+    # Users resolved from a token are reused for a few seconds
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_MAX_ENTRIES: int = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+
+    # extractor_settings is read from memory; the TTL picks up changes made by other processes
+    SETTINGS_CACHE_TTL_SECONDS: float = float(os.getenv("SETTINGS_CACHE_TTL_SECONDS", "60"))
+
+    # Pooled keep-alive connections per LLM client
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+    # Persistent cache of deterministic LLM completions
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_TTL_HOURS: int = int(os.getenv("LLM_CACHE_TTL_HOURS", str(24 * 30)))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+    LLM_CACHE_MAX_TEMPERATURE: float = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.2"))
+
     # Resolved base directory (backend/)
     BASE_DIR: str = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     
@@ -32,6 +112,12 @@ class Settings:
         os.makedirs(path, exist_ok=True)
         return path
     
+    @property
+    def RENDITIONS_DIR(self) -> str:
+        path = os.path.join(self.GENERATED_DOCS_DIR, ".renditions")
+        os.makedirs(path, exist_ok=True)
+        return path
+
     @property
     def TEMPLATES_DIR(self) -> str:
         path = os.path.join(self.BASE_DIR, "templates")
@@ -43,7 +129,13 @@ class Settings:
         path = os.path.join(self.BASE_DIR, "temp")
         os.makedirs(path, exist_ok=True)
         return path
-    
+
+    @property
+    def OFFICE_PROFILES_DIR(self) -> str:
+        path = os.path.join(self.TEMP_DIR, "office_profiles")
+        os.makedirs(path, exist_ok=True)
+        return path
+
     @property
     def DATABASE_URL(self) -> str:
         db_path = os.path.join(self.BASE_DIR, "sql_app.db")
@@ -1,13 +1,29 @@
-from typing import List
+import json
+import base64
+from datetime import datetime
+from typing import List, Sequence, Tuple
 
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from sqlalchemy import String, and_, cast, literal, or_
+from sqlalchemy.orm import Session, joinedload
 
 from app.crud.base import CRUDBase
+from app.db import fts
 from app.models.document import Document
 from app.schemas.document import DocumentCreate, DocumentUpdate
 
 
+def _decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(created_at as stored, id) from a token of next_cursor; ValueError if malformed."""
+    try:
+        created_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(doc_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, doc_id
+
+
 class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
     def create_with_owner(
         self, db: Session, *, obj_in: DocumentCreate, owner_id: int
@@ -19,6 +35,27 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         db.refresh(db_obj)
         return db_obj
 
+    def get_multi_by_ids(
+        self, db: Session, *, ids: Sequence[int], owner_id: int = None
+    ) -> List[Document]:
+        """
+        Fetches the given documents in a single IN query, with their template
+        loaded eagerly, in the order of `ids`. Missing ids, and documents not
+        owned by `owner_id` when given, are left out.
+        """
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return []
+        query = (
+            db.query(self.model)
+            .options(joinedload(Document.template))
+            .filter(Document.id.in_(ids))
+        )
+        if owner_id is not None:
+            query = query.filter(Document.user_id == owner_id)
+        by_id = {doc.id: doc for doc in query.all()}
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
     def get_multi_filtered(
         self,
         db: Session,
@@ -28,29 +65,58 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         search: str = None,
         start_date: 'datetime' = None,
         end_date: 'datetime' = None,
-        owner_id: int = None
+        owner_id: int = None,
+        cursor: str = None
     ) -> List[Document]:
+        """
+        Newest first, ordered by (created_at, id). With `cursor` (the
+        next_cursor token of the previous page) the page starts right after
+        that position instead of using OFFSET, so deep pages cost the same as
+        the first one. The token carries the values themselves, so it keeps
+        working when the last document of the previous page is deleted.
+        Raises ValueError for a malformed token.
+        """
         query = db.query(self.model)
         
         if owner_id:
             query = query.filter(Document.user_id == owner_id)
         
         if search:
-            query = query.filter(Document.title.ilike(f"%{search}%"))
+            if len(search) >= fts.MIN_TRIGRAM_QUERY and fts.has_table(db, "documents_fts"):
+                query = query.filter(Document.id.in_(fts.match_ids("documents_fts", search)))
+            else:
+                query = query.filter(Document.title.ilike(f"%{search}%"))
         
         if start_date:
             query = query.filter(Document.created_at >= start_date)
             
         if end_date:
             query = query.filter(Document.created_at <= end_date)
+
+        if cursor is not None:
+            created_at, last_id = _decode_cursor(cursor)
+            if db.get_bind().dialect.name == "sqlite":
+                # SQLite keeps created_at as text, in the server default's format or
+                # the ORM's; comparing the stored text matches ORDER BY exactly
+                anchor = literal(created_at, String)
+            else:
+                anchor = literal(datetime.fromisoformat(created_at), Document.created_at.type)
+            query = query.filter(or_(
+                Document.created_at < anchor,
+                and_(Document.created_at == anchor, Document.id < last_id),
+            ))
+
+        query = query.order_by(Document.created_at.desc(), Document.id.desc())
+        if cursor is None:
+            query = query.offset(skip)
             
-        return (
-            query
-            .order_by(Document.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        return query.limit(limit).all()
+
+    def next_cursor(self, db: Session, last: Document) -> str:
+        """Opaque token for the page that follows `last`."""
+        created_at = db.query(cast(Document.created_at, String)).filter(Document.id == last.id).scalar()
+        raw = json.dumps([created_at, last.id]).encode()
+        return base64.urlsafe_b64encode(raw).decode()
 
     def get_multi_by_owner(
         self,
@@ -61,7 +127,8 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
         limit: int = 100,
         search: str = None,
         start_date: 'datetime' = None,
-        end_date: 'datetime' = None
+        end_date: 'datetime' = None,
+        cursor: str = None
     ) -> List[Document]:
         return self.get_multi_filtered(
             db, 
@@ -70,7 +137,8 @@ class CRUDDocument(CRUDBase[Document, DocumentCreate, DocumentUpdate]):
             limit=limit, 
             search=search, 
             start_date=start_date, 
-            end_date=end_date
+            end_date=end_date,
+            cursor=cursor
         )
 
 
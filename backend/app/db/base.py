@@ -4,5 +4,6 @@ from app.models.template import Template  # noqa
 from app.models.document import Document  # noqa
 from app.models.extractor import ( # noqa
     ExtractorProject, DocType, DocField, ExtractedDocument, 
-    DocumentFieldValue, ExtractionRule, ExtractionAlert, ExtractorSetting
+    DocumentFieldValue, ExtractionRule, ExtractionAlert, ExtractorSetting,
+    ProcessingJob, LLMCacheEntry, OCRCacheEntry
 )
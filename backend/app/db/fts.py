@@ -0,0 +1,131 @@
+import re
+import logging
+import weakref
+from typing import Dict
+
+from sqlalchemy import Integer, column, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# The trigram tokenizer only indexes substrings of 3 or more characters
+MIN_TRIGRAM_QUERY = 3
+
+_DOCUMENTS_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5("
+    "title, content='documents', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN "
+    "INSERT INTO documents_fts(rowid, title) VALUES (new.id, new.title); END",
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN "
+    "INSERT INTO documents_fts(documents_fts, rowid, title) VALUES ('delete', old.id, old.title); END",
+    "CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF title ON documents BEGIN "
+    "INSERT INTO documents_fts(documents_fts, rowid, title) VALUES ('delete', old.id, old.title); "
+    "INSERT INTO documents_fts(rowid, title) VALUES (new.id, new.title); END",
+]
+
+_EXTRACTION_FTS = [
+    # OCR text of each extracted document (rowid = extracted_documents.id)
+    "CREATE VIRTUAL TABLE IF NOT EXISTS extraction_text_fts USING fts5("
+    "ocr_text, content='extracted_documents', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS extraction_text_fts_ai AFTER INSERT ON extracted_documents BEGIN "
+    "INSERT INTO extraction_text_fts(rowid, ocr_text) VALUES (new.id, new.ocr_text); END",
+    "CREATE TRIGGER IF NOT EXISTS extraction_text_fts_ad AFTER DELETE ON extracted_documents BEGIN "
+    "INSERT INTO extraction_text_fts(extraction_text_fts, rowid, ocr_text) VALUES ('delete', old.id, old.ocr_text); END",
+    "CREATE TRIGGER IF NOT EXISTS extraction_text_fts_au AFTER UPDATE OF ocr_text ON extracted_documents BEGIN "
+    "INSERT INTO extraction_text_fts(extraction_text_fts, rowid, ocr_text) VALUES ('delete', old.id, old.ocr_text); "
+    "INSERT INTO extraction_text_fts(rowid, ocr_text) VALUES (new.id, new.ocr_text); END",
+    # Extracted field values (rowid = document_field_values.id)
+    "CREATE VIRTUAL TABLE IF NOT EXISTS extraction_fields_fts USING fts5("
+    "raw_value, normalized_value, content='document_field_values', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS extraction_fields_fts_ai AFTER INSERT ON document_field_values BEGIN "
+    "INSERT INTO extraction_fields_fts(rowid, raw_value, normalized_value) "
+    "VALUES (new.id, new.raw_value, new.normalized_value); END",
+    "CREATE TRIGGER IF NOT EXISTS extraction_fields_fts_ad AFTER DELETE ON document_field_values BEGIN "
+    "INSERT INTO extraction_fields_fts(extraction_fields_fts, rowid, raw_value, normalized_value) "
+    "VALUES ('delete', old.id, old.raw_value, old.normalized_value); END",
+    "CREATE TRIGGER IF NOT EXISTS extraction_fields_fts_au AFTER UPDATE OF raw_value, normalized_value "
+    "ON document_field_values BEGIN "
+    "INSERT INTO extraction_fields_fts(extraction_fields_fts, rowid, raw_value, normalized_value) "
+    "VALUES ('delete', old.id, old.raw_value, old.normalized_value); "
+    "INSERT INTO extraction_fields_fts(rowid, raw_value, normalized_value) "
+    "VALUES (new.id, new.raw_value, new.normalized_value); END",
+]
+
+# engine -> {table: exists}
+_tables: "weakref.WeakKeyDictionary[Engine, Dict[str, bool]]" = weakref.WeakKeyDictionary()
+
+
+def setup_document_search(engine: Engine) -> None:
+    """
+    Index for document title search.
+
+    SQLite: an FTS5 trigram table over documents.title kept in sync by
+    triggers, rebuilt when it is first created. PostgreSQL: a pg_trgm GIN
+    index, which ILIKE '%...%' uses directly.
+    """
+    if engine.dialect.name == "sqlite":
+        created = not inspect(engine).has_table("documents_fts")
+        with engine.begin() as conn:
+            for statement in _DOCUMENTS_FTS:
+                conn.execute(text(statement))
+            if created:
+                conn.execute(text("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')"))
+                logger.info("Created documents_fts search index.")
+    elif engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_documents_title_trgm ON documents USING gin (title gin_trgm_ops)"
+            ))
+    _tables.pop(engine, None)
+
+
+def setup_extraction_search(engine: Engine) -> None:
+    """
+    FTS5 indexes over extracted_documents.ocr_text and the raw/normalized
+    values of document_field_values, kept in sync by triggers, so every write
+    of the pipeline (and every manual correction) is searchable right away.
+    SQLite only; other databases use the ILIKE fallback of the search service.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    inspector = inspect(engine)
+    created = [t for t in ("extraction_text_fts", "extraction_fields_fts") if not inspector.has_table(t)]
+    with engine.begin() as conn:
+        for statement in _EXTRACTION_FTS:
+            conn.execute(text(statement))
+        for table in created:
+            conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('rebuild')"))
+            logger.info(f"Created {table} search index.")
+    _tables.pop(engine, None)
+
+
+def has_table(db: Session, name: str) -> bool:
+    engine = db.get_bind().engine
+    known = _tables.setdefault(engine, {})
+    if name not in known:
+        # Through the session's own connection, not a new one from the pool
+        known[name] = inspect(db.connection()).has_table(name)
+    return known[name]
+
+
+def phrase(query: str) -> str:
+    """Quotes user input as a single FTS5 phrase (no operators)."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def terms(query: str) -> str:
+    """
+    FTS5 query that requires every word of `query` (implicit AND). Each word
+    is quoted, so operators typed by the user are searched as text.
+    """
+    return " ".join(phrase(word) for word in re.findall(r"\w+", query))
+
+
+def match_ids(table: str, query: str):
+    """SELECT rowid of the FTS rows matching `query`, usable in an IN filter."""
+    return text(f"SELECT rowid FROM {table} WHERE {table} MATCH :fts_query").bindparams(
+        fts_query=phrase(query)
+    ).columns(column("rowid", Integer))
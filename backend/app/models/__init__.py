@@ -3,5 +3,6 @@ from .template import Template
 from .document import Document
 from .extractor import (
     ExtractorProject, DocType, DocField, ExtractedDocument, 
-    DocumentFieldValue, ExtractionRule, ExtractionAlert, ExtractorSetting
+    DocumentFieldValue, ExtractionRule, ExtractionAlert, ExtractorSetting,
+    ProcessingJob, LLMCacheEntry, OCRCacheEntry
 )
@@ -21,6 +21,8 @@ class ExtractorProject(Base):
     llm_extract_model = Column(String, default="gpt-4o")
     confidence_threshold = Column(Float, default=0.7)
     auto_process = Column(Boolean, default=True)
+    llm_cache_enabled = Column(Boolean, default=True)
+    local_classify_threshold = Column(Float, default=0.9) # > 1 desactiva el preclasificador local
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -85,6 +87,7 @@ class ExtractedDocument(Base):
     status = Column(String, default="pending") # pending, processing, completed, error
     doc_type_id = Column(Integer, ForeignKey("doc_types.id"), nullable=True)
     classification_confidence = Column(Float, nullable=True)
+    classification_source = Column(String, nullable=True) # llm, local_keyword, local_tfidf
     
     ocr_text = Column(Text, nullable=True)
     ocr_provider = Column(String, nullable=True)
@@ -161,8 +164,46 @@ class ExtractionAlert(Base):
     # Relationships
     document = relationship("ExtractedDocument", back_populates="alerts")
 
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("extracted_documents.id", ondelete="CASCADE"), index=True)
+    project_id = Column(Integer, ForeignKey("extractor_projects.id", ondelete="CASCADE"))
+    stage = Column(String, default="ocr") # ocr, classify, extract, rules, done
+    status = Column(String, default="queued", index=True) # queued, running, completed, error, superseded
+    attempts = Column(Integer, default=0)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
 class ExtractorSetting(Base):
     __tablename__ = "extractor_settings"
 
     key = Column(String, primary_key=True)
     value = Column(Text, nullable=True)
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String, primary_key=True) # sha256(provider, model, messages, temperature, json_mode)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    size = Column(Integer, default=0)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, nullable=False)
+    last_hit_at = Column(DateTime, nullable=True, index=True)
+
+class OCRCacheEntry(Base):
+    __tablename__ = "ocr_cache"
+
+    file_hash = Column(String, primary_key=True) # sha256 of the file bytes
+    text = Column(Text, nullable=True)
+    page_count = Column(Integer, nullable=True)
+    provider = Column(String, nullable=True)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, nullable=False)
+    last_hit_at = Column(DateTime, nullable=True)
@@ -16,6 +16,8 @@ class ExtractorProjectBase(BaseModel):
     llm_extract_model: Optional[str] = "gpt-4o"
     confidence_threshold: Optional[float] = 0.7
     auto_process: Optional[bool] = True
+    llm_cache_enabled: Optional[bool] = True
+    local_classify_threshold: Optional[float] = 0.9
 
 class ExtractorProjectCreate(ExtractorProjectBase):
     pass
@@ -33,6 +35,8 @@ class ExtractorProjectUpdate(BaseModel):
     llm_extract_model: Optional[str] = None
     confidence_threshold: Optional[float] = None
     auto_process: Optional[bool] = None
+    llm_cache_enabled: Optional[bool] = None
+    local_classify_threshold: Optional[float] = None
 
 class ExtractorProject(ExtractorProjectBase):
     id: int
@@ -109,6 +113,7 @@ class ExtractedDocument(ExtractedDocumentBase):
     project_id: int
     doc_type_id: Optional[int] = None
     classification_confidence: Optional[float] = None
+    classification_source: Optional[str] = None
     ocr_text: Optional[str] = None
     page_count: Optional[int] = None
     review_status: Optional[str] = "none"
@@ -118,6 +123,44 @@ class ExtractedDocument(ExtractedDocumentBase):
     field_values: List[DocumentFieldValue] = []
     model_config = ConfigDict(from_attributes=True)
 
+class ExtractedDocumentSummary(BaseModel):
+    """List projection: no OCR text, field values or alerts, only their counts."""
+    id: int
+    project_id: int
+    file_name: str
+    file_ext: Optional[str] = None
+    file_size: Optional[int] = None
+    page_count: Optional[int] = None
+    status: str
+    review_status: Optional[str] = "none"
+    doc_type_id: Optional[int] = None
+    doc_type_name: Optional[str] = None
+    classification_confidence: Optional[float] = None
+    classification_source: Optional[str] = None
+    error_message: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    alert_count: int = 0
+    open_alert_count: int = 0
+    model_config = ConfigDict(from_attributes=True)
+
+# --- Search ---
+class SearchFieldHit(BaseModel):
+    field_name: str
+    field_label: str
+    snippet: Optional[str] = None
+
+class SearchHit(BaseModel):
+    document_id: int
+    file_name: str
+    doc_type_id: Optional[int] = None
+    status: Optional[str] = None
+    review_status: Optional[str] = None
+    page_count: Optional[int] = None
+    score: float = 0.0
+    snippet: Optional[str] = None
+    fields: List[SearchFieldHit] = []
+
 
 # --- Rules ---
 class ExtractionRuleBase(BaseModel):
@@ -1,8 +1,11 @@
 import json
+import asyncio
 import logging
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.services.ai.llm_provider import llm_service
+from app.services.ai.llm_cache import llm_cache
 from app.models.extractor import DocType
 
 logger = logging.getLogger(__name__)
@@ -20,37 +23,66 @@ def safe_parse_json_list(val: Any) -> List[str]:
     except:
         return []
 
+def build_type_catalogue(doc_types: List[DocType]) -> str:
+    """Lista numerada de tipos (nombre, alias, descripción e instrucciones) para el prompt."""
+    type_list = []
+    for i, dt in enumerate(doc_types):
+        aliases = safe_parse_json_list(dt.aliases)
+        alias_str = f" (también conocido como: {', '.join(aliases)})" if aliases else ""
+        
+        # Añadir descripción e instrucciones (prompts) si existen
+        info_parts = []
+        if dt.description:
+            info_parts.append(f"Descripción: {dt.description}")
+        if dt.prompt_hint:
+            info_parts.append(f"Instrucciones: {dt.prompt_hint}")
+        
+        info_str = f" — {' | '.join(info_parts)}" if info_parts else ""
+        type_list.append(f"{i + 1}. \"{dt.name}\"{alias_str}{info_str}")
+    return "\n".join(type_list)
+
+
+def match_doc_type(doc_types: List[DocType], tipo: Any, confidence: Any) -> Tuple[Optional[int], float]:
+    """Busca el tipo devuelto por el LLM entre nombres y alias del proyecto."""
+    tipo_candidato = str(tipo or "").strip().lower()
+    confidence = min(1.0, max(0.0, float(confidence or 0.0)))
+
+    for dt in doc_types:
+        name = dt.name.lower()
+        aliases = [a.lower() for a in safe_parse_json_list(dt.aliases)]
+        if name == tipo_candidato or tipo_candidato in aliases:
+            return dt.id, confidence
+
+    # Si no hay match exacto, devolvemos el último (suele ser 'Otro') con confianza baja
+    return doc_types[-1].id, min(confidence, 0.4)
+
+
+def _parse_json(content: str) -> Any:
+    clean_content = content.replace("```json", "").replace("```", "").strip()
+    return json.loads(clean_content)
+
+
 class ClassifierService:
+    def __init__(self):
+        # Lotes abiertos de classify_batched, por (event loop, proveedor, modelo, tipos, caché).
+        # Cada entrada: (bind de la sesión de quien llama, texto, clave de caché, future)
+        self._pending: Dict[tuple, List[Tuple[Any, str, Optional[str], asyncio.Future]]] = {}
+
     async def classify(
         self,
         db: Session,
         text: str,
         doc_types: List[DocType],
         provider: str,
-        model: str
+        model: str,
+        use_cache: bool = True
     ) -> Tuple[Optional[int], float]:
         if not doc_types:
             return None, 0.0
         if not text or len(text.strip()) < 10:
             return None, 0.0
 
-        # Preparar la lista de tipos para el prompt
-        type_list = []
-        for i, dt in enumerate(doc_types):
-            aliases = safe_parse_json_list(dt.aliases)
-            alias_str = f" (también conocido como: {', '.join(aliases)})" if aliases else ""
-            
-            # Añadir descripción e instrucciones (prompts) si existen
-            info_parts = []
-            if dt.description:
-                info_parts.append(f"Descripción: {dt.description}")
-            if dt.prompt_hint:
-                info_parts.append(f"Instrucciones: {dt.prompt_hint}")
-            
-            info_str = f" — {' | '.join(info_parts)}" if info_parts else ""
-            type_list.append(f"{i + 1}. \"{dt.name}\"{alias_str}{info_str}")
-        
-        type_str = "\n".join(type_list)
+        type_str = build_type_catalogue(doc_types)
         truncated_text = text[:3000]
 
         prompt_system = (
@@ -76,34 +108,190 @@ class ClassifierService:
                 ],
                 model=model,
                 temperature=0.0,
-                json_mode=(provider != "anthropic")
+                json_mode=(provider != "anthropic"),
+                use_cache=use_cache,
+                validate=_parse_json
             )
 
-            # Limpiar y parsear JSON
-            clean_content = content.replace("```json", "").replace("```", "").strip()
-            parsed = json.loads(clean_content)
-            
-            tipo_candidato = str(parsed.get("tipo", "")).strip().lower()
-            confidence = float(parsed.get("confianza", 0.0))
-            confidence = min(1.0, max(0.0, confidence))
-
-            # Buscar el match en nuestra lista
-            match = None
-            for dt in doc_types:
-                name = dt.name.lower()
-                aliases = [a.lower() for a in safe_parse_json_list(dt.aliases)]
-                if name == tipo_candidato or tipo_candidato in aliases:
-                    match = dt
-                    break
-            
-            if match:
-                return match.id, confidence
-            else:
-                # Si no hay match exacto, devolvemos el último (suele ser 'Otro') con confianza baja
-                return doc_types[-1].id, min(confidence, 0.4)
+            parsed = _parse_json(content)
+            return match_doc_type(doc_types, parsed.get("tipo"), parsed.get("confianza", 0.0))
 
         except Exception as e:
             logger.error(f"[Classifier] Error: {e}")
             return None, 0.0
 
+    async def classify_many(
+        self,
+        db: Session,
+        texts: Dict[Any, str],
+        doc_types: List[DocType],
+        provider: str,
+        model: str,
+        use_cache: bool = True
+    ) -> Dict[Any, Tuple[Optional[int], float]]:
+        """
+        Clasifica varios documentos en una sola llamada: el catálogo de tipos
+        va una vez y cada documento se identifica por su clave en `texts`.
+        Los documentos sin respuesta válida se clasifican uno a uno.
+        """
+        results: Dict[Any, Tuple[Optional[int], float]] = {}
+        if not doc_types:
+            return {key: (None, 0.0) for key in texts}
+
+        batch = {}
+        for key, text in texts.items():
+            if not text or len(text.strip()) < 10:
+                results[key] = (None, 0.0)
+            else:
+                batch[str(key)] = key
+
+        if len(batch) > 1:
+            documents = "\n\n".join(
+                f"### Documento id={batch_id}\n{texts[key][:3000]}" for batch_id, key in batch.items()
+            )
+            prompt_system = (
+                "Eres un sistema de clasificación documental experto. "
+                "Recibirás varios documentos, cada uno precedido por su id. "
+                "Clasifica CADA documento en UNO de los tipos documentales disponibles y devuelve una confianza del 0.0 al 1.0. "
+                "Si un documento no encaja claramente en ningún tipo, usa el tipo que más se aproxime o el tipo 'Otro'. "
+                "Responde ÚNICAMENTE con JSON en el formato: "
+                "{\"resultados\": [{\"id\": \"id del documento\", \"tipo\": \"nombre exacto del tipo\", \"confianza\": 0.0}]}"
+            )
+            prompt_user = (
+                f"Tipos documentales disponibles:\n{build_type_catalogue(doc_types)}\n\n"
+                f"Documentos:\n{documents}\n\n"
+                "Clasifica cada documento."
+            )
+            try:
+                content = await llm_service.complete(
+                    db=db,
+                    provider=provider,
+                    messages=[
+                        {"role": "system", "content": prompt_system},
+                        {"role": "user", "content": prompt_user}
+                    ],
+                    model=model,
+                    temperature=0.0,
+                    json_mode=(provider != "anthropic"),
+                    use_cache=use_cache,
+                    validate=_parse_json
+                )
+                parsed = _parse_json(content)
+                items = parsed.get("resultados", []) if isinstance(parsed, dict) else parsed
+                for item in items:
+                    key = batch.pop(str(item.get("id", "")).strip(), None)
+                    if key is not None:
+                        results[key] = match_doc_type(doc_types, item.get("tipo"), item.get("confianza", 0.0))
+            except Exception as e:
+                logger.warning(f"[Classifier] Batch response unusable, falling back to single calls: {e}")
+
+        # Respaldo: documentos que el lote no resolvió (o lote de uno)
+        pending = list(batch.values())
+        singles = await asyncio.gather(*[
+            self.classify(db, texts[key], doc_types, provider, model, use_cache=use_cache)
+            for key in pending
+        ])
+        results.update(zip(pending, singles))
+        return results
+
+    async def classify_batched(
+        self,
+        db: Session,
+        text: str,
+        doc_types: List[DocType],
+        provider: str,
+        model: str,
+        use_cache: bool = True
+    ) -> Tuple[Optional[int], float]:
+        """
+        Igual que classify, pero agrupa las llamadas concurrentes con el mismo
+        catálogo durante CLASSIFY_BATCH_WINDOW_SECONDS (o hasta CLASSIFY_BATCH_SIZE
+        documentos) y las resuelve con una sola llamada a classify_many.
+
+        Qué documentos viajan juntos depende del momento en que llegan, así que
+        la caché no puede ser la del prompt del lote: cada documento se busca y
+        se guarda por separado (catálogo + su texto), como los veredictos de
+        reglas en rules_engine.
+        """
+        if settings.CLASSIFY_BATCH_SIZE <= 1 or not doc_types:
+            return await self.classify(db, text, doc_types, provider, model, use_cache=use_cache)
+
+        cache_key = None
+        if use_cache and llm_cache.is_cacheable(0.0) and text and len(text.strip()) >= 10:
+            cache_key = self._document_key(provider, model, doc_types, text)
+            cached = self._cached_result(db, cache_key)
+            if cached is not None:
+                return cached
+
+        loop = asyncio.get_running_loop()
+        key = (loop, provider, model, tuple(dt.id for dt in doc_types), use_cache)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((db.get_bind() if db is not None else None, text, cache_key, future))
+
+        if len(batch) == 1:
+            loop.call_later(
+                settings.CLASSIFY_BATCH_WINDOW_SECONDS,
+                lambda: loop.create_task(self._flush_batch(key, batch, doc_types)),
+            )
+        if len(batch) >= settings.CLASSIFY_BATCH_SIZE:
+            loop.create_task(self._flush_batch(key, batch, doc_types))
+        return await future
+
+    def _document_key(self, provider: str, model: str, doc_types: List[DocType], text: str) -> str:
+        return llm_cache.make_key(
+            provider, model,
+            [
+                {"role": "catalogue", "content": f"{[dt.id for dt in doc_types]}\n{build_type_catalogue(doc_types)}"},
+                {"role": "document", "content": text[:3000]},
+            ],
+            0.0, True
+        )
+
+    def _cached_result(self, db: Optional[Session], cache_key: str) -> Optional[Tuple[Optional[int], float]]:
+        cached = llm_cache.get(db, cache_key)
+        if cached is None:
+            return None
+        try:
+            parsed = json.loads(cached)
+            return parsed["type_id"], float(parsed["confidence"])
+        except (ValueError, KeyError, TypeError):
+            llm_cache.discard(db, cache_key)
+            return None
+
+    async def _flush_batch(self, key: tuple, batch: list, doc_types: List[DocType]) -> None:
+        # El lote se cierra una sola vez (por tamaño o por tiempo, lo que ocurra antes)
+        if self._pending.get(key) is not batch:
+            return
+        del self._pending[key]
+        _, provider, model, _, use_cache = key
+        # Sesión propia del lote: las de quienes esperan siguen siendo de sus tareas
+        bind = batch[0][0]
+        if bind is not None:
+            db = Session(bind=bind)
+        else:
+            from app.db.session import SessionLocal
+            db = SessionLocal()
+        try:
+            # El prompt del lote no se repite: la caché es la de cada documento
+            results = await self.classify_many(
+                db, {i: text for i, (_, text, _, _) in enumerate(batch)},
+                doc_types, provider, model, use_cache=False
+            )
+            for i, (_, _, cache_key, future) in enumerate(batch):
+                type_id, confidence = results.get(i, (None, 0.0))
+                if cache_key and type_id is not None:
+                    llm_cache.put(
+                        db, cache_key, provider, model,
+                        json.dumps({"type_id": type_id, "confidence": confidence})
+                    )
+                if not future.done():
+                    future.set_result((type_id, confidence))
+        except Exception as e:
+            for _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            db.close()
+
 classifier_service = ClassifierService()
@@ -1,13 +1,22 @@
-import pandas as pd
+import os
 import io
-import logging
+import csv
+import codecs
 import json
-from typing import List
+import logging
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+from openpyxl import Workbook
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.extractor import ExtractedDocument, DocumentFieldValue, DocType
 
 logger = logging.getLogger(__name__)
 
+# Column name used for a field value in tabular exports
+FIELD_LABEL = func.coalesce(func.nullif(DocumentFieldValue.field_label, ""), DocumentFieldValue.field_name)
+
 def clean_sheet_name(name: str) -> str:
     """Removes invalid characters for Excel sheet names."""
     invalid = [':', '\\', '/', '?', '*', '[', ']']
@@ -15,100 +24,147 @@ def clean_sheet_name(name: str) -> str:
         name = name.replace(char, '')
     return name[:31]
 
-def export_project_to_excel(db: Session, project_id: int, filter_status: str = "all") -> io.BytesIO:
+def _filters(project_id: int, filter_status: str, doc_type_id: Optional[int] = None) -> list:
+    filters = [
+        ExtractedDocument.project_id == project_id,
+        ExtractedDocument.status == "completed",
+    ]
+    if filter_status == "approved":
+        filters.append(ExtractedDocument.review_status == "approved")
+    if doc_type_id is not None:
+        filters.append(ExtractedDocument.doc_type_id == doc_type_id)
+    return filters
+
+def field_columns(db: Session, project_id: int, filter_status: str, doc_type_id: Optional[int] = None) -> List[str]:
+    """Field columns of the export in first-seen order, computed in SQL before any row is written."""
+    rows = db.query(FIELD_LABEL, func.min(DocumentFieldValue.id)).join(
+        ExtractedDocument, ExtractedDocument.id == DocumentFieldValue.document_id
+    ).filter(*_filters(project_id, filter_status, doc_type_id)).group_by(FIELD_LABEL).order_by(
+        func.min(DocumentFieldValue.id)
+    ).all()
+    return [label for label, _ in rows]
+
+def iter_documents(
+    db: Session, project_id: int, filter_status: str, doc_type_id: Optional[int] = None
+) -> Iterator[Tuple[object, List[object]]]:
+    """
+    Yields (document, field values) in id order, reading EXPORT_WINDOW_SIZE
+    documents at a time (keyset pagination) with one field-value query per window.
+    """
+    last_id = 0
+    while True:
+        docs = db.query(
+            ExtractedDocument.id,
+            ExtractedDocument.file_name,
+            ExtractedDocument.created_at,
+            ExtractedDocument.status,
+            ExtractedDocument.review_status,
+            ExtractedDocument.doc_type_id,
+        ).filter(
+            *_filters(project_id, filter_status, doc_type_id), ExtractedDocument.id > last_id
+        ).order_by(ExtractedDocument.id).limit(settings.EXPORT_WINDOW_SIZE).all()
+        if not docs:
+            return
+
+        values: Dict[int, List[object]] = {doc.id: [] for doc in docs}
+        for fv in db.query(
+            DocumentFieldValue.document_id,
+            DocumentFieldValue.field_name,
+            FIELD_LABEL.label("label"),
+            DocumentFieldValue.normalized_value,
+            DocumentFieldValue.raw_value,
+        ).filter(DocumentFieldValue.document_id.in_(values.keys())).order_by(DocumentFieldValue.id):
+            values[fv.document_id].append(fv)
+
+        for doc in docs:
+            yield doc, values[doc.id]
+        last_id = docs[-1].id
+
+def _field_row(values: List[object]) -> Dict[str, object]:
+    return {fv.label: fv.normalized_value or fv.raw_value for fv in values}
+
+def stream_project_csv(db: Session, project_id: int, filter_status: str = "all") -> Iterator[bytes]:
+    columns = ["ID", "Archivo", "Tipo", "Estado"] + field_columns(db, project_id, filter_status)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # BOM so Excel opens the CSV as UTF-8
+    yield codecs.BOM_UTF8
+    pending = 0
+    for doc, values in iter_documents(db, project_id, filter_status):
+        fields = _field_row(values)
+        writer.writerow([doc.id, doc.file_name, doc.doc_type_id, doc.review_status] + [fields.get(c) for c in columns[4:]])
+        pending += 1
+        if pending >= settings.EXPORT_WINDOW_SIZE:
+            yield _drain(buffer)
+            pending = 0
+    yield _drain(buffer)
+
+def _drain(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return data.encode("utf-8")
+
+def _json_document(doc, values: List[object]) -> dict:
+    return {
+        "id": doc.id, "file_name": doc.file_name, "status": doc.status, "review_status": doc.review_status,
+        "fields": {fv.field_name: fv.normalized_value or fv.raw_value for fv in values}
+    }
+
+def stream_project_json(db: Session, project_id: int, filter_status: str = "all") -> Iterator[bytes]:
+    """A JSON array, written one document at a time."""
+    first = True
+    yield b"["
+    for doc, values in iter_documents(db, project_id, filter_status):
+        item = json.dumps(_json_document(doc, values), indent=4, ensure_ascii=False)
+        yield (("\n" if first else ",\n") + item).encode("utf-8")
+        first = False
+    yield b"\n]" if not first else b"]"
+
+def stream_project_ndjson(db: Session, project_id: int, filter_status: str = "all") -> Iterator[bytes]:
+    """One JSON document per line."""
+    for doc, values in iter_documents(db, project_id, filter_status):
+        yield (json.dumps(_json_document(doc, values), ensure_ascii=False) + "\n").encode("utf-8")
+
+def stream_project_excel(db: Session, project_id: int, filter_status: str = "all") -> Iterator[bytes]:
     """
     Exports documents of a project to an Excel file.
-    Each DocType gets its own sheet.
+    Each DocType gets its own sheet. Rows are written with openpyxl's
+    write-only mode to a temporary file, which is then streamed in chunks.
     """
-    doc_types = db.query(DocType).filter(DocType.project_id == project_id).all()
-    
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        has_sheets = False
-        
-        # 1. Summary sheet (always present to prevent empty workbook error)
-        summary_data = [
-            {"Atributo": "ID Proyecto", "Valor": project_id},
-            {"Atributo": "Filtro Aplicado", "Valor": filter_status},
-            {"Atributo": "Total Tipos Doc", "Valor": len(doc_types)}
-        ]
-        pd.DataFrame(summary_data).to_excel(writer, sheet_name="Resumen", index=False)
-        has_sheets = True
-
-        # 2. DocType sheets
-        for dt in doc_types:
-            query = db.query(ExtractedDocument).filter(
-                ExtractedDocument.project_id == project_id,
-                ExtractedDocument.doc_type_id == dt.id,
-                ExtractedDocument.status == "completed"
-            )
-            
-            if filter_status == "approved":
-                query = query.filter(ExtractedDocument.review_status == "approved")
-            
-            docs = query.all()
-            if not docs: continue
-                
-            data = []
-            for doc in docs:
-                row = {
-                    "ID": doc.id,
-                    "Archivo": doc.file_name,
-                    "Fecha": doc.created_at.strftime("%Y-%m-%d %H:%M") if doc.created_at else "N/A",
-                    "Estado": doc.review_status
-                }
-                field_values = db.query(DocumentFieldValue).filter(DocumentFieldValue.document_id == doc.id).all()
-                for fv in field_values:
-                    row[fv.field_label or fv.field_name] = fv.normalized_value or fv.raw_value
-                data.append(row)
-            
-            if data:
-                df = pd.DataFrame(data)
-                sheet_name = clean_sheet_name(dt.name)
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-                has_sheets = True
-                
-    output.seek(0)
-    return output
-
-def export_project_to_csv(db: Session, project_id: int, filter_status: str = "all") -> io.BytesIO:
-    query = db.query(ExtractedDocument).filter(ExtractedDocument.project_id == project_id, ExtractedDocument.status == "completed")
-    if filter_status == "approved":
-        query = query.filter(ExtractedDocument.review_status == "approved")
-    
-    docs = query.all()
-    data = []
-    for doc in docs:
-        row = {"ID": doc.id, "Archivo": doc.file_name, "Tipo": doc.doc_type_id, "Estado": doc.review_status}
-        field_values = db.query(DocumentFieldValue).filter(DocumentFieldValue.document_id == doc.id).all()
-        for fv in field_values:
-            row[fv.field_label or fv.field_name] = fv.normalized_value or fv.raw_value
-        data.append(row)
-    
-    df = pd.DataFrame(data)
-    output = io.BytesIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')
-    output.seek(0)
-    return output
-
-def export_project_to_json(db: Session, project_id: int, filter_status: str = "all") -> io.BytesIO:
-    query = db.query(ExtractedDocument).filter(ExtractedDocument.project_id == project_id, ExtractedDocument.status == "completed")
-    if filter_status == "approved":
-        query = query.filter(ExtractedDocument.review_status == "approved")
-    
-    docs = query.all()
-    data = []
-    for doc in docs:
-        doc_data = {
-            "id": doc.id, "file_name": doc.file_name, "status": doc.status, "review_status": doc.review_status,
-            "fields": {}
-        }
-        field_values = db.query(DocumentFieldValue).filter(DocumentFieldValue.document_id == doc.id).all()
-        for fv in field_values:
-            doc_data["fields"][fv.field_name] = fv.normalized_value or fv.raw_value
-        data.append(doc_data)
-    
-    output = io.BytesIO()
-    output.write(json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8'))
-    output.seek(0)
-    return output
+    doc_types = db.query(DocType.id, DocType.name).filter(DocType.project_id == project_id).all()
+
+    workbook = Workbook(write_only=True)
+    # 1. Summary sheet (always present to prevent empty workbook error)
+    summary = workbook.create_sheet("Resumen")
+    summary.append(["Atributo", "Valor"])
+    summary.append(["ID Proyecto", project_id])
+    summary.append(["Filtro Aplicado", filter_status])
+    summary.append(["Total Tipos Doc", len(doc_types)])
+
+    # 2. DocType sheets
+    for dt in doc_types:
+        columns = ["ID", "Archivo", "Fecha", "Estado"] + field_columns(db, project_id, filter_status, dt.id)
+        sheet = None
+        for doc, values in iter_documents(db, project_id, filter_status, dt.id):
+            if sheet is None:
+                sheet = workbook.create_sheet(clean_sheet_name(dt.name))
+                sheet.append(columns)
+            fields = _field_row(values)
+            sheet.append([
+                doc.id,
+                doc.file_name,
+                doc.created_at.strftime("%Y-%m-%d %H:%M") if doc.created_at else "N/A",
+                doc.review_status,
+            ] + [fields.get(c) for c in columns[4:]])
+
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx", dir=settings.TEMP_DIR)
+    os.close(fd)
+    try:
+        workbook.save(path)
+        with open(path, "rb") as f:
+            while chunk := f.read(settings.EXPORT_CHUNK_BYTES):
+                yield chunk
+    finally:
+        os.remove(path)
@@ -1,8 +1,12 @@
 import json
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Set, Tuple
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.services.ai.llm_provider import llm_service
+from app.services.ai.ocr_service import PAGE_MARKER_RE, mark_pages
+from app.services.ai.retrieval import BM25Index, field_query, format_passages, split_passages
 from app.models.extractor import DocField, DocType
 
 logger = logging.getLogger(__name__)
@@ -20,19 +24,41 @@ def safe_parse_json_list(val: Any) -> List[Any]:
     except:
         return []
 
-class ExtractorService:
-    async def extract_fields(
-        self,
-        db: Session,
-        text: str,
-        fields: List[DocField],
-        doc_type: DocType,
-        provider: str,
-        model: str
-    ) -> List[Dict[str, Any]]:
-        if not text or not fields:
-            return []
+def split_text_chunks(text: str, max_chars: int, overlap: int) -> List[str]:
+    """
+    Divide el texto en fragmentos de hasta max_chars respetando las páginas,
+    que llegan al modelo con su marcador ("--- PÁGINA N ---"). Cada fragmento
+    empieza con los últimos `overlap` caracteres del anterior para no cortar
+    un valor entre dos.
+    """
+    text = mark_pages(text)
+    starts = [m.start() for m in PAGE_MARKER_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    pages = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+    # Páginas (o textos sin marcadores) más largas que un fragmento: cortar por párrafos
+    units = []
+    for page in pages:
+        while len(page) > max_chars:
+            cut = page.rfind("\n", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            units.append(page[:cut])
+            page = page[cut:]
+        units.append(page)
 
+    chunks, current = [], ""
+    for unit in units:
+        if current and len(current) + len(unit) > max_chars:
+            chunks.append(current)
+            current = current[-overlap:] if overlap else ""
+        current += unit
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+class ExtractorService:
+    def _build_system_prompt(self, fields: List[DocField], doc_type: DocType) -> str:
         # Construir la lista de campos para el prompt
         field_specs = []
         for f in fields:
@@ -50,11 +76,9 @@ class ExtractorService:
             field_specs.append(spec)
         
         field_list_str = "\n".join(field_specs)
-        # Enviar TODO el texto disponible (hasta 60K caracteres para documentos legales extensos)
-        truncated_text = text[:60000]
         doc_type_hint = doc_type.prompt_hint or ""
 
-        prompt_system = (
+        return (
             f"Eres un experto en extracción de información de documentos legales y administrativos colombianos. {doc_type_hint}\n\n"
             "INSTRUCCIONES CRÍTICAS:\n"
             "1. Lee el documento COMPLETO antes de responder. No te detengas en las primeras páginas.\n"
@@ -73,79 +97,307 @@ class ExtractorService:
             "IMPORTANTE: Devuelve TODOS los campos solicitados, incluso si no los encontraste (con value: null)."
         )
 
-        try:
-            content = await llm_service.complete(
-                db=db,
-                provider=provider,
-                messages=[
-                    {"role": "system", "content": prompt_system},
-                    {"role": "user", "content": f"Texto del documento:\n{truncated_text}"}
-                ],
-                model=model,
-                temperature=0.0,
-                json_mode=(provider != "anthropic")
-            )
+    async def _request_items(
+        self,
+        db: Session,
+        prompt_system: str,
+        user_content: str,
+        provider: str,
+        model: str,
+        use_cache: bool
+    ) -> List[Dict[str, Any]]:
+        content = await llm_service.complete(
+            db=db,
+            provider=provider,
+            messages=[
+                {"role": "system", "content": prompt_system},
+                {"role": "user", "content": user_content}
+            ],
+            model=model,
+            temperature=0.0,
+            json_mode=(provider != "anthropic"),
+            use_cache=use_cache,
+            validate=self._parse_items
+        )
+        return self._parse_items(content)
+
+    @staticmethod
+    def _parse_items(content: str) -> List[Dict[str, Any]]:
+        # Limpiar y parsear JSON
+        clean_content = content.replace("```json", "").replace("```", "").strip()
+        parsed = json.loads(clean_content)
+        return parsed.get("campos", [])
+
+    def _to_results(self, extracted_items: List[Dict[str, Any]], fields: List[DocField]) -> List[Dict[str, Any]]:
+        results = []
 
-            # Limpiar y parsear JSON
-            clean_content = content.replace("```json", "").replace("```", "").strip()
-            parsed = json.loads(clean_content)
+        # Crear un set de campos ya procesados para detectar los que faltan (insensible a mayúsculas/minúsculas)
+        processed_field_names = set()
+
+        for item in extracted_items:
+            # Buscar el campo correspondiente de forma case-insensitive
+            item_name = item.get("name")
+            if not item_name:
+                continue
+            
+            field = next((f for f in fields if f.name.lower() == item_name.lower()), None)
+            if not field:
+                continue
+            
+            processed_field_names.add(field.name.lower())
+            val = item.get("value")
             
-            extracted_items = parsed.get("campos", [])
-            results = []
-
-            # Crear un set de campos ya procesados para detectar los que faltan (insensible a mayúsculas/minúsculas)
-            processed_field_names = set()
-
-            for item in extracted_items:
-                # Buscar el campo correspondiente de forma case-insensitive
-                item_name = item.get("name")
-                if not item_name:
-                    continue
-                
-                field = next((f for f in fields if f.name.lower() == item_name.lower()), None)
-                if not field:
-                    continue
-                
-                processed_field_names.add(field.name.lower())
-                val = item.get("value")
-                
-                # Si el valor es null/vacío, registrar como "No encontrado"
-                if val is None or val == "" or val == "null":
-                    results.append({
-                        "field_id": field.id,
-                        "field_name": field.name,
-                        "field_label": field.label,
-                        "raw_value": "No encontrado",
-                        "confidence": 0.0,
-                        "source_text": item.get("source", "No encontrado en el documento")
-                    })
-                    continue
+            # Si el valor es null/vacío, registrar como "No encontrado"
+            if val is None or val == "" or val == "null":
+                results.append({
+                    "field_id": field.id,
+                    "field_name": field.name,
+                    "field_label": field.label,
+                    "raw_value": "No encontrado",
+                    "confidence": 0.0,
+                    "source_text": item.get("source", "No encontrado en el documento")
+                })
+                continue
 
+            results.append({
+                "field_id": field.id,
+                "field_name": field.name,
+                "field_label": field.label,
+                "raw_value": str(val),
+                "confidence": min(1.0, max(0.0, float(item.get("confidence", 0.0)))),
+                "source_text": item.get("source")
+            })
+        
+        # Agregar campos que el LLM no devolvió en absoluto (case-insensitive)
+        for field in fields:
+            if field.name.lower() not in processed_field_names:
                 results.append({
                     "field_id": field.id,
                     "field_name": field.name,
                     "field_label": field.label,
-                    "raw_value": str(val),
-                    "confidence": min(1.0, max(0.0, float(item.get("confidence", 0.0)))),
-                    "source_text": item.get("source")
+                    "raw_value": "No encontrado",
+                    "confidence": 0.0,
+                    "source_text": "El modelo no devolvió este campo"
                 })
-            
-            # Agregar campos que el LLM no devolvió en absoluto (case-insensitive)
-            for field in fields:
-                if field.name.lower() not in processed_field_names:
-                    results.append({
-                        "field_id": field.id,
-                        "field_name": field.name,
-                        "field_label": field.label,
-                        "raw_value": "No encontrado",
-                        "confidence": 0.0,
-                        "source_text": "El modelo no devolvió este campo"
-                    })
-
-            return results
+
+        return results
+
+    def merge_chunk_results(
+        self, chunk_results: List[List[Dict[str, Any]]], fields: List[DocField]
+    ) -> List[Dict[str, Any]]:
+        """
+        Reduce los resultados de cada fragmento (en orden del documento) a uno
+        por campo. Se respeta la regla de la primera aparición oficial: gana el
+        primer valor con confianza >= EXTRACT_MIN_CHUNK_CONFIDENCE; si ninguno
+        la alcanza, el de mayor confianza. Los campos múltiples acumulan los
+        valores distintos.
+        """
+        merged = []
+        for field in fields:
+            candidates = [
+                item for results in chunk_results for item in results
+                if item["field_name"] == field.name and item["raw_value"] != "No encontrado"
+            ]
+            if not candidates:
+                merged.append({
+                    "field_id": field.id,
+                    "field_name": field.name,
+                    "field_label": field.label,
+                    "raw_value": "No encontrado",
+                    "confidence": 0.0,
+                    "source_text": "No encontrado en el documento"
+                })
+                continue
+
+            if field.is_multi:
+                values = list(dict.fromkeys(c["raw_value"].strip() for c in candidates))
+                best = dict(max(candidates, key=lambda c: c["confidence"]))
+                best["raw_value"] = "; ".join(values)
+                merged.append(best)
+                continue
+
+            confident = [c for c in candidates if c["confidence"] >= settings.EXTRACT_MIN_CHUNK_CONFIDENCE]
+            best = dict(confident[0] if confident else max(candidates, key=lambda c: c["confidence"]))
+            # El mismo valor hallado en otros fragmentos refuerza la confianza
+            same = [c["confidence"] for c in candidates if c["raw_value"].strip().lower() == best["raw_value"].strip().lower()]
+            best["confidence"] = max(same)
+            merged.append(best)
+        return merged
+
+    async def extract_fields(
+        self,
+        db: Session,
+        text: str,
+        fields: List[DocField],
+        doc_type: DocType,
+        provider: str,
+        model: str,
+        use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
+        if not text or not fields:
+            return []
+
+        if settings.RETRIEVAL_ENABLED and len(text) > settings.RETRIEVAL_MIN_CHARS:
+            return await self._extract_with_retrieval(db, text, fields, doc_type, provider, model, use_cache)
+        return await self._extract_full_text(db, text, fields, doc_type, provider, model, use_cache)
+
+    async def _extract_full_text(
+        self,
+        db: Session,
+        text: str,
+        fields: List[DocField],
+        doc_type: DocType,
+        provider: str,
+        model: str,
+        use_cache: bool
+    ) -> List[Dict[str, Any]]:
+        prompt_system = self._build_system_prompt(fields, doc_type)
+
+        if len(text) > settings.EXTRACT_CHUNK_THRESHOLD_CHARS:
+            return await self._extract_chunked(db, text, fields, prompt_system, provider, model, use_cache)
+
+        # Enviar TODO el texto disponible (hasta 60K caracteres para documentos legales extensos)
+        truncated_text = mark_pages(text)[:60000]
+
+        try:
+            extracted_items = await self._request_items(
+                db, prompt_system, f"Texto del documento:\n{truncated_text}", provider, model, use_cache
+            )
+            return self._to_results(extracted_items, fields)
 
         except Exception as e:
             logger.error(f"[Extractor] Error: {e}")
             return []
 
+    def _field_terms(self, field: DocField) -> List[str]:
+        return field_query(
+            field.name.replace("_", " "), field.label, field.prompt_hint or "",
+            *map(str, safe_parse_json_list(field.aliases))
+        )
+
+    @staticmethod
+    def _select_passages(
+        text: str, queries: List[Tuple[DocField, str, List[str]]]
+    ) -> Tuple[List[Tuple[List[DocField], str]], List[DocField], Set[str]]:
+        """
+        Índice BM25 del documento y búsqueda de los pasajes de cada grupo de
+        campos. Devuelve (grupos con su contexto, campos que van al texto
+        completo, nombres de los campos con coincidencias débiles).
+        """
+        index = BM25Index(split_passages(text, settings.RETRIEVAL_PASSAGE_CHARS))
+        size = max(1, settings.RETRIEVAL_FIELDS_PER_GROUP)
+        full_text_fields: List[DocField] = []
+        weak_matches: Set[str] = set()
+        requests = []
+
+        for group in [queries[i:i + size] for i in range(0, len(queries), size)]:
+            selected = {p.position: p for p in index.passages[:1]}
+            matched = []
+            for field, name, terms in group:
+                hits = index.search(terms, settings.RETRIEVAL_TOP_K)
+                if hits:
+                    matched.append(field)
+                    selected.update((p.position, p) for p, _ in hits)
+                    if hits[0][1] < settings.RETRIEVAL_MIN_SCORE:
+                        weak_matches.add(name)
+                else:
+                    full_text_fields.append(field)
+            if not matched:
+                continue
+            context = format_passages(list(selected.values()))
+            if len(context) > settings.RETRIEVAL_MAX_CONTEXT_CHARS:
+                full_text_fields.extend(matched)
+            else:
+                requests.append((matched, context))
+        return requests, full_text_fields, weak_matches
+
+    async def _extract_with_retrieval(
+        self,
+        db: Session,
+        text: str,
+        fields: List[DocField],
+        doc_type: DocType,
+        provider: str,
+        model: str,
+        use_cache: bool
+    ) -> List[Dict[str, Any]]:
+        """
+        Por cada grupo de campos se envían solo los pasajes con mejor BM25
+        (más el encabezado, donde suele estar la primera aparición oficial).
+        Los campos sin coincidencias se extraen después con el texto completo,
+        igual que los que el modelo no encuentra en pasajes con puntaje bajo
+        (< RETRIEVAL_MIN_SCORE); si los pasajes coincidían bien, el
+        "No encontrado" se acepta.
+        """
+        # Los atributos ORM se leen aquí; BM25 (tokenizar y puntuar) va en un hilo
+        queries = [(field, field.name, self._field_terms(field)) for field in fields]
+        requests, full_text_fields, weak_matches = await asyncio.to_thread(self._select_passages, text, queries)
+
+        async def extract_group(group: List[DocField], context: str) -> Optional[List[Dict[str, Any]]]:
+            user_content = (
+                "Fragmentos relevantes del documento (en orden, con su página):\n"
+                f"{context}"
+            )
+            try:
+                items = await self._request_items(
+                    db, self._build_system_prompt(group, doc_type), user_content, provider, model, use_cache
+                )
+                return self._to_results(items, group)
+            except Exception as e:
+                logger.error(f"[Extractor] Error in retrieval group: {e}")
+                return None
+
+        group_results = await asyncio.gather(*[extract_group(g, c) for g, c in requests])
+        results = []
+        for (group, _), group_result in zip(requests, group_results):
+            if group_result is None:
+                full_text_fields.extend(group)
+                continue
+            for item in group_result:
+                if item["raw_value"] == "No encontrado" and item["field_name"] in weak_matches:
+                    full_text_fields.extend(f for f in group if f.name == item["field_name"])
+                else:
+                    results.append(item)
+
+        if full_text_fields:
+            results.extend(await self._extract_full_text(
+                db, text, full_text_fields, doc_type, provider, model, use_cache
+            ))
+        order = {f.name: i for i, f in enumerate(fields)}
+        return sorted(results, key=lambda item: order.get(item["field_name"], len(order)))
+
+    async def _extract_chunked(
+        self,
+        db: Session,
+        text: str,
+        fields: List[DocField],
+        prompt_system: str,
+        provider: str,
+        model: str,
+        use_cache: bool
+    ) -> List[Dict[str, Any]]:
+        """Documentos largos: un pedido por fragmento en paralelo y luego merge_chunk_results."""
+        chunks = split_text_chunks(text, settings.EXTRACT_CHUNK_CHARS, settings.EXTRACT_CHUNK_OVERLAP_CHARS)
+        semaphore = asyncio.Semaphore(settings.EXTRACT_CHUNK_CONCURRENCY)
+
+        async def extract_chunk(index: int, chunk: str) -> Optional[List[Dict[str, Any]]]:
+            user_content = (
+                f"Fragmento {index + 1} de {len(chunks)} del documento. "
+                "Extrae solo lo que aparezca en este fragmento; lo que no esté, devuélvelo como null.\n\n"
+                f"Texto del documento:\n{chunk}"
+            )
+            try:
+                async with semaphore:
+                    items = await self._request_items(db, prompt_system, user_content, provider, model, use_cache)
+                return self._to_results(items, fields)
+            except Exception as e:
+                logger.error(f"[Extractor] Error in chunk {index + 1}/{len(chunks)}: {e}")
+                return None
+
+        chunk_results = await asyncio.gather(*[extract_chunk(i, c) for i, c in enumerate(chunks)])
+        successful = [r for r in chunk_results if r is not None]
+        if not successful:
+            return []
+        return self.merge_chunk_results(successful, fields)
+
 extractor_service = ExtractorService()
@@ -0,0 +1,190 @@
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.extractor import LLMCacheEntry
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize_content(content) -> str:
+    if not isinstance(content, str):
+        return json.dumps(content, sort_keys=True, ensure_ascii=False)
+    # Espacios al final de línea y saltos de línea no cambian la respuesta
+    lines = [line.rstrip() for line in content.replace("\r\n", "\n").split("\n")]
+    return "\n".join(lines).strip()
+
+
+class LLMResponseCache:
+    """
+    Caché persistente (tabla llm_cache) de respuestas de LLM.
+
+    La clave es sha256 de proveedor, modelo, mensajes normalizados,
+    temperatura y json_mode. Solo se cachean llamadas con temperatura
+    <= LLM_CACHE_MAX_TEMPERATURE. Las entradas vencen tras LLM_CACHE_TTL_HOURS
+    y, por encima de LLM_CACHE_MAX_ENTRIES, se eliminan las menos usadas.
+    """
+
+    # Cada cuántas escrituras se revisa el tamaño de la tabla
+    EVICT_EVERY = 50
+
+    def __init__(self, ttl_hours: int, max_entries: int):
+        self.ttl = timedelta(hours=ttl_hours)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+
+    def is_cacheable(self, temperature: float) -> bool:
+        return settings.LLM_CACHE_ENABLED and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+
+    def make_key(
+        self,
+        provider: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        json_mode: bool,
+    ) -> str:
+        payload = {
+            "provider": provider,
+            "model": model,
+            "messages": [
+                {"role": m.get("role"), "content": _normalize_content(m.get("content", ""))}
+                for m in messages
+            ],
+            "temperature": round(float(temperature), 3),
+            "json_mode": bool(json_mode),
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _session(self, db: Optional[Session]) -> Session:
+        # Sesión propia para no confirmar cambios pendientes de quien llama
+        if db is not None:
+            return Session(bind=db.get_bind())
+        from app.db.session import SessionLocal
+        return SessionLocal()
+
+    def get(self, db: Optional[Session], key: str) -> Optional[str]:
+        session = self._session(db)
+        try:
+            entry = session.get(LLMCacheEntry, key)
+            now = datetime.utcnow()
+            if entry is None or entry.created_at < now - self.ttl:
+                with self._lock:
+                    self.misses += 1
+                return None
+            entry.hits = (entry.hits or 0) + 1
+            entry.last_hit_at = now
+            response = entry.response
+            session.commit()
+            with self._lock:
+                self.hits += 1
+            return response
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            session.rollback()
+            return None
+        finally:
+            session.close()
+
+    def put(self, db: Optional[Session], key: str, provider: str, model: str, response: str) -> None:
+        if not response:
+            return
+        session = self._session(db)
+        try:
+            now = datetime.utcnow()
+            session.merge(LLMCacheEntry(
+                key=key,
+                provider=provider,
+                model=model,
+                response=response,
+                size=len(response),
+                hits=0,
+                created_at=now,
+                last_hit_at=now,
+            ))
+            session.commit()
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % self.EVICT_EVERY == 0
+            if evict:
+                self.evict(session)
+        except Exception as e:
+            logger.warning(f"LLM cache write failed: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    def discard(self, db: Optional[Session], key: str) -> None:
+        session = self._session(db)
+        try:
+            session.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            logger.warning(f"LLM cache delete failed: {e}")
+            session.rollback()
+        finally:
+            session.close()
+
+    def evict(self, session: Session) -> int:
+        """Borra entradas vencidas y, si sobran, las de uso más antiguo."""
+        removed = session.query(LLMCacheEntry).filter(
+            LLMCacheEntry.created_at < datetime.utcnow() - self.ttl
+        ).delete(synchronize_session=False)
+
+        total = session.query(func.count(LLMCacheEntry.key)).scalar() or 0
+        overflow = total - self.max_entries
+        if overflow > 0:
+            oldest = [
+                k for (k,) in session.query(LLMCacheEntry.key)
+                .order_by(LLMCacheEntry.last_hit_at.asc())
+                .limit(overflow)
+                .all()
+            ]
+            removed += session.query(LLMCacheEntry).filter(
+                LLMCacheEntry.key.in_(oldest)
+            ).delete(synchronize_session=False)
+        session.commit()
+        if removed:
+            logger.info(f"LLM cache evicted {removed} entries")
+        return removed
+
+    def clear(self, db: Session) -> int:
+        removed = db.query(LLMCacheEntry).delete(synchronize_session=False)
+        db.commit()
+        return removed
+
+    def stats(self, db: Session) -> dict:
+        entries, size, stored_hits = db.query(
+            func.count(LLMCacheEntry.key),
+            func.coalesce(func.sum(LLMCacheEntry.size), 0),
+            func.coalesce(func.sum(LLMCacheEntry.hits), 0),
+        ).one()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "enabled": settings.LLM_CACHE_ENABLED,
+            "entries": entries,
+            "size_bytes": size,
+            "total_hits": stored_hits,
+            "process_hits": hits,
+            "process_misses": misses,
+            "hit_rate": (hits / total) if total else 0.0,
+        }
+
+
+llm_cache = LLMResponseCache(
+    ttl_hours=settings.LLM_CACHE_TTL_HOURS,
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+)
@@ -1,14 +1,29 @@
-import os
 import json
-from typing import List, Dict, Optional, Any
-from openai import OpenAI
-from anthropic import Anthropic
+import asyncio
+import logging
+import threading
+from typing import List, Dict, Optional, Any, Tuple, Callable
+import httpx
+from openai import AsyncOpenAI
+from anthropic import AsyncAnthropic
 from sqlalchemy.orm import Session
-from app.models.extractor import ExtractorSetting
+from app.core.config import settings
+from app.services.ai.llm_cache import llm_cache
+from app.services.ai.settings_cache import settings_cache
+
+logger = logging.getLogger(__name__)
 
 class LLMProvider:
     _instance = None
 
+    def __init__(self):
+        # Clientes async reutilizados por (proveedor, api key). Cada uno mantiene
+        # su propio pool de conexiones keep-alive ligado al event loop que lo creó.
+        self._clients: Dict[Tuple[str, str], Tuple[asyncio.AbstractEventLoop, Any]] = {}
+        self._clients_lock = threading.Lock()
+        # Cierres pendientes de clientes reemplazados (evita que el GC cancele la tarea)
+        self._closing: set = set()
+
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
@@ -16,19 +31,53 @@ class LLMProvider:
         return cls._instance
 
     def _get_api_key(self, db: Session, key_name: str) -> str:
-        # 1. Check in database settings
-        setting = db.query(ExtractorSetting).filter(ExtractorSetting.key == key_name).first()
-        if setting and setting.value:
-            return setting.value
-        
-        # 2. Check in environment variables
-        env_val = os.getenv(key_name.upper())
-        if env_val:
-            return env_val
-        
-        return ""
+        # Database settings first, then environment variables
+        return settings_cache.get(db, key_name)
+
+    def _http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+
+    def _cached_client(self, provider: str, api_key: str, factory):
+        loop = asyncio.get_running_loop()
+        key = (provider, api_key)
+        with self._clients_lock:
+            cached = self._clients.get(key)
+            if cached and cached[0] is loop and not loop.is_closed():
+                return cached[1]
+            # El cliente de otro loop y los de claves que ya no están configuradas
+            # (rotadas) se retiran y se cierran
+            stale = [k for k in self._clients if k[0] == provider and (k == key or k[1] != api_key)]
+            replaced = [self._clients.pop(k) for k in stale]
+            client = factory()
+            self._clients[key] = (loop, client)
+        for old_loop, old_client in replaced:
+            self._close_later(old_loop, old_client)
+        return client
 
-    def _get_openai_client(self, db: Session, provider: str = "openai") -> OpenAI:
+    def _close_later(self, loop: asyncio.AbstractEventLoop, client) -> None:
+        if loop is not asyncio.get_running_loop() and loop.is_running():
+            # Sigue vivo en otro hilo: se cierra en su propio loop
+            asyncio.run_coroutine_threadsafe(self._close_quietly(client), loop)
+            return
+        task = asyncio.get_running_loop().create_task(self._close_quietly(client))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_quietly(client) -> None:
+        try:
+            await client.close()
+        except Exception as e:
+            # Conexiones ligadas a un loop ya cerrado
+            logger.debug(f"Error closing replaced LLM client: {e}")
+
+    def _get_openai_client(self, db: Session, provider: str = "openai") -> AsyncOpenAI:
         key_name = "openai_api_key" if provider == "openai" else "kimi_api_key"
         base_url = "https://api.moonshot.cn/v1" if provider == "kimi" else None
         
@@ -37,14 +86,70 @@ class LLMProvider:
             name = "OpenAI" if provider == "openai" else "Kimi (Moonshot)"
             raise ValueError(f"{name} API key not configured.")
         
-        return OpenAI(api_key=api_key, base_url=base_url)
+        return self._cached_client(
+            provider,
+            api_key,
+            lambda: AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=self._http_client()),
+        )
 
-    def _get_anthropic_client(self, db: Session) -> Anthropic:
+    def _get_anthropic_client(self, db: Session) -> AsyncAnthropic:
         api_key = self._get_api_key(db, "anthropic_api_key")
         if not api_key:
             raise ValueError("Anthropic (Claude) API key not configured.")
         
-        return Anthropic(api_key=api_key)
+        return self._cached_client(
+            "anthropic",
+            api_key,
+            lambda: AsyncAnthropic(api_key=api_key, http_client=self._http_client()),
+        )
+
+    async def aclose(self):
+        with self._clients_lock:
+            clients = list(self._clients.values())
+            self._clients = {}
+        for loop, client in clients:
+            if loop is asyncio.get_running_loop():
+                await client.close()
+
+    def _cached_valid(self, db: Optional[Session], key: str, validate: Optional[Callable[[str], Any]]) -> Optional[str]:
+        cached = llm_cache.get(db, key)
+        if cached is None or validate is None:
+            return cached
+        try:
+            validate(cached)
+            return cached
+        except Exception:
+            # Entrada guardada antes de validar (p. ej. JSON truncado): se descarta
+            llm_cache.discard(db, key)
+            return None
+
+    def cached(
+        self,
+        db: Optional[Session],
+        provider: str,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        json_mode: bool,
+        fetch: Callable[[], str],
+        use_cache: bool = True,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> str:
+        """
+        Variante síncrona de la caché para llamadas que no pasan por complete()
+        (p. ej. app.utils). `fetch` solo se ejecuta en un fallo de caché.
+        """
+        if not use_cache or not llm_cache.is_cacheable(temperature):
+            return fetch()
+        key = llm_cache.make_key(provider, model, messages, temperature, json_mode)
+        cached = self._cached_valid(db, key, validate)
+        if cached is not None:
+            return cached
+        content = fetch()
+        if validate is not None:
+            validate(content)
+        llm_cache.put(db, key, provider, model, content)
+        return content
 
     async def complete(
         self,
@@ -53,13 +158,44 @@ class LLMProvider:
         messages: List[Dict[str, str]],
         model: str,
         temperature: float = 0.0,
-        json_mode: bool = False
+        json_mode: bool = False,
+        use_cache: bool = True,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> str:
+        """
+        Respuesta del modelo, desde la caché si es posible. Si se pasa
+        `validate` (normalmente el parser de quien llama), la respuesta solo se
+        guarda cuando validate no lanza excepción; si lanza, la excepción llega
+        a quien llama y el siguiente intento vuelve a consultar al modelo.
+        """
+        cache_key = None
+        if use_cache and llm_cache.is_cacheable(temperature):
+            cache_key = llm_cache.make_key(provider, model, messages, temperature, json_mode)
+            cached = self._cached_valid(db, cache_key, validate)
+            if cached is not None:
+                return cached
+
+        content = await self._complete(db, provider, messages, model, temperature, json_mode)
+        if validate is not None:
+            validate(content)
+        if cache_key:
+            llm_cache.put(db, cache_key, provider, model, content)
+        return content
+
+    async def _complete(
+        self,
+        db: Session,
+        provider: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        temperature: float,
+        json_mode: bool
     ) -> str:
         if provider in ["openai", "kimi"]:
             client = self._get_openai_client(db, provider)
             response_format = {"type": "json_object"} if json_mode else None
             
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=temperature,
@@ -74,7 +210,7 @@ class LLMProvider:
             system_msg = next((m["content"] for m in messages if m["role"] == "system"), None)
             user_messages = [m for m in messages if m["role"] != "system"]
             
-            response = client.messages.create(
+            response = await client.messages.create(
                 model=model,
                 max_tokens=4096,
                 temperature=temperature,
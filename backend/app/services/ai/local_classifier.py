@@ -0,0 +1,187 @@
+import re
+import math
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.extractor import DocType, ExtractedDocument
+from app.services.ai.classifier import safe_parse_json_list
+from app.services.ai.retrieval import tokenize
+
+logger = logging.getLogger(__name__)
+
+def is_heading(line: str) -> bool:
+    """Línea mayormente en mayúsculas ('RESOLUCIÓN No. 0456 DE 2024')."""
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and sum(c.isupper() for c in letters) >= 0.7 * len(letters)
+
+
+class ProjectIndex:
+    """
+    Índice de un proyecto: frases clave (nombre y alias de cada tipo) y un
+    centroide TF-IDF por tipo construido con sus metadatos y con el texto de
+    los documentos aprobados.
+    """
+
+    def __init__(self, doc_types: List[DocType], examples: List[Tuple[int, str]]):
+        self.phrases: List[Tuple[str, int]] = []
+        profiles: Dict[int, Counter] = {}
+        for dt in doc_types:
+            names = [dt.name] + [str(a) for a in safe_parse_json_list(dt.aliases)]
+            for name in names:
+                phrase = " ".join(tokenize(name))
+                if phrase:
+                    self.phrases.append((phrase, dt.id))
+            bag = Counter()
+            # Nombre y alias pesan más que la descripción
+            for name in names:
+                for token in tokenize(name):
+                    bag[token] += 3
+            bag.update(tokenize(f"{dt.description or ''} {dt.prompt_hint or ''}"))
+            profiles[dt.id] = bag
+
+        for type_id, text in examples:
+            if type_id in profiles:
+                profiles[type_id].update(tokenize(text[:settings.LOCAL_CLASSIFY_HEAD_CHARS]))
+
+        # Cada tipo es un "documento" del corpus para calcular el IDF
+        df = Counter()
+        for bag in profiles.values():
+            df.update(bag.keys())
+        n = len(profiles)
+        self.idf = {token: math.log((1 + n) / (1 + count)) + 1 for token, count in df.items()}
+        self.centroids = {type_id: self._vector(bag) for type_id, bag in profiles.items()}
+
+    def _vector(self, bag: Counter) -> Dict[str, float]:
+        vector = {t: (1 + math.log(c)) * self.idf[t] for t, c in bag.items() if t in self.idf}
+        norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+        return {t: v / norm for t, v in vector.items()}
+
+    def keyword_match(self, text: str) -> Optional[int]:
+        """
+        Tipo cuyo nombre o alias aparece primero en los títulos (líneas en
+        mayúsculas) del encabezado. None si no aparece ninguno o hay empate.
+        """
+        head = " ".join(
+            " ".join(tokenize(line))
+            for line in text[:settings.LOCAL_CLASSIFY_KEYWORD_CHARS].splitlines()
+            if is_heading(line)
+        )
+        matches = []
+        for phrase, type_id in self.phrases:
+            match = re.search(rf"\b{re.escape(phrase)}\b", head)
+            if match:
+                # Primero la posición; a igual posición, la frase más larga
+                matches.append((match.start(), -len(phrase), type_id))
+        if not matches:
+            return None
+        best = min(matches)
+        ties = {type_id for pos, length, type_id in matches if (pos, length) == best[:2]}
+        return best[2] if len(ties) == 1 else None
+
+    def tfidf_match(self, text: str) -> Tuple[Optional[int], float]:
+        """
+        Tipo más similar y su confianza (0.0 a 1.0): la similitud coseno
+        absoluta por el margen relativo sobre el segundo tipo. Un texto que
+        apenas comparte una palabra con un solo tipo tiene margen 1.0 pero
+        similitud baja, así que no llega al umbral y decide el LLM.
+        """
+        vector = self._vector(Counter(tokenize(text[:settings.LOCAL_CLASSIFY_HEAD_CHARS])))
+        scores = sorted(
+            ((sum(w * centroid.get(t, 0.0) for t, w in vector.items()), type_id)
+             for type_id, centroid in self.centroids.items()),
+            reverse=True,
+        )
+        if not scores or scores[0][0] < settings.LOCAL_CLASSIFY_MIN_SIMILARITY:
+            return None, 0.0
+        best, type_id = scores[0]
+        second = scores[1][0] if len(scores) > 1 else 0.0
+        return type_id, min(best, 1.0) * (best - second) / best
+
+
+class LocalClassifier:
+    """
+    Preclasificador léxico que corre antes del LLM. Si la confianza supera
+    el umbral del proyecto (local_classify_threshold), el tipo se asigna sin
+    llamar al LLM y classification_source queda como "local_keyword" o
+    "local_tfidf".
+
+    Un título que nombra un tipo no basta para saltarse el LLM con el umbral
+    por defecto (un oficio que cita "RESOLUCIÓN No. ..." en su asunto no es
+    una resolución): solo sube por encima cuando TF-IDF coincide.
+    """
+
+    KEYWORD_CONFIDENCE = 0.85
+    KEYWORD_AGREEMENT_CONFIDENCE = 0.97
+
+    def __init__(self):
+        self._indexes: Dict[int, Tuple[str, ProjectIndex]] = {}
+        self._lock = threading.Lock()
+
+    def _signature(self, db: Session, project_id: int, doc_types: List[DocType]) -> str:
+        count, last_id = db.query(
+            func.count(ExtractedDocument.id), func.max(ExtractedDocument.id)
+        ).filter(*self._example_filter(project_id)).one()
+        raw = "|".join(
+            f"{dt.id}:{dt.name}:{dt.aliases}:{dt.description}:{dt.prompt_hint}" for dt in doc_types
+        ) + f"|{count}:{last_id}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _example_filter(self, project_id: int):
+        # Solo documentos aprobados cuyo tipo no lo puso este mismo clasificador
+        return (
+            ExtractedDocument.project_id == project_id,
+            ExtractedDocument.review_status == "approved",
+            ExtractedDocument.doc_type_id.isnot(None),
+            ExtractedDocument.ocr_text.isnot(None),
+            or_(
+                ExtractedDocument.classification_source.is_(None),
+                ExtractedDocument.classification_source.notlike("local%"),
+            ),
+        )
+
+    async def get_index(self, db: Session, project_id: int, doc_types: List[DocType]) -> ProjectIndex:
+        signature = self._signature(db, project_id, doc_types)
+        with self._lock:
+            cached = self._indexes.get(project_id)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        examples = db.query(ExtractedDocument.doc_type_id, ExtractedDocument.ocr_text).filter(
+            *self._example_filter(project_id)
+        ).order_by(ExtractedDocument.id.desc()).limit(settings.LOCAL_CLASSIFY_MAX_EXAMPLES).all()
+        # Tokenizar los ejemplos es CPU: fuera del event loop
+        index = await asyncio.to_thread(ProjectIndex, doc_types, examples)
+        with self._lock:
+            self._indexes[project_id] = (signature, index)
+        logger.debug(f"Local classifier index rebuilt for project {project_id} ({len(examples)} examples)")
+        return index
+
+    async def classify(
+        self, db: Session, project_id: int, text: str, doc_types: List[DocType]
+    ) -> Tuple[Optional[int], float, Optional[str]]:
+        """Devuelve (tipo, confianza, origen). Origen None si no hay candidato."""
+        if not doc_types or not text or len(text.strip()) < 10:
+            return None, 0.0, None
+
+        index = await self.get_index(db, project_id, doc_types)
+        keyword_type = index.keyword_match(text)
+        tfidf_type, confidence = index.tfidf_match(text)
+        if keyword_type is not None:
+            if keyword_type == tfidf_type:
+                return keyword_type, self.KEYWORD_AGREEMENT_CONFIDENCE, "local_keyword"
+            return keyword_type, self.KEYWORD_CONFIDENCE, "local_keyword"
+
+        if tfidf_type is not None:
+            return tfidf_type, confidence, "local_tfidf"
+        return None, 0.0, None
+
+
+local_classifier = LocalClassifier()
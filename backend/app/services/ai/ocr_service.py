@@ -1,14 +1,146 @@
 import os
+import re
+import asyncio
+import threading
+import multiprocessing
+from datetime import datetime
 import fitz  # PyMuPDF
-from typing import Dict, Any, Tuple
-from azure.ai.formrecognizer import DocumentAnalysisClient
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+from azure.ai.formrecognizer.aio import DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
 from sqlalchemy.orm import Session
-from app.models.extractor import ExtractorSetting
+from app.core.config import settings
+from app.models.extractor import OCRCacheEntry
+from app.services.ai.settings_cache import settings_cache
+
+
+# Por debajo de esta cantidad de caracteres una página con imágenes se
+# considera escaneada; sin imágenes es una página en blanco (o casi)
+MIN_CHARS_PER_PAGE = 50
+
+# El texto guardado separa las páginas con un salto de página (form feed),
+# que no aparece en búsquedas ni en el índice FTS. Los marcadores visibles
+# solo se agregan al armar los prompts (mark_pages)
+PAGE_BREAK = "\f"
+PAGE_MARKER = "--- PÁGINA {} ---"
+# Texto guardado antes del salto de página, con los marcadores incluidos
+PAGE_MARKER_RE = re.compile(r"^--- PÁGINA (\d+) ---$", re.MULTILINE)
+
+
+def join_pages(pages: Iterable[Tuple[int, str]]) -> str:
+    """Une las páginas (número, texto) en orden; las vacías se conservan para no correr la numeración."""
+    return PAGE_BREAK.join(text.strip() for _, text in pages)
+
+
+def split_pages(text: str) -> List[Tuple[int, str]]:
+    """Páginas (número, texto) de un texto de join_pages o con los marcadores antiguos."""
+    markers = list(PAGE_MARKER_RE.finditer(text or ""))
+    if markers:
+        bounds = [m.end() for m in markers]
+        return [
+            (int(m.group(1)), text[start:end].strip())
+            for m, start, end in zip(markers, bounds, [m.start() for m in markers[1:]] + [len(text)])
+        ]
+    return list(enumerate((text or "").split(PAGE_BREAK), start=1))
+
+
+def mark_pages(text: str) -> str:
+    """Texto con un marcador "--- PÁGINA N ---" antes de cada página no vacía, para el LLM."""
+    pages = split_pages(text)
+    if len(pages) <= 1:
+        return text
+    return "\n".join(f"{PAGE_MARKER.format(number)}\n{page}" for number, page in pages if page.strip())
+
+
+def text_length(text: str) -> int:
+    """Caracteres de texto, sin separadores de página."""
+    return len(PAGE_MARKER_RE.sub("", text or "").replace(PAGE_BREAK, "").strip())
+
+
+def extract_pdf_page_range(file_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """
+    Extrae las páginas [start, end) abriendo el documento una sola vez.
+    Se ejecuta en el pool de procesos; cada página indica si parece escaneada
+    (poco texto y alguna imagen). Las portadas, separadores o páginas de firma
+    sin imágenes no se mandan a OCR.
+    """
+    pages = []
+    try:
+        with fitz.open(file_path) as doc:
+            for index in range(start, min(end, len(doc))):
+                page = doc[index]
+                text = page.get_text()
+                pages.append({
+                    "page": index + 1,
+                    "text": text,
+                    "scanned": len(text.strip()) <= MIN_CHARS_PER_PAGE and bool(page.get_images()),
+                })
+    except Exception as e:
+        print(f"[OCR] Local extraction failed for pages {start + 1}-{end}: {e}")
+    return pages
+
+
+def azure_page_texts(result) -> List[str]:
+    """
+    Texto de cada página de un resultado de prebuilt-read, tomado de
+    result.content (con el orden de lectura de Azure) por los spans de la
+    página; si no hay spans, de sus líneas.
+    """
+    content = getattr(result, "content", None) or ""
+    texts = []
+    for page in result.pages or []:
+        spans = getattr(page, "spans", None) or []
+        if content and spans:
+            texts.append("".join(content[span.offset:span.offset + span.length] for span in spans))
+        else:
+            texts.append("\n".join(line.content for line in (page.lines or [])))
+    return texts
+
+
+def _read_file(file_path: str) -> bytes:
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def pdf_page_count(file_path: str) -> int:
+    try:
+        with fitz.open(file_path) as doc:
+            return len(doc)
+    except Exception as e:
+        print(f"[OCR] Could not open PDF: {e}")
+        return 0
+
+
+def build_sub_pdf(file_path: str, pages: List[int]) -> bytes:
+    """Arma un PDF en memoria solo con las páginas indicadas (numeradas desde 1)."""
+    with fitz.open(file_path) as src, fitz.open() as sub:
+        for page in pages:
+            sub.insert_pdf(src, from_page=page - 1, to_page=page - 1)
+        return sub.tobytes(garbage=3, deflate=True)
+
+
+def split_page_ranges(page_count: int, shards: int, min_pages: int) -> List[Tuple[int, int]]:
+    """Reparte las páginas en rangos contiguos de al menos min_pages páginas."""
+    if page_count <= 0:
+        return []
+    size = max(min_pages, -(-page_count // max(shards, 1)))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
 
 class OCRService:
     _instance = None
 
+    def __init__(self):
+        # PyMuPDF es CPU-bound: se ejecuta en un pool de procesos fuera del event loop.
+        # Azure es I/O-bound: cliente async reutilizado por (endpoint, key) y
+        # limitado con un semáforo por event loop.
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._azure_semaphore: Optional[asyncio.Semaphore] = None
+        self._azure_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._azure_clients: Dict[Tuple[str, str], Tuple[asyncio.AbstractEventLoop, DocumentAnalysisClient]] = {}
+        self._azure_clients_lock = threading.Lock()
+
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
@@ -16,63 +148,224 @@ class OCRService:
         return cls._instance
 
     def _get_setting(self, db: Session, key_name: str) -> str:
-        setting = db.query(ExtractorSetting).filter(ExtractorSetting.key == key_name).first()
-        if setting and setting.value:
-            return setting.value
-        return os.getenv(key_name.upper(), "")
+        return settings_cache.get(db, key_name)
 
-    def extract_text_from_pdf_local(self, file_path: str) -> Tuple[str, int]:
-        """Extrae texto usando PyMuPDF (fitz). Bueno para PDFs digitales."""
-        try:
-            doc = fitz.open(file_path)
-            text_parts = []
-            for page in doc:
-                text_parts.append(page.get_text())
-            text = "\n".join(text_parts).strip()
-            page_count = len(doc)
-            doc.close()
-            return text, page_count
-        except Exception as e:
-            print(f"[OCR] Local extraction failed: {e}")
-            return "", 0
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
 
-    async def extract_text_with_azure(self, db: Session, file_path: str) -> Tuple[str, int]:
-        """Extrae texto usando Azure Form Recognizer. Necesario para documentos escaneados."""
+    def _get_azure_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._azure_semaphore is None or self._azure_loop is not loop:
+            self._azure_semaphore = asyncio.Semaphore(settings.AZURE_OCR_CONCURRENCY)
+            self._azure_loop = loop
+        return self._azure_semaphore
+
+    def _get_azure_client(self, endpoint: str, key: str) -> DocumentAnalysisClient:
+        loop = asyncio.get_running_loop()
+        with self._azure_clients_lock:
+            cached = self._azure_clients.get((endpoint, key))
+            if cached and cached[0] is loop and not loop.is_closed():
+                return cached[1]
+            # Los 429/503 se reintentan con backoff exponencial (política de azure-core)
+            client = DocumentAnalysisClient(
+                endpoint,
+                AzureKeyCredential(key),
+                retry_total=settings.AZURE_OCR_RETRY_TOTAL,
+            )
+            self._azure_clients[(endpoint, key)] = (loop, client)
+            return client
+
+    async def aclose(self):
+        with self._azure_clients_lock:
+            clients = list(self._azure_clients.values())
+            self._azure_clients = {}
+        for loop, client in clients:
+            if loop is asyncio.get_running_loop():
+                await client.close()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _page_ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        return split_page_ranges(page_count, settings.OCR_WORKERS, settings.OCR_MIN_PAGES_PER_SHARD)
+
+    async def extract_pdf_pages(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Extrae el texto página por página repartiendo rangos de páginas entre
+        los procesos del pool. Devuelve las páginas en orden, cada una con
+        su decisión digital/escaneada.
+        """
+        loop = asyncio.get_running_loop()
+        page_count = await asyncio.to_thread(pdf_page_count, file_path)
+        executor = self._get_executor()
+        shards = await asyncio.gather(*[
+            loop.run_in_executor(executor, extract_pdf_page_range, file_path, start, end)
+            for start, end in self._page_ranges(page_count)
+        ])
+        return [page for shard in shards for page in shard]
+
+    def extract_pdf_pages_sync(self, file_path: str) -> List[Dict[str, Any]]:
+        """Igual que extract_pdf_pages, para código síncrono (endpoints def)."""
+        ranges = self._page_ranges(pdf_page_count(file_path))
+        if len(ranges) <= 1:
+            # Un solo rango: no compensa enviar el trabajo a otro proceso
+            return [page for start, end in ranges for page in extract_pdf_page_range(file_path, start, end)]
+        shards = self._get_executor().map(
+            extract_pdf_page_range,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+        )
+        return [page for shard in shards for page in shard]
+
+    async def _analyze_with_azure(self, db: Session, document: Union[str, bytes]):
+        """Ejecuta prebuilt-read sobre una ruta o sobre los bytes de un PDF. None si no hay resultado."""
         endpoint = self._get_setting(db, "azure_di_endpoint")
         key = self._get_setting(db, "azure_di_key")
 
         if not endpoint or not key:
             print("[OCR] Azure DI not configured.")
-            return "", 0
+            return None
 
         try:
-            client = DocumentAnalysisClient(endpoint, AzureKeyCredential(key))
-            with open(file_path, "rb") as f:
-                poller = client.begin_analyze_document("prebuilt-read", document=f)
-                result = poller.result()
-            
-            text = result.content or ""
-            page_count = len(result.pages) if result.pages else 1
-            return text, page_count
+            if isinstance(document, str):
+                document = await asyncio.to_thread(_read_file, document)
+            client = self._get_azure_client(endpoint, key)
+            async with self._get_azure_semaphore():
+                # El sondeo del poller es async: mientras un documento espera
+                # a Azure, los demás se envían y sondean en paralelo
+                poller = await client.begin_analyze_document(
+                    "prebuilt-read",
+                    document=document,
+                    polling_interval=settings.AZURE_OCR_POLL_SECONDS,
+                )
+                return await poller.result()
         except Exception as e:
             print(f"[OCR] Azure DI failed: {e}")
+            return None
+
+    async def extract_text_with_azure(self, db: Session, file_path: str) -> Tuple[str, int]:
+        """Extrae texto usando Azure Form Recognizer. Necesario para documentos escaneados."""
+        result = await self._analyze_with_azure(db, file_path)
+        if result is None:
             return "", 0
+        pages = azure_page_texts(result)
+        text = join_pages(enumerate(pages, start=1))
+        return (text if text_length(text) else result.content or ""), len(pages) or 1
+
+    async def extract_pages_with_azure(self, db: Session, file_path: str, pages: List[int]) -> Dict[int, str]:
+        """
+        Envía a Azure solo las páginas indicadas (un sub-PDF armado en el pool
+        de procesos) y devuelve el texto de cada una con su número original.
+        """
+        loop = asyncio.get_running_loop()
+        sub_pdf = await loop.run_in_executor(self._get_executor(), build_sub_pdf, file_path, pages)
+        result = await self._analyze_with_azure(db, sub_pdf)
+        if result is None or not result.pages:
+            return {}
+        return dict(zip(pages, azure_page_texts(result)))
+
+    def get_cached(self, db: Session, file_hash: str) -> Optional[Dict[str, Any]]:
+        entry = db.query(OCRCacheEntry).filter(OCRCacheEntry.file_hash == file_hash).first()
+        if not entry:
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_hit_at = datetime.utcnow()
+        db.commit()
+        return {"text": entry.text, "page_count": entry.page_count, "provider": entry.provider}
+
+    def store_cached(self, db: Session, file_hash: str, result: Dict[str, Any]) -> None:
+        text = result.get("text") or ""
+        page_count = result.get("page_count") or 0
+        # No se guarda un resultado degradado (Azure caído o sin configurar):
+        # el próximo intento debe poder obtener un texto mejor. Por página,
+        # solo cuentan las escaneadas; las páginas en blanco no tienen más texto
+        if settings.OCR_ROUTING_MODE == "page":
+            degraded = result.get("provider") == "pymupdf" and bool(result.get("scanned_pages"))
+        else:
+            degraded = result.get("provider") == "pymupdf" and (
+                text_length(text) <= page_count * MIN_CHARS_PER_PAGE
+            )
+        if not text_length(text) or degraded:
+            return
+        try:
+            db.merge(OCRCacheEntry(
+                file_hash=file_hash,
+                text=text,
+                page_count=page_count,
+                provider=result.get("provider"),
+                hits=0,
+                created_at=datetime.utcnow(),
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[OCR] Could not store OCR cache entry: {e}")
 
-    async def get_text(self, db: Session, file_path: str) -> Dict[str, Any]:
+    async def get_text(self, db: Session, file_path: str, file_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Igual que extract_text, pero reutiliza el resultado de cualquier archivo
+        con el mismo contenido (hash SHA-256), sin importar el proyecto.
+        """
+        if file_hash:
+            cached = self.get_cached(db, file_hash)
+            if cached:
+                return cached
+
+        result = await self.extract_text(db, file_path)
+        if file_hash:
+            self.store_cached(db, file_hash, result)
+        return result
+
+    async def extract_text(self, db: Session, file_path: str) -> Dict[str, Any]:
         """
         Estrategia híbrida: intenta local primero, si hay poco texto, usa Azure.
+        Con OCR_ROUTING_MODE="page" solo las páginas escaneadas van a Azure.
         """
         ext = os.path.splitext(file_path)[1].lower()
         
         if ext == ".pdf":
-            text, page_count = self.extract_text_from_pdf_local(file_path)
+            pages = await self.extract_pdf_pages(file_path)
+            text = join_pages((p["page"], p["text"]) for p in pages)
+            page_count = len(pages)
+            scanned_pages = [p["page"] for p in pages if p["scanned"]]
             
-            # Si hay más de 50 caracteres por página, asumimos que es digital y suficiente
-            if len(text) > (page_count * 50):
+            if settings.OCR_ROUTING_MODE == "page":
+                # Cada página se decide por su propia densidad de texto
+                is_digital = not scanned_pages
+                if scanned_pages and len(scanned_pages) < page_count:
+                    # Documento mixto: solo las páginas con poco texto pasan por Azure
+                    azure_pages = await self.extract_pages_with_azure(db, file_path, scanned_pages)
+                    if azure_pages:
+                        return {
+                            "text": join_pages((p["page"], azure_pages.get(p["page"], p["text"])) for p in pages),
+                            "page_count": page_count,
+                            "provider": "pymupdf+azure_di",
+                            "scanned_pages": scanned_pages,
+                        }
+                    return {
+                        "text": text,
+                        "page_count": page_count,
+                        "provider": "pymupdf",
+                        "scanned_pages": scanned_pages,
+                    }
+            else:
+                # Si hay más de 50 caracteres por página, asumimos que es digital y suficiente
+                is_digital = text_length(text) > (page_count * MIN_CHARS_PER_PAGE)
+
+            if is_digital:
                 return {
                     "text": text,
                     "page_count": page_count,
-                    "provider": "pymupdf"
+                    "provider": "pymupdf",
+                    "scanned_pages": scanned_pages,
                 }
             
             # De lo contrario, intentar con Azure
@@ -88,7 +381,8 @@ class OCRService:
             return {
                 "text": text,
                 "page_count": page_count,
-                "provider": "pymupdf"
+                "provider": "pymupdf",
+                "scanned_pages": scanned_pages,
             }
 
         elif ext in [".png", ".jpg", ".jpeg", ".tiff", ".tif"]:
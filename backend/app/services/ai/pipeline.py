@@ -0,0 +1,380 @@
+import os
+import socket
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.utils import compute_file_hash
+from app.models.extractor import (
+    ExtractorProject, DocType, DocField, ExtractedDocument,
+    DocumentFieldValue, ProcessingJob
+)
+from app.services.ai.ocr_service import ocr_service
+from app.services.ai.classifier import classifier_service
+from app.services.ai.local_classifier import local_classifier
+from app.services.ai.extractor import extractor_service
+from app.services.ai.rules_engine import rules_engine
+
+logger = logging.getLogger(__name__)
+
+STAGES = ["ocr", "classify", "extract", "rules"]
+
+
+class ExtractionPipeline:
+    """
+    Planificador del flujo OCR -> clasificación -> extracción -> reglas.
+
+    La cola vive en la tabla processing_jobs, así que el trabajo pendiente
+    sobrevive a reinicios. Un despachador toma trabajos en cola hasta
+    PIPELINE_MAX_IN_FLIGHT y cada etapa tiene su propio semáforo; el texto de
+    PyMuPDF se calcula en el pool de procesos del OCRService.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._session_factory: Optional[Callable[[], Session]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stage_limits: Dict[str, asyncio.Semaphore] = {}
+        self._running: Set[int] = set()
+        self._stopping = False
+
+    @property
+    def started(self) -> bool:
+        return (
+            self._dispatcher is not None
+            and not self._dispatcher.done()
+            and self._loop is not None
+            and not self._loop.is_closed()
+        )
+
+    def start(self, session_factory: Callable[[], Session]) -> None:
+        """Arranca el despachador en el event loop actual (idempotente)."""
+        if self.started:
+            return
+        self._session_factory = session_factory
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stage_limits = {
+            "ocr": asyncio.Semaphore(settings.PIPELINE_OCR_CONCURRENCY),
+            "classify": asyncio.Semaphore(settings.PIPELINE_CLASSIFY_CONCURRENCY),
+            "extract": asyncio.Semaphore(settings.PIPELINE_EXTRACT_CONCURRENCY),
+            "rules": asyncio.Semaphore(settings.PIPELINE_RULES_CONCURRENCY),
+        }
+        self._running = set()
+        self._stopping = False
+        self._dispatcher = self._loop.create_task(self._dispatch_loop())
+        logger.info(f"Extraction pipeline started ({self.worker_id})")
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            # Se avisa con una bandera en vez de cancel(): wait_for puede tragarse
+            # la cancelación si coincide con el evento de wakeup
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._dispatcher, timeout=settings.PIPELINE_POLL_SECONDS + 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._dispatcher = None
+
+    def wake(self) -> None:
+        if self.started:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def enqueue(self, db: Session, doc_ids: Iterable[int], project_id: int) -> int:
+        """Encola documentos en la tabla de trabajos y despierta al despachador."""
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return 0
+        # Un documento reencolado reemplaza su trabajo pendiente anterior. Si hay
+        # uno en curso, el nuevo espera en cola (_claim) y el anterior se retira
+        # al terminar su etapa actual (_superseded)
+        db.query(ProcessingJob).filter(
+            ProcessingJob.document_id.in_(doc_ids),
+            ProcessingJob.status == "queued",
+        ).delete(synchronize_session=False)
+        db.add_all([
+            ProcessingJob(document_id=doc_id, project_id=project_id, stage="ocr", status="queued")
+            for doc_id in doc_ids
+        ])
+        db.commit()
+        self.wake()
+        return len(doc_ids)
+
+    def stats(self, db: Session, project_id: Optional[int] = None) -> Dict[str, int]:
+        from sqlalchemy import func
+        query = db.query(ProcessingJob.status, func.count(ProcessingJob.id))
+        if project_id is not None:
+            query = query.filter(ProcessingJob.project_id == project_id)
+        counts = dict(query.group_by(ProcessingJob.status).all())
+        counts["in_flight_here"] = len(self._running)
+        return counts
+
+    # --- Despachador ---
+
+    def _owner_is_dead(self, locked_by: Optional[str]) -> bool:
+        """True si el trabajo lo tomó un proceso de esta máquina que ya no existe."""
+        host, _, pid = (locked_by or "").rpartition(":")
+        if host != socket.gethostname() or not pid.isdigit() or locked_by == self.worker_id:
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            return False
+        return False
+
+    def _requeue_stale(self, db: Session) -> None:
+        """
+        Devuelve a la cola trabajos huérfanos (proceso caído, reiniciado o
+        colgado). Un trabajo tomado con nuestro worker_id que no está en
+        _running es de una ejecución anterior con el mismo host y PID (un
+        contenedor reiniciado corre siempre como PID 1); la primera pasada del
+        despachador, justo después de start(), lo recupera sin esperar al TTL.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=settings.PIPELINE_STALE_SECONDS)
+        running = db.query(ProcessingJob).filter(ProcessingJob.status == "running").all()
+        stale = [
+            job.id for job in running
+            if job.id not in self._running
+            and (
+                job.locked_by == self.worker_id
+                or self._owner_is_dead(job.locked_by)
+                or (job.locked_at and job.locked_at < cutoff)
+            )
+        ]
+        if stale:
+            db.execute(
+                update(ProcessingJob)
+                .where(ProcessingJob.id.in_(stale), ProcessingJob.status == "running")
+                .values(status="queued", locked_by=None, locked_at=None)
+            )
+            db.commit()
+            logger.info(f"Pipeline requeued {len(stale)} stale jobs")
+
+    def _claim(self, db: Session, limit: int):
+        # Nunca dos trabajos del mismo documento a la vez
+        active = aliased(ProcessingJob)
+        busy = db.query(active.id).filter(
+            active.document_id == ProcessingJob.document_id, active.status == "running"
+        ).exists()
+        candidates = (
+            db.query(ProcessingJob.id)
+            .filter(ProcessingJob.status == "queued", ~busy)
+            .order_by(ProcessingJob.id)
+            .limit(limit)
+            .all()
+        )
+        claimed = []
+        for (job_id,) in candidates:
+            # UPDATE condicional: si otro proceso lo tomó antes, rowcount es 0
+            result = db.execute(
+                update(ProcessingJob)
+                .where(ProcessingJob.id == job_id, ProcessingJob.status == "queued")
+                .values(
+                    status="running",
+                    locked_by=self.worker_id,
+                    locked_at=datetime.utcnow(),
+                    attempts=ProcessingJob.attempts + 1,
+                )
+            )
+            if result.rowcount:
+                claimed.append(job_id)
+        db.commit()
+        return claimed
+
+    async def _dispatch_loop(self) -> None:
+        last_stale_check = None
+        while not self._stopping:
+            try:
+                if last_stale_check is None or self._loop.time() - last_stale_check > 60:
+                    last_stale_check = self._loop.time()
+                    db = self._session_factory()
+                    try:
+                        self._requeue_stale(db)
+                    finally:
+                        db.close()
+
+                free = settings.PIPELINE_MAX_IN_FLIGHT - len(self._running)
+                if free > 0:
+                    db = self._session_factory()
+                    try:
+                        for job_id in self._claim(db, free):
+                            self._running.add(job_id)
+                            task = asyncio.create_task(self._run_job(job_id))
+                            task.add_done_callback(lambda _t, j=job_id: self._on_job_done(j))
+                    finally:
+                        db.close()
+            except Exception as e:
+                logger.error(f"Pipeline dispatch error: {e}")
+
+            if self._stopping:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.PIPELINE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_job_done(self, job_id: int) -> None:
+        self._running.discard(job_id)
+        self._wakeup.set()
+
+    def _superseded(self, db: Session, job: ProcessingJob) -> bool:
+        """True si el documento se reencoló mientras este trabajo corría."""
+        return db.query(ProcessingJob.id).filter(
+            ProcessingJob.document_id == job.document_id,
+            ProcessingJob.status == "queued",
+            ProcessingJob.id > job.id,
+        ).first() is not None
+
+    # --- Etapas ---
+
+    async def _run_job(self, job_id: int) -> None:
+        db = self._session_factory()
+        doc = None
+        job = None
+        try:
+            job = db.query(ProcessingJob).filter(ProcessingJob.id == job_id).first()
+            doc = db.query(ExtractedDocument).filter(ExtractedDocument.id == job.document_id).first() if job else None
+            project = db.query(ExtractorProject).filter(ExtractorProject.id == job.project_id).first() if job else None
+            if not doc or not project:
+                if job:
+                    job.status = "error"
+                    job.error_message = "Document or project not found"
+                    db.commit()
+                return
+
+            doc.status = "processing"
+            db.commit()
+
+            start = STAGES.index(job.stage) if job.stage in STAGES else 0
+            for stage in STAGES[start:]:
+                if self._superseded(db, job):
+                    logger.info(f"Job {job.id} superseded by a newer job for document {doc.id}")
+                    job.status = "superseded"
+                    job.locked_by = None
+                    job.locked_at = None
+                    db.commit()
+                    return
+                job.stage = stage
+                job.locked_at = datetime.utcnow()
+                db.commit()
+                async with self._stage_limits[stage]:
+                    await getattr(self, f"_stage_{stage}")(db, doc, project)
+
+            job.stage = "done"
+            job.status = "completed"
+            doc.status = "completed"
+            db.commit()
+
+        except Exception as e:
+            logger.error(f"Error processing document {job.document_id if job else job_id}: {e}")
+            db.rollback()
+            if job is not None:
+                # Reintentar desde la misma etapa hasta PIPELINE_MAX_ATTEMPTS
+                retry = (job.attempts or 0) < settings.PIPELINE_MAX_ATTEMPTS
+                job.status = "queued" if retry else "error"
+                job.error_message = str(e)
+                job.locked_by = None
+                job.locked_at = None
+            if doc is not None:
+                doc.status = "pending" if job is not None and job.status == "queued" else "error"
+                doc.error_message = str(e)
+            db.commit()
+        finally:
+            db.close()
+
+    async def _stage_ocr(self, db: Session, doc: ExtractedDocument, project: ExtractorProject) -> None:
+        if not doc.file_hash and os.path.exists(doc.file_path):
+            doc.file_hash = await asyncio.to_thread(compute_file_hash, doc.file_path)
+            db.commit()
+        ocr_result = await ocr_service.get_text(db, doc.file_path, file_hash=doc.file_hash)
+        doc.ocr_text = ocr_result["text"]
+        doc.page_count = ocr_result["page_count"]
+        doc.ocr_provider = ocr_result["provider"]
+        db.commit()
+
+    async def _stage_classify(self, db: Session, doc: ExtractedDocument, project: ExtractorProject) -> None:
+        doc_types = db.query(DocType).filter(DocType.project_id == project.id).order_by(DocType.sort_order).all()
+        if doc_types:
+            # Primero el preclasificador léxico; el LLM solo si no alcanza el umbral
+            threshold = project.local_classify_threshold if project.local_classify_threshold is not None else 0.9
+            type_id, conf, source = await local_classifier.classify(db, project.id, doc.ocr_text, doc_types)
+            if type_id is None or conf < threshold:
+                type_id, conf = await classifier_service.classify_batched(
+                    db, doc.ocr_text, doc_types,
+                    project.connector_llm, project.llm_classify_model,
+                    use_cache=project.llm_cache_enabled is not False
+                )
+                source = "llm"
+            doc.doc_type_id = type_id
+            doc.classification_confidence = conf
+            doc.classification_source = source
+            db.commit()
+
+    async def _stage_extract(self, db: Session, doc: ExtractedDocument, project: ExtractorProject) -> None:
+        if not doc.doc_type_id:
+            return
+        fields = db.query(DocField).filter(DocField.doc_type_id == doc.doc_type_id).all()
+        if not fields:
+            return
+        doc_type = db.query(DocType).filter(DocType.id == doc.doc_type_id).first()
+        extracted_data = await extractor_service.extract_fields(
+            db, doc.ocr_text, fields, doc_type,
+            project.connector_llm, project.llm_extract_model,
+            use_cache=project.llm_cache_enabled is not False
+        )
+
+        # Una reanudación no debe duplicar valores de un intento anterior
+        db.query(DocumentFieldValue).filter(DocumentFieldValue.document_id == doc.id).delete()
+        for item in extracted_data:
+            db.add(DocumentFieldValue(
+                document_id=doc.id,
+                field_id=item["field_id"],
+                field_name=item["field_name"],
+                field_label=item["field_label"],
+                raw_value=item["raw_value"],
+                normalized_value=item["raw_value"], # Por ahora igual
+                confidence=item["confidence"],
+                source_text=item["source_text"]
+            ))
+        db.commit()
+
+    async def _stage_rules(self, db: Session, doc: ExtractedDocument, project: ExtractorProject) -> None:
+        try:
+            await rules_engine.apply_rules(db, doc.id)
+        except Exception as re_err:
+            logger.error(f"Error applying rules: {re_err}")
+        # Refresh doc to get field values
+        db.refresh(doc)
+
+        # Determine if everything is high confidence
+        is_high_confidence = True
+        threshold = project.confidence_threshold or 0.8
+
+        if doc.classification_confidence and doc.classification_confidence < threshold:
+            is_high_confidence = False
+
+        if doc.field_values:
+            for val in doc.field_values:
+                if val.confidence and val.confidence < threshold:
+                    is_high_confidence = False
+                    break
+        else:
+            # If no fields were extracted but were expected, maybe it needs review
+            is_high_confidence = False
+
+        doc.review_status = "approved" if is_high_confidence else "pending"
+        db.commit()
+
+
+extraction_pipeline = ExtractionPipeline()
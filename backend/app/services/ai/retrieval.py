@@ -0,0 +1,96 @@
+import re
+import math
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from app.services.ai.ocr_service import split_pages
+
+TOKEN_RE = re.compile(r"[a-z0-9]{3,}")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas y sin tildes, para comparar 'RESOLUCIÓN' con 'resolucion'."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(normalize(text))
+
+
+@dataclass
+class Passage:
+    position: int
+    page: int
+    text: str
+
+
+def split_passages(text: str, max_chars: int) -> List[Passage]:
+    """
+    Divide el texto por página (split_pages) y, dentro de cada página, en
+    grupos de párrafos de hasta max_chars.
+    """
+    pages = split_pages(text)
+
+    passages: List[Passage] = []
+    for page, page_text in pages:
+        current = ""
+        for paragraph in re.split(r"\n\s*\n|\n(?=[A-ZÁÉÍÓÚÑ0-9])", page_text):
+            if current and len(current) + len(paragraph) > max_chars:
+                passages.append(Passage(len(passages), page, current.strip()))
+                current = ""
+            current += paragraph + "\n"
+            while len(current) > max_chars:
+                passages.append(Passage(len(passages), page, current[:max_chars].strip()))
+                current = current[max_chars:]
+        if current.strip():
+            passages.append(Passage(len(passages), page, current.strip()))
+    return passages
+
+
+class BM25Index:
+    """BM25 (Okapi) sobre los pasajes de un documento."""
+
+    def __init__(self, passages: List[Passage], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(p.text)) for p in passages]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        df = Counter()
+        for tf in self.term_freqs:
+            df.update(tf.keys())
+        n = len(passages)
+        self.idf = {t: math.log(1 + (n - c + 0.5) / (c + 0.5)) for t, c in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        terms = [t for t in set(query) if t in self.idf]
+        result = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1.0))
+            for t in terms:
+                f = tf.get(t, 0)
+                if f:
+                    score += self.idf[t] * f * (self.k1 + 1) / (f + norm)
+            result.append(score)
+        return result
+
+    def search(self, query: List[str], k: int) -> List[Tuple[Passage, float]]:
+        ranked = sorted(zip(self.passages, self.scores(query)), key=lambda x: x[1], reverse=True)
+        return [(p, s) for p, s in ranked[:k] if s > 0]
+
+
+def format_passages(passages: List[Passage]) -> str:
+    """Pasajes en orden del documento, cada uno con su página."""
+    return "\n[...]\n".join(
+        f"[Página {p.page}]\n{p.text}" for p in sorted(passages, key=lambda p: p.position)
+    )
+
+
+def field_query(*parts: str) -> List[str]:
+    return [t for part in parts if part for t in tokenize(part)]
+
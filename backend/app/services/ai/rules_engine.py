@@ -1,14 +1,105 @@
 import json
+import hashlib
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional
+import threading
+from typing import Callable, List, Dict, Any, Optional, Set, Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models.extractor import ExtractedDocument, ExtractionRule, ExtractionAlert, DocumentFieldValue
 from app.services.ai.llm_provider import llm_service
+from app.services.ai.llm_cache import llm_cache
 
 logger = logging.getLogger(__name__)
 
+# Atributos del documento que las condiciones pueden usar además de los campos
+DOC_ATTRIBUTES = ["status", "doc_type_id", "classification_confidence", "page_count"]
+
+
+class RuleFrame:
+    """
+    Tabla columnar (un documento por fila) con los valores en minúsculas,
+    como los compara evaluate_condition. La conversión numérica de cada
+    columna se hace una sola vez y se reutiliza entre reglas.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self._numeric: Dict[str, pd.Series] = {}
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def text(self, column: str) -> pd.Series:
+        if column not in self.frame:
+            return pd.Series("", index=self.frame.index)
+        return self.frame[column]
+
+    def numeric(self, column: str) -> pd.Series:
+        if column not in self._numeric:
+            self._numeric[column] = pd.to_numeric(self.text(column).str.strip(), errors="coerce")
+        return self._numeric[column]
+
+
+Predicate = Callable[[RuleFrame], np.ndarray]
+
+
+def compile_condition(cond: Dict[str, Any]) -> Predicate:
+    """Traduce una condición de condition_json a una máscara booleana sobre un RuleFrame."""
+    column = cond.get("field", "")
+    operator = cond.get("operator", "==") # El UI usa ==
+    target = str(cond.get("value", "")).lower()
+
+    def none(frame: RuleFrame) -> np.ndarray:
+        return np.zeros(len(frame), dtype=bool)
+
+    if operator == "==":
+        return lambda frame: (frame.text(column) == target).to_numpy()
+    if operator == "!=":
+        return lambda frame: (frame.text(column) != target).to_numpy()
+    if operator == "contains":
+        return lambda frame: frame.text(column).str.contains(target, regex=False).to_numpy()
+    if operator in (">", "<"):
+        try:
+            number = float(target)
+        except ValueError:
+            return none
+        if operator == ">":
+            return lambda frame: (frame.numeric(column) > number).to_numpy()
+        return lambda frame: (frame.numeric(column) < number).to_numpy()
+    return none
+
+
+class CompiledRule:
+    def __init__(self, rule: ExtractionRule, predicates: List[Predicate]):
+        self.id = rule.id
+        self.name = rule.name
+        self.severity = rule.severity
+        self.message = rule.description or rule.name
+        self.predicates = predicates
+
+    def evaluate(self, frame: RuleFrame) -> np.ndarray:
+        mask = np.ones(len(frame), dtype=bool)
+        for predicate in self.predicates:
+            mask &= predicate(frame)
+        return mask
+
+
+def _parse_answers(response: str) -> List[Dict[str, Any]]:
+    """Lista "respuestas" del JSON de reglas combinadas."""
+    parsed = json.loads(response.replace("```json", "").replace("```", "").strip())
+    return parsed.get("respuestas", [])
+
+
 class RulesEngine:
+    def __init__(self):
+        # Reglas simples compiladas por proyecto; se recompilan si cambian
+        self._compiled: Dict[int, Tuple[tuple, List[CompiledRule]]] = {}
+        self._lock = threading.Lock()
+
     def evaluate_condition(self, cond: Dict[str, Any], field_map: Dict[str, str], doc_map: Dict[str, Any]) -> bool:
         field_name = cond.get("field", "")
         # Buscar en campos extraídos o en atributos del documento
@@ -37,84 +128,271 @@ class RulesEngine:
             
         return False
 
+    def _active_rules(self, db: Session, project_id: int) -> List[ExtractionRule]:
+        return db.query(ExtractionRule).filter(
+            ExtractionRule.project_id == project_id,
+            ExtractionRule.is_active == True
+        ).order_by(ExtractionRule.id).all()
+
+    def compile_rules(self, project_id: int, rules: List[ExtractionRule]) -> List[CompiledRule]:
+        """Compila (una vez por versión de las reglas) las reglas simples del proyecto."""
+        simple = [r for r in rules if not (r.logic_type == "llm" and r.prompt)]
+        signature = tuple(
+            (r.id, r.condition_json, r.name, r.severity, r.description) for r in simple
+        )
+        with self._lock:
+            cached = self._compiled.get(project_id)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        compiled = []
+        for rule in simple:
+            try:
+                conditions = json.loads(rule.condition_json or "[]")
+            except Exception as e:
+                logger.error(f"[RulesEngine] Invalid condition_json in rule {rule.id}: {e}")
+                continue
+            if not conditions:
+                continue
+            compiled.append(CompiledRule(rule, [compile_condition(c) for c in conditions]))
+
+        with self._lock:
+            self._compiled[project_id] = (signature, compiled)
+        return compiled
+
+    def _build_frame(self, db: Session, document_ids: List[int]) -> RuleFrame:
+        docs = db.query(
+            ExtractedDocument.id,
+            ExtractedDocument.status,
+            ExtractedDocument.doc_type_id,
+            ExtractedDocument.classification_confidence,
+            ExtractedDocument.page_count,
+        ).filter(ExtractedDocument.id.in_(document_ids)).all()
+        if not docs:
+            return RuleFrame(pd.DataFrame())
+        # Mismo texto que producía str() en la evaluación por documento ("None", "0.9", ...)
+        frame = pd.DataFrame(
+            [[str(v) for v in d[1:]] for d in docs],
+            index=pd.Index([d.id for d in docs], name="document_id"),
+            columns=DOC_ATTRIBUTES,
+            dtype=object,
+        )
+
+        values = db.query(
+            DocumentFieldValue.document_id,
+            DocumentFieldValue.field_name,
+            DocumentFieldValue.normalized_value,
+            DocumentFieldValue.raw_value,
+        ).filter(DocumentFieldValue.document_id.in_(document_ids)).order_by(DocumentFieldValue.id).all()
+        if values:
+            fields = pd.DataFrame(
+                [(v.document_id, v.field_name, v.normalized_value or v.raw_value or "") for v in values],
+                columns=["document_id", "field_name", "value"],
+            )
+            # Si un campo se repite gana el último valor, como en el dict anterior
+            fields = fields.drop_duplicates(["document_id", "field_name"], keep="last").pivot(
+                index="document_id", columns="field_name", values="value"
+            )
+            # Los campos extraídos tienen prioridad sobre los atributos del documento
+            frame = fields.reindex(frame.index).combine_first(frame)
+        return RuleFrame(frame.fillna("").apply(lambda col: col.str.lower()))
+
+    def apply_rules_batch(self, db: Session, project_id: int, document_ids: Optional[List[int]] = None) -> int:
+        """
+        Evalúa las reglas simples del proyecto sobre muchos documentos a la vez
+        (máscaras de pandas por regla) e inserta las alertas nuevas en bloque.
+        Sin document_ids, recorre todos los documentos del proyecto.
+        """
+        compiled = self.compile_rules(project_id, self._active_rules(db, project_id))
+        if not compiled:
+            return 0
+        if document_ids is None:
+            document_ids = [i for (i,) in db.query(ExtractedDocument.id).filter(
+                ExtractedDocument.project_id == project_id
+            ).order_by(ExtractedDocument.id).all()]
+
+        created = 0
+        batch_size = settings.RULES_BATCH_SIZE
+        for start in range(0, len(document_ids), batch_size):
+            batch = document_ids[start:start + batch_size]
+            frame = self._build_frame(db, batch)
+            if not len(frame):
+                continue
+            existing: Set[Tuple[int, int]] = set(db.query(
+                ExtractionAlert.document_id, ExtractionAlert.rule_id
+            ).filter(ExtractionAlert.document_id.in_(batch)).all())
+
+            rows = []
+            index = frame.frame.index.to_numpy()
+            for rule in compiled:
+                try:
+                    matched = index[rule.evaluate(frame)]
+                except Exception as e:
+                    logger.error(f"[RulesEngine] Error applying rule {rule.id}: {e}")
+                    continue
+                rows.extend(
+                    {
+                        "document_id": int(doc_id),
+                        "rule_id": rule.id,
+                        "rule_name": rule.name,
+                        "severity": rule.severity,
+                        "message": rule.message,
+                    }
+                    for doc_id in matched if (int(doc_id), rule.id) not in existing
+                )
+            if rows:
+                db.execute(insert(ExtractionAlert), rows)
+                created += len(rows)
+            db.commit()
+        return created
+
+    def _verdict_key(self, provider: str, model: str, doc_hash: str, rule: ExtractionRule) -> str:
+        # El veredicto depende solo del documento y del texto de la regla,
+        # no de qué otras reglas viajaron en el mismo prompt
+        return llm_cache.make_key(
+            provider, model,
+            [{"role": "rule", "content": rule.prompt}, {"role": "document", "content": doc_hash}],
+            0.0, False
+        )
+
+    async def _ask_single(
+        self, db: Session, rule: ExtractionRule, doc_text: str, provider: str, model: str, use_cache: bool
+    ) -> Optional[bool]:
+        system_prompt = "Actúa como un validador de documentos legales. Analiza el texto y responde ÚNICAMENTE con la palabra 'SI' o 'NO'."
+        user_prompt = f"REGLA: {rule.prompt}\n\nDOCUMENTO:\n{doc_text}"
+        try:
+            response = await llm_service.complete(
+                db=db,
+                provider=provider,
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                use_cache=use_cache
+            )
+            return "SI" in response.upper()
+        except Exception as e:
+            logger.error(f"Error in LLM Rule {rule.id}: {e}")
+            return None
+
+    async def _ask_merged(
+        self, db: Session, rules: List[ExtractionRule], doc_text: str, provider: str, model: str, use_cache: bool
+    ) -> Dict[int, bool]:
+        """Todas las reglas en un solo prompt; devuelve los veredictos que se pudieron leer."""
+        rule_list = "\n".join(f"- id {r.id}: {r.prompt}" for r in rules)
+        system_prompt = (
+            "Actúa como un validador de documentos legales. Analiza el texto y, para CADA regla, "
+            "responde 'SI' o 'NO'. Responde ÚNICAMENTE con JSON en el formato: "
+            "{\"respuestas\": [{\"id\": 1, \"respuesta\": \"SI\"}]}"
+        )
+        user_prompt = f"REGLAS:\n{rule_list}\n\nDOCUMENTO:\n{doc_text}"
+        try:
+            response = await llm_service.complete(
+                db=db,
+                provider=provider,
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                json_mode=(provider != "anthropic"),
+                use_cache=use_cache,
+                validate=_parse_answers
+            )
+            verdicts = {}
+            for item in _parse_answers(response):
+                try:
+                    verdicts[int(item.get("id"))] = "SI" in str(item.get("respuesta", "")).upper()
+                except (TypeError, ValueError):
+                    continue
+            return {r.id: verdicts[r.id] for r in rules if r.id in verdicts}
+        except Exception as e:
+            logger.warning(f"[RulesEngine] Merged LLM rules response unusable, asking one by one: {e}")
+            return {}
+
+    async def evaluate_llm_rules(
+        self, db: Session, doc: ExtractedDocument, rules: List[ExtractionRule]
+    ) -> Dict[int, bool]:
+        """
+        Veredicto de cada regla LLM para un documento. Los veredictos se cachean
+        por hash del texto que ve el modelo (no del archivo: un reproceso con
+        otro OCR cambia el texto) y texto de la regla; las reglas pendientes van
+        juntas en un solo prompt y, si alguna no vuelve, una por una en paralelo.
+        """
+        project = doc.project
+        use_cache = project is None or project.llm_cache_enabled is not False
+        provider = (project.connector_llm if project else None) or "openai"
+        model = (project.llm_extract_model if project else None) or "gpt-4o"
+        doc_text = (doc.ocr_text or "")[:6000]
+        doc_hash = hashlib.sha256(doc_text.encode("utf-8")).hexdigest()
+
+        verdicts: Dict[int, bool] = {}
+        pending = []
+        cache_enabled = use_cache and llm_cache.is_cacheable(0.0)
+        for rule in rules:
+            cached = llm_cache.get(db, self._verdict_key(provider, model, doc_hash, rule)) if cache_enabled else None
+            if cached is not None:
+                verdicts[rule.id] = cached == "SI"
+            else:
+                pending.append(rule)
+
+        fresh: Dict[int, bool] = {}
+        if len(pending) > 1:
+            fresh.update(await self._ask_merged(db, pending, doc_text, provider, model, use_cache))
+
+        missing = [r for r in pending if r.id not in fresh]
+        semaphore = asyncio.Semaphore(settings.RULES_LLM_CONCURRENCY)
+
+        async def ask(rule: ExtractionRule) -> Optional[bool]:
+            async with semaphore:
+                return await self._ask_single(db, rule, doc_text, provider, model, use_cache)
+
+        for rule, verdict in zip(missing, await asyncio.gather(*[ask(r) for r in missing])):
+            if verdict is not None:
+                fresh[rule.id] = verdict
+
+        for rule in pending:
+            if rule.id in fresh and cache_enabled:
+                llm_cache.put(
+                    db, self._verdict_key(provider, model, doc_hash, rule),
+                    provider, model, "SI" if fresh[rule.id] else "NO"
+                )
+        verdicts.update(fresh)
+        return verdicts
+
     async def apply_rules(self, db: Session, document_id: int) -> int:
         doc = db.query(ExtractedDocument).filter(ExtractedDocument.id == document_id).first()
         if not doc:
             return 0
         
-        rules = db.query(ExtractionRule).filter(
-            ExtractionRule.project_id == doc.project_id,
-            ExtractionRule.is_active == True
-        ).all()
+        rules = self._active_rules(db, doc.project_id)
         
         if not rules:
             return 0
-            
-        # Preparar datos para evaluación
-        field_values = db.query(DocumentFieldValue).filter(DocumentFieldValue.document_id == document_id).all()
-        field_map = {f.field_name: (f.normalized_value or f.raw_value or "") for f in field_values}
-        doc_map = {
-            "status": doc.status,
-            "doc_type_id": str(doc.doc_type_id),
-            "classification_confidence": doc.classification_confidence,
-            "page_count": doc.page_count
-        }
-        
-        triggered_count = 0
-        
-        for rule in rules:
-            try:
-                matched = False
-                
-                if rule.logic_type == "llm" and rule.prompt:
-                    # Lógica basada en IA
-                    system_prompt = "Actúa como un validador de documentos legales. Analiza el texto y responde ÚNICAMENTE con la palabra 'SI' o 'NO'."
-                    user_prompt = f"REGLA: {rule.prompt}\n\nDOCUMENTO:\n{doc.ocr_text[:6000]}"
-                    
-                    try:
-                        # Obtenemos el proveedor de los settings del proyecto o default
-                        response = await llm_service.complete(
-                            db=db,
-                            provider="openai", # Default por ahora, luego puede ser dinámico
-                            model="gpt-4o",
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_prompt}
-                            ]
-                        )
-                        matched = "SI" in response.upper()
-                    except Exception as e:
-                        logger.error(f"Error in LLM Rule {rule.id}: {e}")
-                        continue
-                else:
-                    # Lógica simple basada en atributos
-                    conditions = json.loads(rule.condition_json or "[]")
-                    if not conditions:
-                        continue
-                        
-                    results = [self.evaluate_condition(c, field_map, doc_map) for c in conditions]
-                    matched = all(results)
-
-                if matched:
-                    # Evitar duplicados
-                    existing = db.query(ExtractionAlert).filter(
-                        ExtractionAlert.document_id == document_id,
-                        ExtractionAlert.rule_id == rule.id
-                    ).first()
-                    
-                    if not existing:
-                        alert = ExtractionAlert(
-                            document_id=document_id,
-                            rule_id=rule.id,
-                            rule_name=rule.name,
-                            severity=rule.severity,
-                            message=rule.description or rule.name
-                        )
-                        db.add(alert)
-                        triggered_count += 1
-            
-            except Exception as e:
-                logger.error(f"[RulesEngine] Error applying rule {rule.id}: {e}")
+
+        # Reglas simples: mismo camino compilado que el reproceso por lotes
+        triggered_count = self.apply_rules_batch(db, doc.project_id, [document_id])
+
+        llm_rules = [r for r in rules if r.logic_type == "llm" and r.prompt]
+        if not llm_rules:
+            return triggered_count
+
+        verdicts = await self.evaluate_llm_rules(db, doc, llm_rules)
+        # Evitar duplicados
+        existing = {rule_id for (rule_id,) in db.query(ExtractionAlert.rule_id).filter(
+            ExtractionAlert.document_id == document_id
+        ).all()}
+        for rule in llm_rules:
+            if verdicts.get(rule.id) and rule.id not in existing:
+                db.add(ExtractionAlert(
+                    document_id=document_id,
+                    rule_id=rule.id,
+                    rule_name=rule.name,
+                    severity=rule.severity,
+                    message=rule.description or rule.name
+                ))
+                triggered_count += 1
                 
         db.commit()
         return triggered_count
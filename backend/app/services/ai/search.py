@@ -0,0 +1,175 @@
+import re
+import logging
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, or_, text
+from sqlalchemy.orm import Session
+
+from app.db import fts
+from app.models.extractor import DocumentFieldValue, ExtractedDocument
+
+logger = logging.getLogger(__name__)
+
+# Marcas alrededor de los términos encontrados en los fragmentos
+SNIPPET_OPEN = "«"
+SNIPPET_CLOSE = "»"
+SNIPPET_TOKENS = 16
+# Campos con coincidencia que se muestran por documento
+FIELD_ROWS_PER_DOCUMENT = 5
+
+# Puntaje de cada documento del proyecto: BM25 del texto más el del mejor
+# campo, ordenado y paginado en la misma consulta (MATERIALIZED: SQLite 3.35+).
+# Cada CTE filtra por proyecto: lo que coincide en otros proyectos no se puntúa
+_RANKED_SQL = text("""
+    WITH text_hits AS (
+        SELECT d.id AS document_id, -bm25(extraction_text_fts) AS score
+        FROM extraction_text_fts
+        JOIN extracted_documents d ON d.id = extraction_text_fts.rowid
+        WHERE extraction_text_fts MATCH :query AND d.project_id = :project_id
+    ),
+    -- bm25() no puede ir dentro de un agregado: primero se materializa por fila
+    field_rows AS MATERIALIZED (
+        SELECT v.document_id AS document_id, -bm25(extraction_fields_fts) AS score
+        FROM extraction_fields_fts
+        JOIN document_field_values v ON v.id = extraction_fields_fts.rowid
+        JOIN extracted_documents d ON d.id = v.document_id
+        WHERE extraction_fields_fts MATCH :query AND d.project_id = :project_id
+    ),
+    field_hits AS (
+        SELECT document_id, MAX(score) AS score FROM field_rows GROUP BY document_id
+    ),
+    matched AS (
+        SELECT document_id FROM text_hits UNION SELECT document_id FROM field_hits
+    )
+    SELECT m.document_id AS document_id, COALESCE(t.score, 0) + COALESCE(f.score, 0) AS score
+    FROM matched m
+    LEFT JOIN text_hits t ON t.document_id = m.document_id
+    LEFT JOIN field_hits f ON f.document_id = m.document_id
+    ORDER BY score DESC, m.document_id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+# Fragmentos solo para los documentos de la página
+_TEXT_SNIPPETS_SQL = text("""
+    SELECT rowid AS document_id,
+           snippet(extraction_text_fts, 0, :open, :close, '…', :tokens) AS snippet
+    FROM extraction_text_fts
+    WHERE extraction_text_fts MATCH :query AND rowid IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_FIELD_SNIPPETS_SQL = text("""
+    SELECT v.document_id AS document_id,
+           v.field_name AS field_name,
+           v.field_label AS field_label,
+           snippet(extraction_fields_fts, -1, :open, :close, '…', :tokens) AS snippet
+    FROM extraction_fields_fts
+    JOIN document_field_values v ON v.id = extraction_fields_fts.rowid
+    WHERE extraction_fields_fts MATCH :query AND v.document_id IN :ids
+    ORDER BY bm25(extraction_fields_fts)
+""").bindparams(bindparam("ids", expanding=True))
+
+
+class DocumentSearch:
+    """
+    Búsqueda de texto completo en un proyecto: texto OCR y valores extraídos.
+
+    Un documento coincide cuando su texto contiene todas las palabras de la
+    búsqueda, o cuando alguno de sus campos las contiene todas; las dos
+    implementaciones siguen esa misma regla. En SQLite usa los índices FTS5 de
+    app.db.fts: el puntaje (BM25 del texto más el del mejor campo), el orden y
+    la paginación salen de una sola consulta. Sin índices (otra base de datos
+    o tablas aún no creadas) cae en ILIKE, sin ranking.
+    """
+
+    def search(self, db: Session, project_id: int, query: str, limit: int = 20, offset: int = 0) -> List[dict]:
+        words = re.findall(r"\w+", query or "")
+        if not words:
+            return []
+        if fts.has_table(db, "extraction_text_fts") and fts.has_table(db, "extraction_fields_fts"):
+            return self._search_fts(db, project_id, fts.terms(query), limit, offset)
+        return self._search_like(db, project_id, words, limit, offset)
+
+    def _search_fts(self, db: Session, project_id: int, match: str, limit: int, offset: int) -> List[dict]:
+        ranked = db.execute(_RANKED_SQL, {
+            "query": match, "project_id": project_id, "limit": limit, "offset": offset,
+        }).all()
+        if not ranked:
+            return []
+
+        params = {
+            "query": match, "ids": [row.document_id for row in ranked],
+            "open": SNIPPET_OPEN, "close": SNIPPET_CLOSE, "tokens": SNIPPET_TOKENS,
+        }
+        snippets = {row.document_id: row.snippet for row in db.execute(_TEXT_SNIPPETS_SQL, params)}
+        fields: Dict[int, List[dict]] = {}
+        for row in db.execute(_FIELD_SNIPPETS_SQL, params):
+            document_fields = fields.setdefault(row.document_id, [])
+            if len(document_fields) < FIELD_ROWS_PER_DOCUMENT:
+                document_fields.append(
+                    {"field_name": row.field_name, "field_label": row.field_label, "snippet": row.snippet}
+                )
+
+        return self._with_documents(db, [
+            (row.document_id, {
+                "score": row.score,
+                "snippet": snippets.get(row.document_id),
+                "fields": fields.get(row.document_id, []),
+            })
+            for row in ranked
+        ])
+
+    def _search_like(self, db: Session, project_id: int, words: List[str], limit: int, offset: int) -> List[dict]:
+        in_text = and_(*[ExtractedDocument.ocr_text.ilike(f"%{word}%") for word in words])
+        in_one_field = ExtractedDocument.field_values.any(and_(*[
+            or_(
+                DocumentFieldValue.raw_value.ilike(f"%{word}%"),
+                DocumentFieldValue.normalized_value.ilike(f"%{word}%"),
+            )
+            for word in words
+        ]))
+        rows = db.query(ExtractedDocument.id, ExtractedDocument.ocr_text).filter(
+            ExtractedDocument.project_id == project_id, or_(in_text, in_one_field)
+        ).order_by(ExtractedDocument.id.desc()).offset(offset).limit(limit).all()
+        ranked = [
+            (row.id, {"score": 0.0, "snippet": self._excerpt(row.ocr_text or "", words), "fields": []})
+            for row in rows
+        ]
+        return self._with_documents(db, ranked)
+
+    @staticmethod
+    def _excerpt(content: str, words: List[str], width: int = 80) -> Optional[str]:
+        lowered = content.lower()
+        positions = [p for p in (lowered.find(w.lower()) for w in words) if p >= 0]
+        if not positions:
+            return None
+        start = max(min(positions) - width, 0)
+        return content[start:min(positions) + width].strip()
+
+    def _with_documents(self, db: Session, ranked: List[tuple]) -> List[dict]:
+        if not ranked:
+            return []
+        docs = {
+            doc.id: doc for doc in db.query(
+                ExtractedDocument.id,
+                ExtractedDocument.file_name,
+                ExtractedDocument.doc_type_id,
+                ExtractedDocument.status,
+                ExtractedDocument.review_status,
+                ExtractedDocument.page_count,
+            ).filter(ExtractedDocument.id.in_([doc_id for doc_id, _ in ranked]))
+        }
+        return [
+            {
+                "document_id": doc_id,
+                "file_name": docs[doc_id].file_name,
+                "doc_type_id": docs[doc_id].doc_type_id,
+                "status": docs[doc_id].status,
+                "review_status": docs[doc_id].review_status,
+                "page_count": docs[doc_id].page_count,
+                **hit,
+            }
+            for doc_id, hit in ranked if doc_id in docs
+        ]
+
+
+document_search = DocumentSearch()
@@ -0,0 +1,59 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.extractor import ExtractorSetting
+
+logger = logging.getLogger(__name__)
+
+
+class SettingsCache:
+    """
+    Caché en proceso de la tabla extractor_settings.
+
+    La primera lectura carga todas las filas en una sola consulta; las
+    siguientes son lecturas de diccionario. save_setting llama a invalidate(),
+    que sube la versión: una carga que empezó antes de la invalidación no
+    sobrescribe la caché con valores viejos. El TTL cubre los cambios hechos
+    por otros procesos.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._values: Optional[Dict[str, str]] = None
+        self._loaded_at = 0.0
+        self._version = 0
+
+    def _snapshot(self, db: Session) -> Dict[str, str]:
+        with self._lock:
+            if self._values is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._values
+            version = self._version
+
+        values = {key: value for key, value in db.query(ExtractorSetting.key, ExtractorSetting.value).all()}
+        with self._lock:
+            if version == self._version:
+                self._values = values
+                self._loaded_at = time.monotonic()
+        return values
+
+    def get(self, db: Session, key_name: str) -> str:
+        """Valor guardado en la base de datos; si no hay, la variable de entorno."""
+        value = self._snapshot(db).get(key_name)
+        if value:
+            return value
+        return os.getenv(key_name.upper(), "")
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._values = None
+
+
+settings_cache = SettingsCache(ttl_seconds=settings.SETTINGS_CACHE_TTL_SECONDS)
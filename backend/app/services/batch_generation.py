@@ -0,0 +1,329 @@
+import os
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from io import BytesIO
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Finished jobs are kept around this long so clients can still read the result
+JOB_RETENTION_SECONDS = 60 * 60
+
+BOGOTA_TZ = timezone(timedelta(hours=-5))
+
+
+def _safe_title(title: str) -> str:
+    return "".join([c for c in title if c.isalnum() or c in (' ', '-', '_')]).strip()
+
+
+def build_row_context(row_data: Dict[Any, Any]) -> Dict[str, Any]:
+    """Turn one spreadsheet row into a docxtpl context."""
+    # Filter out None keys and output_filename
+    context = {
+        str(k): v for k, v in row_data.items()
+        if k is not None and k != "output_filename" and v is not None
+    }
+
+    # Convert Sí/No to Boolean for conditional blocks
+    for k, v in list(context.items()):
+        if isinstance(v, str):
+            if v.strip().lower() in ('sí', 'si', 'yes', 'true'):
+                context[k] = True
+            elif v.strip().lower() in ('no', 'false'):
+                context[k] = False
+
+    if "date" not in context:
+        context["date"] = datetime.now(BOGOTA_TZ).strftime("%Y-%m-%d")
+    return context
+
+
+def render_rows(template_id: int, template_path: str, rows: List[dict]) -> List[dict]:
+    """
+    Render a chunk of rows. Runs inside a pool process, where the template is
+    compiled once by that process' template cache and reused for every row.
+    """
+    from app.services.template_cache import template_cache
+
+    results = []
+    for row in rows:
+        try:
+            doc = template_cache.get(template_id, template_path)
+            doc.render(row["context"])
+            doc.save(row["file_path"])
+            results.append({"row": row["row"], "title": row["title"], "file_path": row["file_path"], "error": None})
+        except Exception as e:
+            results.append({"row": row["row"], "title": row["title"], "file_path": row["file_path"], "error": str(e)})
+    return results
+
+
+class BatchJob:
+    """Progress and results of one batch generation run."""
+
+    def __init__(self, template_id: int, user_id: int):
+        self.id = uuid.uuid4().hex
+        self.template_id = template_id
+        self.user_id = user_id
+        self.status = "queued"
+        self.total = 0
+        self.processed = 0
+        self.success = 0
+        self.failed = 0
+        self.generated_docs: List[dict] = []
+        self.errors: List[str] = []
+        self.detail: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "template_id": self.template_id,
+                "status": self.status,
+                "total": self.total,
+                "processed": self.processed,
+                "success": self.success,
+                "failed": self.failed,
+                "generated_docs": list(self.generated_docs),
+                "errors": list(self.errors),
+                "detail": self.detail,
+            }
+
+
+class BatchGenerationService:
+    """
+    Runs batch generation jobs in the background.
+
+    Rows are streamed from the workbook in read-only mode, grouped into chunks
+    and rendered on a shared process pool. Each finished chunk is written to
+    the database in a single commit.
+    """
+
+    def __init__(self, max_workers: int, chunk_size: int):
+        self.max_workers = max(1, max_workers)
+        self.chunk_size = max(1, chunk_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, BatchJob] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process that already runs request threads can deadlock
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def _prune(self) -> None:
+        now = time.time()
+        with self._lock:
+            for job_id in [
+                k for k, j in self._jobs.items()
+                if j.finished_at and now - j.finished_at > JOB_RETENTION_SECONDS
+            ]:
+                del self._jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[BatchJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def submit(
+        self,
+        db_session_factory: Callable,
+        template,
+        user_id: int,
+        file_content: bytes,
+    ) -> BatchJob:
+        """Register a job for `template` and start it in a background thread."""
+        self._prune()
+        job = BatchJob(template_id=template.id, user_id=user_id)
+        with self._lock:
+            self._jobs[job.id] = job
+
+        threading.Thread(
+            target=self._run,
+            args=(job, db_session_factory, template.id, template.title, template.file_path, file_content),
+            daemon=True,
+        ).start()
+        return job
+
+    def _iter_rows(
+        self,
+        job: BatchJob,
+        template_id: int,
+        template_title: str,
+        file_content: bytes,
+        user_id: int,
+    ) -> Iterator[dict]:
+        import openpyxl
+
+        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
+        try:
+            ws = wb.active
+            rows = ws.iter_rows(values_only=True)
+            headers = list(next(rows, ()))
+            output_dir = settings.GENERATED_DOCS_DIR
+
+            for row_idx, row in enumerate(rows, 2):
+                if not any(row):
+                    continue  # Skip empty rows
+
+                row_data = dict(zip(headers, row))
+                custom_filename = row_data.get("output_filename")
+                if not custom_filename:
+                    custom_filename = f"{_safe_title(template_title)}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{row_idx}"
+
+                safe_filename = "".join([c for c in str(custom_filename) if c.isalnum() or c in (' ', '-', '_', '.')]).strip()
+                if not safe_filename.endswith(".docx"):
+                    safe_filename += ".docx"
+
+                yield {
+                    "row": row_idx,
+                    "title": str(custom_filename).replace(".docx", ""),
+                    "file_path": os.path.join(output_dir, f"{user_id}_{template_id}_{safe_filename}"),
+                    "context": build_row_context(row_data),
+                }
+        finally:
+            wb.close()
+
+    @staticmethod
+    def _count_rows(file_content: bytes) -> int:
+        """Non-empty data rows, counted in a values-only pass before rendering."""
+        import openpyxl
+
+        wb = openpyxl.load_workbook(BytesIO(file_content), read_only=True)
+        try:
+            # max_row also counts blank and formatted-only rows
+            return sum(1 for row in wb.active.iter_rows(min_row=2, values_only=True) if any(row))
+        finally:
+            wb.close()
+
+    def _chunks(self, rows: Iterator[dict]) -> Iterator[List[dict]]:
+        chunk: List[dict] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _save_results(self, db_session_factory: Callable, job: BatchJob, results: List[dict]) -> None:
+        from app import models
+
+        done = [r for r in results if r["error"] is None]
+        created: List[dict] = []
+        if done:
+            db = db_session_factory()
+            try:
+                docs = [
+                    models.Document(
+                        title=r["title"],
+                        template_id=job.template_id,
+                        user_id=job.user_id,
+                        generated_file_path=r["file_path"],
+                    )
+                    for r in done
+                ]
+                db.add_all(docs)
+                db.flush()
+                created = [{"id": d.id, "title": d.title} for d in docs]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Batch job {job.id}: could not save chunk: {e}")
+                for r in done:
+                    r["error"] = f"Error saving document: {e}"
+                created = []
+            finally:
+                db.close()
+
+        with job.lock:
+            job.processed += len(results)
+            job.generated_docs.extend(created)
+            job.success += len(created)
+            for r in results:
+                if r["error"] is not None:
+                    job.failed += 1
+                    job.errors.append(f"Row {r['row']}: {r['error']}")
+            job.version += 1
+
+    def _run(
+        self,
+        job: BatchJob,
+        db_session_factory: Callable,
+        template_id: int,
+        template_title: str,
+        template_path: str,
+        file_content: bytes,
+    ) -> None:
+        with job.lock:
+            job.status = "running"
+            job.version += 1
+
+        try:
+            # The total is known before the first row is rendered, so the
+            # polled and streamed processed/total progress is right from the start
+            total = self._count_rows(file_content)
+            with job.lock:
+                job.total = total
+                job.version += 1
+
+            executor = self._get_executor()
+            # Keep a bounded number of chunks in flight so huge sheets are never
+            # fully materialized in memory
+            max_in_flight = self.max_workers * 2
+            pending = set()
+            rows = self._iter_rows(job, template_id, template_title, file_content, job.user_id)
+
+            for chunk in self._chunks(rows):
+                pending.add(executor.submit(render_rows, template_id, template_path, chunk))
+                if len(pending) >= max_in_flight:
+                    completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        self._save_results(db_session_factory, job, future.result())
+
+            for future in pending:
+                self._save_results(db_session_factory, job, future.result())
+
+            with job.lock:
+                job.status = "completed"
+        except Exception as e:
+            logger.error(f"Batch job {job.id} failed: {e}")
+            from concurrent.futures.process import BrokenProcessPool
+            if isinstance(e, BrokenProcessPool):
+                self.shutdown()
+            with job.lock:
+                job.status = "failed"
+                job.detail = f"Error processing Excel file: {str(e)}"
+        finally:
+            with job.lock:
+                job.finished_at = time.time()
+                job.version += 1
+
+
+batch_generation_service = BatchGenerationService(
+    max_workers=settings.BATCH_WORKERS,
+    chunk_size=settings.BATCH_CHUNK_SIZE,
+)
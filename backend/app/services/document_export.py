@@ -12,16 +12,11 @@ def export_documents_to_excel(db: Session, document_ids: List[int], user_id: int
     Each row is a document, columns are variables.
     """
     data = []
-    
-    for doc_id in document_ids:
-        document = crud.document.get(db, id=doc_id)
-        if not document:
-            continue
-            
-        # Permission check
-        if not is_superuser and (document.user_id != user_id):
-            continue
-            
+    documents = crud.document.get_multi_by_ids(
+        db, ids=document_ids, owner_id=None if is_superuser else user_id
+    )
+
+    for document in documents:
         row = {
             "ID": document.id,
             "Título": document.title,
@@ -0,0 +1,247 @@
+import os
+import queue
+import shutil
+import logging
+import platform
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OfficePoolError(Exception):
+    """Base error for LibreOffice conversions."""
+
+
+class OfficePoolBusy(OfficePoolError):
+    """Raised when the conversion queue is full."""
+
+
+class OfficeConversionTimeout(OfficePoolError):
+    """Raised when a single conversion exceeds PDF_JOB_TIMEOUT."""
+
+
+def find_office_binary() -> Optional[str]:
+    return shutil.which("libreoffice") or shutil.which("soffice")
+
+
+_converter_version: Optional[str] = None
+
+
+def converter_version() -> str:
+    """Identifies the PDF converter so renditions are re-made after an upgrade."""
+    global _converter_version
+    if _converter_version is None:
+        if platform.system() != "Linux":
+            _converter_version = "docx2pdf"
+        else:
+            binary = find_office_binary()
+            version = "libreoffice-unknown"
+            if binary:
+                try:
+                    result = subprocess.run(
+                        [binary, "--version"], capture_output=True, text=True, timeout=30
+                    )
+                    version = result.stdout.strip() or version
+                except Exception as e:
+                    logger.warning(f"Could not read LibreOffice version: {e}")
+            _converter_version = version
+    return _converter_version
+
+
+class OfficeWorker:
+    """
+    A long-lived headless LibreOffice instance with its own user profile.
+
+    The resident process keeps the profile open, so every `soffice --convert-to`
+    launched against the same profile is handed over to the warm instance
+    through its IPC pipe instead of booting a new office from scratch.
+    """
+
+    def __init__(self, index: int, binary: str, profiles_dir: str):
+        self.index = index
+        self.binary = binary
+        self.profile_dir = os.path.join(profiles_dir, f"worker_{index}")
+        self.process: Optional[subprocess.Popen] = None
+        self.jobs_done = 0
+
+    def _base_cmd(self) -> List[str]:
+        return [
+            self.binary,
+            f"-env:UserInstallation={Path(self.profile_dir).as_uri()}",
+            "--headless",
+            "--invisible",
+            "--nologo",
+            "--norestore",
+            "--nolockcheck",
+        ]
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        pipe_name = f"simplaw_office_{os.getpid()}_{self.index}"
+        self.process = subprocess.Popen(
+            self._base_cmd() + [f"--accept=pipe,name={pipe_name};urp;"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.jobs_done = 0
+        logger.info(f"Office worker {self.index} started (pid={self.process.pid})")
+
+    def stop(self) -> None:
+        if self.process is None:
+            return
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def warm_up(self, timeout: int) -> None:
+        """Convert a blank document so the profile and filters are fully loaded."""
+        from docx import Document as DocxDocument
+
+        warm_dir = tempfile.mkdtemp(prefix="warmup_", dir=settings.TEMP_DIR)
+        try:
+            warm_docx = os.path.join(warm_dir, "warmup.docx")
+            DocxDocument().save(warm_docx)
+            self.convert(warm_docx, warm_dir, timeout)
+        except OfficePoolError as e:
+            logger.warning(f"Office worker {self.index} warm-up failed: {e}")
+        finally:
+            shutil.rmtree(warm_dir, ignore_errors=True)
+
+    def convert(self, docx_path: str, output_dir: str, timeout: int) -> str:
+        if not self.is_alive():
+            self.restart()
+
+        cmd = self._base_cmd() + ["--convert-to", "pdf", "--outdir", output_dir, docx_path]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            # A hung conversion poisons the resident instance, start a fresh one
+            logger.error(f"Office worker {self.index} timed out converting {docx_path}")
+            self.restart()
+            raise OfficeConversionTimeout(f"La conversión a PDF superó {timeout}s")
+        finally:
+            self.jobs_done += 1
+
+        if result.returncode != 0:
+            raise OfficePoolError(f"LibreOffice conversion failed: {result.stderr}")
+
+        output = os.path.join(output_dir, Path(docx_path).stem + ".pdf")
+        if not os.path.exists(output):
+            raise OfficePoolError("LibreOffice conversion completed but PDF was not found at expected location.")
+        return output
+
+
+class OfficeWorkerPool:
+    """
+    Pool of warm LibreOffice workers for DOCX -> PDF conversion.
+
+    - Each worker owns a separate profile, so conversions run in parallel.
+    - Jobs beyond `size + queue_size` are rejected with OfficePoolBusy.
+    - Workers are recycled after `max_jobs` conversions to contain leaks.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_jobs: int,
+        job_timeout: int,
+        queue_size: int,
+    ):
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.job_timeout = job_timeout
+        self._slots = threading.BoundedSemaphore(self.size + max(0, queue_size))
+        self._idle: "queue.Queue[OfficeWorker]" = queue.Queue()
+        self._workers: List[OfficeWorker] = []
+        self._lock = threading.Lock()
+        self._started = False
+
+    def available(self) -> bool:
+        return platform.system() == "Linux" and find_office_binary() is not None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            binary = find_office_binary()
+            if not binary:
+                raise OfficePoolError("LibreOffice is not installed on this server.")
+
+            self._workers = [
+                OfficeWorker(i, binary, settings.OFFICE_PROFILES_DIR)
+                for i in range(self.size)
+            ]
+            for worker in self._workers:
+                worker.start()
+
+            # Warm-up in parallel: the first run of a fresh profile is the slow one
+            threads = [
+                threading.Thread(target=w.warm_up, args=(self.job_timeout,), daemon=True)
+                for w in self._workers
+            ]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            for worker in self._workers:
+                self._idle.put(worker)
+            self._started = True
+            logger.info(f"Office pool ready with {self.size} workers")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            for worker in self._workers:
+                worker.stop()
+            self._workers = []
+            self._idle = queue.Queue()
+            self._started = False
+
+    def convert(self, docx_path: str, pdf_path: str) -> str:
+        """Convert `docx_path` into `pdf_path` using the next free worker."""
+        if not self._slots.acquire(blocking=False):
+            raise OfficePoolBusy("Demasiadas conversiones a PDF en cola, intente de nuevo en unos segundos.")
+        try:
+            self.start()
+            worker = self._idle.get()
+            # Isolated output dir per job so files with the same name never collide
+            job_dir = tempfile.mkdtemp(prefix="pdf_job_", dir=settings.TEMP_DIR)
+            try:
+                output = worker.convert(docx_path, job_dir, self.job_timeout)
+                os.makedirs(os.path.dirname(pdf_path) or ".", exist_ok=True)
+                shutil.move(output, pdf_path)
+                return pdf_path
+            finally:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                if worker.jobs_done >= self.max_jobs:
+                    logger.info(f"Recycling office worker {worker.index} after {worker.jobs_done} jobs")
+                    worker.restart()
+                self._idle.put(worker)
+        finally:
+            self._slots.release()
+
+
+office_pool = OfficeWorkerPool(
+    size=settings.PDF_WORKERS,
+    max_jobs=settings.PDF_WORKER_MAX_JOBS,
+    job_timeout=settings.PDF_JOB_TIMEOUT,
+    queue_size=settings.PDF_QUEUE_SIZE,
+)
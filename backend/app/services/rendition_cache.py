@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+from app.utils import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+class RenditionCache:
+    """
+    Content-addressed cache of PDF renditions of DOCX files.
+
+    Entries are keyed by sha256(docx bytes + converter version), so a DOCX that
+    was rewritten (AI review, regeneration) never gets an old PDF back. The
+    cache keeps an index with metadata and evicts least recently used PDFs once
+    the total size goes over `max_bytes`.
+
+    Identical DOCX files share one entry, so each entry lists the source paths
+    that point at it and is only dropped when the last one moves on. The index
+    is written to disk when entries are added or removed; access times from
+    hits are kept in memory and persisted with the next write.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, max_bytes: int, cache_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self._cache_dir = cache_dir
+        self._lock = threading.RLock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._index: Optional[Dict[str, dict]] = None
+
+    @property
+    def cache_dir(self) -> str:
+        if self._cache_dir:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            return self._cache_dir
+        return settings.RENDITIONS_DIR
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, self.INDEX_FILE)
+
+    def _pdf_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def _load_index(self) -> Dict[str, dict]:
+        if self._index is None:
+            try:
+                with open(self._index_path(), "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+            # Drop entries whose PDF disappeared from disk
+            self._index = {
+                k: v for k, v in self._index.items() if os.path.exists(self._pdf_path(k))
+            }
+            for entry in self._index.values():
+                # Indexes written before sources were reference-counted
+                if "sources" not in entry:
+                    entry["sources"] = [entry.pop("source")] if entry.get("source") else []
+        return self._index
+
+    def _save_index(self) -> None:
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index or {}, f)
+        os.replace(tmp_path, self._index_path())
+
+    def make_key(self, docx_path: str, converter: str) -> str:
+        digest = hashlib.sha256()
+        digest.update(compute_file_hash(docx_path).encode())
+        digest.update(converter.encode())
+        return digest.hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        with self._lock:
+            index = self._load_index()
+            entry = index.get(key)
+            pdf_path = self._pdf_path(key)
+            if not entry or not os.path.exists(pdf_path):
+                if index.pop(key, None) is not None:
+                    self._save_index()
+                return None
+            entry["last_access"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            return pdf_path
+
+    def _store(self, key: str, source: str, converter: str) -> None:
+        with self._lock:
+            index = self._load_index()
+            # A newer rendition of the same source replaces the previous one,
+            # unless another source still points at it
+            for old_key, old_entry in list(index.items()):
+                if old_key != key and source in old_entry["sources"]:
+                    old_entry["sources"].remove(source)
+                    if not old_entry["sources"]:
+                        self._remove(old_key)
+
+            now = time.time()
+            entry = index.get(key)
+            if entry is None:
+                entry = index[key] = {
+                    "sources": [],
+                    "converter": converter,
+                    "size": os.path.getsize(self._pdf_path(key)),
+                    "created_at": now,
+                    "hits": 0,
+                }
+            if source not in entry["sources"]:
+                entry["sources"].append(source)
+            entry["last_access"] = now
+            self._evict(keep=key)
+            self._save_index()
+
+    def _add_source(self, key: str, source: str) -> None:
+        """Record that `source` now renders to `key` (a hit from another path)."""
+        with self._lock:
+            entry = self._load_index().get(key)
+            if entry is None or source in entry["sources"]:
+                return
+        self._store(key, source, entry["converter"])
+
+    def _remove(self, key: str) -> None:
+        self._index.pop(key, None)
+        try:
+            os.remove(self._pdf_path(key))
+        except OSError:
+            pass
+
+    def _evict(self, keep: str) -> None:
+        total = sum(e.get("size", 0) for e in self._index.values())
+        if total <= self.max_bytes:
+            return
+        by_age = sorted(self._index.items(), key=lambda kv: kv[1].get("last_access", 0))
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= entry.get("size", 0)
+            self._remove(key)
+            logger.info(f"Rendition cache evicted {key}")
+
+    def get_pdf(
+        self,
+        docx_path: str,
+        convert: Callable[[str, str], None],
+        converter: str,
+    ) -> str:
+        """
+        Return the path of an up-to-date PDF for `docx_path`, calling
+        `convert(docx_path, pdf_path)` only on a cache miss.
+        """
+        key = self.make_key(docx_path, converter)
+        source = os.path.abspath(docx_path)
+        cached = self.lookup(key)
+        if cached:
+            self._add_source(key, source)
+            return cached
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Concurrent requests for the same bytes wait for a single conversion
+        try:
+            with key_lock:
+                cached = self.lookup(key)
+                if cached:
+                    self._add_source(key, source)
+                    return cached
+
+                tmp_pdf = os.path.join(self.cache_dir, f"{key}.{threading.get_ident()}.tmp.pdf")
+                try:
+                    convert(source, tmp_pdf)
+                    if not os.path.exists(tmp_pdf):
+                        raise FileNotFoundError("PDF file was not created after conversion attempt.")
+                    os.replace(tmp_pdf, self._pdf_path(key))
+                finally:
+                    if os.path.exists(tmp_pdf):
+                        os.remove(tmp_pdf)
+
+                self._store(key, source, converter)
+                return self._pdf_path(key)
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+
+rendition_cache = RenditionCache(max_bytes=settings.PDF_CACHE_MAX_MB * 1024 * 1024)
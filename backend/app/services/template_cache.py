@@ -0,0 +1,193 @@
+import io
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from docx import Document as DocxDocument
+from docxtpl import DocxTemplate
+from jinja2 import Template as JinjaTemplate
+from jinja2 import TemplateError
+
+from app.core.config import settings
+from app.utils import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _add_docx_context(exc: TemplateError, src_xml: str) -> None:
+    # What DocxTemplate.render_xml_part attaches: the text of the template
+    # lines around the error, without the XML tags
+    if getattr(exc, "lineno", None) is not None:
+        line_number = max(exc.lineno - 4, 0)
+        exc.docx_context = [
+            re.sub(r"<[^>]+>", "", line) for line in src_xml.splitlines()[line_number:line_number + 7]
+        ]
+
+
+class CompiledTemplate:
+    """
+    Immutable, shareable result of parsing a .docx template once: the raw
+    package bytes plus the patched XML of every part compiled to Jinja. The
+    source of each part is kept next to its template so errors can point at
+    the offending lines.
+    """
+
+    def __init__(self, template_id: int, file_path: str):
+        stat = os.stat(file_path)
+        self.template_id = template_id
+        self.file_path = file_path
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.file_hash = compute_file_hash(file_path)
+        with open(file_path, "rb") as f:
+            self.blob = f.read()
+
+        parser = DocxTemplate(io.BytesIO(self.blob))
+        parser.init_docx()
+        self.body = self._compile(parser.patch_xml(parser.get_xml()))
+
+        # Headers and footers, keyed by part name: (encoding, (template, source))
+        self.parts: Dict[str, Tuple[str, Tuple[JinjaTemplate, str]]] = {}
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for _, part in parser.get_headers_footers(uri):
+                xml = parser.get_part_xml(part)
+                encoding = parser.get_headers_footers_encoding(xml)
+                self.parts[str(part.partname)] = (encoding, self._compile(parser.patch_xml(xml)))
+
+    @staticmethod
+    def _compile(src_xml: str) -> Tuple[JinjaTemplate, str]:
+        # Same pre-processing DocxTemplate.render_xml_part does before compiling
+        src_xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", src_xml)
+        try:
+            return JinjaTemplate(src_xml), src_xml
+        except TemplateError as exc:
+            _add_docx_context(exc, src_xml)
+            raise
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """
+    DocxTemplate backed by a CompiledTemplate.
+
+    Each instance opens its own Document from the cached bytes (the copy that
+    render() mutates) and skips the XML patching and Jinja compilation.
+    """
+
+    def __init__(self, compiled: CompiledTemplate):
+        super().__init__(io.BytesIO(compiled.blob))
+        self.compiled = compiled
+
+    def init_docx(self, reload: bool = True):
+        # Deliberately a full parse per render: render() rewrites the document
+        # tree in place, so every render needs its own Document. Unzipping and
+        # parsing the package is cheap next to patch_xml and the Jinja compile,
+        # which are what the cache saves.
+        if not self.docx or (self.is_rendered and reload):
+            self.docx = DocxDocument(io.BytesIO(self.compiled.blob))
+            self.is_rendered = False
+
+    def _render_compiled(self, compiled: Tuple[JinjaTemplate, str], part, context) -> str:
+        template, src_xml = compiled
+        try:
+            self.current_rendering_part = part
+            dst_xml = template.render(context)
+        except TemplateError as exc:
+            _add_docx_context(exc, src_xml)
+            raise
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        if jinja_env:
+            return super().build_xml(context, jinja_env)
+        return self._render_compiled(self.compiled.body, self.docx._part, context)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        if jinja_env:
+            yield from super().build_headers_footers_xml(context, uri, jinja_env)
+            return
+        for relKey, part in self.get_headers_footers(uri):
+            cached = self.compiled.parts.get(str(part.partname))
+            if cached is None:
+                xml = self.get_part_xml(part)
+                encoding = self.get_headers_footers_encoding(xml)
+                xml = self.render_xml_part(self.patch_xml(xml), part, context)
+            else:
+                encoding, compiled = cached
+                xml = self._render_compiled(compiled, part, context)
+            yield relKey, xml.encode(encoding)
+
+
+class TemplateCache:
+    """
+    In-process LRU cache of compiled .docx templates.
+
+    Entries are keyed by template id and validated against the file's mtime;
+    when the mtime changes the content hash decides whether to recompile.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CompiledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, template_id: int, file_path: str) -> Optional[CompiledTemplate]:
+        entry = self._entries.get(template_id)
+        if entry is None or entry.file_path != file_path:
+            return None
+        stat = os.stat(file_path)
+        if stat.st_mtime_ns == entry.mtime_ns and stat.st_size == entry.size:
+            return entry
+        # Touched but possibly identical (e.g. copied back): compare contents
+        if stat.st_size == entry.size and compute_file_hash(file_path) == entry.file_hash:
+            entry.mtime_ns = stat.st_mtime_ns
+            return entry
+        return None
+
+    def get(self, template_id: int, file_path: str) -> CachedDocxTemplate:
+        """Return a fresh, renderable clone of the compiled template."""
+        with self._lock:
+            entry = self._lookup(template_id, file_path)
+            if entry is not None:
+                self._entries.move_to_end(template_id)
+                self.hits += 1
+                return CachedDocxTemplate(entry)
+
+        # Compile outside the lock so one slow template does not block the rest
+        entry = CompiledTemplate(template_id, file_path)
+        with self._lock:
+            self.misses += 1
+            self._entries[template_id] = entry
+            self._entries.move_to_end(template_id)
+            while len(self._entries) > self.max_entries:
+                evicted_id, _ = self._entries.popitem(last=False)
+                logger.debug(f"Template cache evicted template {evicted_id}")
+        return CachedDocxTemplate(entry)
+
+    def invalidate(self, template_id: int) -> None:
+        with self._lock:
+            self._entries.pop(template_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+template_cache = TemplateCache(max_entries=settings.TEMPLATE_CACHE_SIZE)
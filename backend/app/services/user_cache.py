@@ -0,0 +1,74 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.core.config import settings
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """
+    Short-lived LRU cache of resolved users keyed by token subject.
+
+    Only column values are cached, never ORM instances, so no object is shared
+    between sessions. A hit is attached to the caller's session with
+    merge(load=False), which does not touch the database. Entries expire after
+    `ttl` seconds and are dropped as soon as crud.user updates or removes them.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = [attr.key for attr in inspect(User).column_attrs]
+
+    def get(self, db: Session, subject: Any) -> Optional[User]:
+        key = str(subject)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                values = entry[1]
+            else:
+                self._entries.pop(key, None)
+                values = None
+
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.merge(user, load=False)
+
+        user = db.query(User).filter(User.id == subject).first()
+        if user is not None:
+            self.put(key, user)
+        return user
+
+    def put(self, subject: Any, user: User) -> None:
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        values = {column: getattr(user, column) for column in self._columns}
+        with self._lock:
+            self._entries[str(subject)] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(str(subject))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: Any) -> None:
+        with self._lock:
+            self._entries.pop(str(subject), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+user_cache = UserCache(max_entries=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TTL_SECONDS)
@@ -0,0 +1,77 @@
+import logging
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class _ZipSink:
+    """
+    Write-only file object for zipfile. It has no tell()/seek(), so zipfile
+    writes each entry with a data descriptor and never goes back to patch a
+    header, which is what allows the archive to be streamed.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Tuple[str, Optional[str]]]) -> Iterator[bytes]:
+    """
+    Streams a ZIP_STORED archive of (arcname, path) entries. Each local file
+    entry is yielded while its file is read, and the central directory is
+    yielded last. Entries with a path of None are skipped.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zip_file:
+        for arcname, path in entries:
+            if not path:
+                continue
+            zinfo = zipfile.ZipInfo.from_file(path, arcname)
+            zinfo.compress_type = zipfile.ZIP_STORED
+            with open(path, "rb") as src, zip_file.open(zinfo, "w") as dest:
+                while chunk := src.read(settings.EXPORT_CHUNK_BYTES):
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def prefetch(func: Callable[[T], R], items: Iterable[T], workers: int) -> Iterator[Tuple[T, R]]:
+    """
+    Yields (item, func(item)) in input order, keeping at most 2 * workers
+    calls in flight on a thread pool so results never pile up in memory.
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    in_flight = deque()
+    try:
+        for item in items:
+            in_flight.append((item, executor.submit(func, item)))
+            if len(in_flight) >= 2 * workers:
+                done, future = in_flight.popleft()
+                yield done, future.result()
+        while in_flight:
+            done, future = in_flight.popleft()
+            yield done, future.result()
+    finally:
+        # Client went away: drop the conversions that have not started yet
+        executor.shutdown(wait=False, cancel_futures=True)
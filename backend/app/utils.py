@@ -4,6 +4,16 @@ import json
 from docx import Document
 from openai import OpenAI
 
+def compute_file_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 del contenido de un archivo, leído por bloques."""
+    import hashlib
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def get_openai_client():
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -137,16 +147,10 @@ def extract_variables_from_docx(file_path: str) -> list[str]:
 def extract_text_from_pdf(file_path: str) -> str:
     """Extrae todo el texto de un archivo .pdf para análisis de IA."""
     try:
-        import fitz  # PyMuPDF
-        doc = fitz.open(file_path)
-        text_parts = []
-        for page_num, page in enumerate(doc, 1):
-            page_text = page.get_text()
-            if page_text.strip():
-                text_parts.append(f"--- PÁGINA {page_num} ---")
-                text_parts.append(page_text)
-        doc.close()
-        return "\n".join(text_parts)
+        from app.services.ai.ocr_service import ocr_service, join_pages
+        # Las páginas se extraen en paralelo por rangos y vuelven en orden
+        pages = ocr_service.extract_pdf_pages_sync(file_path)
+        return join_pages((page["page"], page["text"]) for page in pages)
     except ImportError:
         print("PyMuPDF no instalado. Instala con: pip install pymupdf")
         return ""
@@ -183,7 +187,7 @@ def extract_text_from_docx(file_path: str) -> str:
         print(f"Error extracting text for AI analysis: {e}")
         return ""
 
-def generate_template_proposal(doc_text: str, user_prompt: str = None) -> dict:
+def generate_template_proposal(doc_text: str, user_prompt: str = None, db=None) -> dict:
     """Genera una propuesta de variables usando OpenAI."""
     extra_instructions = ""
     if user_prompt and user_prompt.strip():
@@ -215,17 +219,22 @@ Texto del documento base:
 """
 
     try:
-        client = get_openai_client()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un asistente de automatización JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1
-        )
-        
-        content = response.choices[0].message.content.strip()
+        from app.services.ai.llm_provider import llm_service
+        messages = [
+            {"role": "system", "content": "Eres un asistente de automatización JSON."},
+            {"role": "user", "content": prompt}
+        ]
+
+        def fetch():
+            client = get_openai_client()
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.1
+            )
+            return response.choices[0].message.content or ""
+
+        content = llm_service.cached(db, "openai", "gpt-4o-mini", messages, 0.1, False, fetch).strip()
         # Clean markdown codeblocks if AI happens to return them despite instructions
         if content.startswith("```json"):
             content = content[7:]
@@ -240,7 +249,7 @@ Texto del documento base:
         return {"simple": [], "groups": []}
 
 
-def review_document_with_ai(docx_path: str) -> dict:
+def review_document_with_ai(docx_path: str, db=None) -> dict:
     """
     Revisa un documento .docx generado con IA para corregir errores de redacción
     y asegurar consistencia de datos (montos, nombres, fechas).
@@ -284,18 +293,23 @@ IMPORTANTE:
 Texto del documento:
 {doc_text[:8000]}
 """
-        client = get_openai_client()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un revisor de documentos legales. Solo devuelves JSON válido."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=2000
-        )
+        from app.services.ai.llm_provider import llm_service
+        messages = [
+            {"role": "system", "content": "Eres un revisor de documentos legales. Solo devuelves JSON válido."},
+            {"role": "user", "content": prompt}
+        ]
+
+        def fetch():
+            client = get_openai_client()
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.1,
+                max_tokens=2000
+            )
+            return response.choices[0].message.content or ""
 
-        content = response.choices[0].message.content.strip()
+        content = llm_service.cached(db, "openai", "gpt-4o-mini", messages, 0.1, False, fetch).strip()
         # Limpiar markdown si el modelo lo incluye
         if content.startswith("```json"):
             content = content[7:]
@@ -473,40 +487,20 @@ def convert_to_pdf(docx_path: str) -> str:
     """
     Converts a .docx file to .pdf.
     - Windows/macOS: uses docx2pdf (requires MS Word).
-    - Linux: uses libreoffice (headless).
+    - Linux: uses the shared LibreOffice worker pool (headless).
     Returns the path to the generated PDF.
     """
-    import sys
-    import subprocess
     import platform
     import os
-    
+
     pdf_path = docx_path.replace(".docx", ".pdf")
-    
+
     try:
         if platform.system() == "Linux":
-            # Linux: Use LibreOffice
-            # libreoffice --headless --convert-to pdf <file> --outdir <dir>
-            output_dir = os.path.dirname(pdf_path)
-            cmd = [
-                "libreoffice",
-                "--headless",
-                "--convert-to",
-                "pdf",
-                docx_path,
-                "--outdir",
-                output_dir
-            ]
-            print(f"Converting to PDF using LibreOffice: {' '.join(cmd)}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                print(f"LibreOffice failed: {result.stderr}")
-                raise Exception(f"LibreOffice conversion failed: {result.stderr}")
-                
-            # LibreOffice might change the filename case or something, but usually it keeps it.
-            # It blindly replaces extension.
-            
+            from app.services.office_pool import office_pool
+            print(f"Converting {docx_path} to PDF using LibreOffice pool...")
+            office_pool.convert(docx_path, pdf_path)
+
         else:
             # Windows/Mac: Use docx2pdf (requires MS Word installed)
             from docx2pdf import convert
@@ -537,7 +531,7 @@ def extract_indexed_paragraphs(file_path: str) -> str:
         return "[]"
 
 
-def generate_conditional_blocks_proposal(indexed_text_json: str, user_prompt: str = None) -> list:
+def generate_conditional_blocks_proposal(indexed_text_json: str, user_prompt: str = None, db=None) -> list:
     """Genera propuesta de bloques condicionales usando OpenAI."""
     if user_prompt and user_prompt.strip():
         extra_instructions = (
@@ -573,17 +567,23 @@ def generate_conditional_blocks_proposal(indexed_text_json: str, user_prompt: st
         f"Párrafos del documento (JSON indexado):\n{indexed_text_json[:15000]}"
     )
     try:
-        client = get_openai_client()
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": "Devuelve exclusivamente JSON válido según el esquema."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1
-        )
-        content = response.choices[0].message.content.strip()
+        from app.services.ai.llm_provider import llm_service
+        messages = [
+            {"role": "system", "content": "Devuelve exclusivamente JSON válido según el esquema."},
+            {"role": "user", "content": prompt}
+        ]
+
+        def fetch():
+            client = get_openai_client()
+            response = client.chat.completions.create(
+                model="gpt-4o-mini",
+                response_format={"type": "json_object"},
+                messages=messages,
+                temperature=0.1
+            )
+            return response.choices[0].message.content or ""
+
+        content = llm_service.cached(db, "openai", "gpt-4o-mini", messages, 0.1, True, fetch, validate=json.loads).strip()
         data = json.loads(content)
         return data.get("conditional_blocks", [])
     except Exception as e:
@@ -77,7 +77,45 @@ def startup_event():
         except Exception as e:
             # Column likely already exists or other error, ignore
             pass
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE extractor_projects ADD COLUMN llm_cache_enabled BOOLEAN DEFAULT 1"))
+            logger.info("Successfully added llm_cache_enabled column to extractor_projects table.")
+        except Exception:
+            # Column likely already exists or other error, ignore
+            pass
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE extractor_projects ADD COLUMN local_classify_threshold FLOAT DEFAULT 0.9"))
+            logger.info("Successfully added local_classify_threshold column to extractor_projects table.")
+        except Exception:
+            # Column likely already exists or other error, ignore
+            pass
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("ALTER TABLE extracted_documents ADD COLUMN classification_source VARCHAR"))
+            logger.info("Successfully added classification_source column to extracted_documents table.")
+        except Exception:
+            # Column likely already exists or other error, ignore
+            pass
         
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_documents_user_created ON documents (user_id, created_at, id)"))
+        except Exception as e:
+            logger.error(f"Could not create ix_documents_user_created: {e}")
+
+        try:
+            from app.db.fts import setup_document_search, setup_extraction_search
+            setup_document_search(engine)
+            setup_extraction_search(engine)
+        except Exception as e:
+            # Search falls back to ILIKE
+            logger.error(f"Could not set up search indexes: {e}")
+
         # Initialize DB with admin user
         db = SessionLocal()
         init_db(db)
@@ -86,10 +124,45 @@ def startup_event():
     except Exception as e:
         logger.error(f"Error initializing DB: {e}")
         logger.error(traceback.format_exc())
-        
+
+    # Warm up the LibreOffice pool in the background so the first PDF is fast
+    try:
+        import threading
+        from app.services.office_pool import office_pool
+        if office_pool.available():
+            threading.Thread(target=office_pool.start, daemon=True).start()
+    except Exception as e:
+        logger.error(f"Error starting office pool: {e}")
+
     logger.info("Application startup complete (custom log)")
 
 
+@app.on_event("startup")
+async def start_extraction_pipeline():
+    # Resume queued/interrupted extractor jobs left in processing_jobs
+    try:
+        from app.db.session import SessionLocal
+        from app.services.ai.pipeline import extraction_pipeline
+        extraction_pipeline.start(SessionLocal)
+    except Exception as e:
+        logger.error(f"Error starting extraction pipeline: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.services.office_pool import office_pool
+    from app.services.batch_generation import batch_generation_service
+    from app.services.ai.llm_provider import llm_service
+    from app.services.ai.ocr_service import ocr_service
+    from app.services.ai.pipeline import extraction_pipeline
+    await extraction_pipeline.stop()
+    office_pool.shutdown()
+    batch_generation_service.shutdown()
+    ocr_service.shutdown()
+    await ocr_service.aclose()
+    await llm_service.aclose()
+
+
 # Set all CORS enabled origins
 if settings.BACKEND_CORS_ORIGINS:
     app.add_middleware(
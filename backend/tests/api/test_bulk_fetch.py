@@ -0,0 +1,94 @@
+import io
+import zipfile
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.services.document_export import export_documents_to_excel
+
+
+def count_queries(db: Session):
+    statements = []
+    engine = db.get_bind().engine
+
+    def before_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    return statements, lambda: event.remove(engine, "before_cursor_execute", before_execute)
+
+
+def seed(db: Session):
+    owner = crud.user.create(db, obj_in=schemas.UserCreate(email="bulk_owner@example.com", password="password123"))
+    other = crud.user.create(db, obj_in=schemas.UserCreate(email="bulk_other@example.com", password="password123"))
+    template = models.Template(title="T", file_path="t.docx", owner_id=owner.id)
+    db.add(template)
+    db.flush()
+    docs = [
+        models.Document(
+            title=f"Doc {i}", generated_file_path=f"doc{i}.docx", variables={"n": i},
+            user_id=owner.id if i % 2 == 0 else other.id, template_id=template.id,
+        )
+        for i in range(20)
+    ]
+    db.add_all(docs)
+    db.commit()
+    return owner.id, [d.id for d in docs]
+
+
+def test_get_multi_by_ids_filters_owner_in_one_query(db: Session):
+    owner_id, ids = seed(db)
+    db.expire_all()
+
+    statements, stop = count_queries(db)
+    try:
+        docs = crud.document.get_multi_by_ids(db, ids=list(reversed(ids)) + [999999], owner_id=owner_id)
+        titles = [d.template.title for d in docs]
+    finally:
+        stop()
+
+    assert len(statements) == 1
+    assert [d.id for d in docs] == [i for i in reversed(ids) if i % 2 == ids[0] % 2]
+    assert all(d.user_id == owner_id for d in docs)
+    assert titles == ["T"] * 10
+
+    assert len(crud.document.get_multi_by_ids(db, ids=ids)) == 20
+    assert crud.document.get_multi_by_ids(db, ids=[]) == []
+
+
+def test_excel_export_query_count_is_constant(db: Session):
+    owner_id, ids = seed(db)
+    db.expire_all()
+
+    statements, stop = count_queries(db)
+    try:
+        output = export_documents_to_excel(db, ids, user_id=owner_id)
+    finally:
+        stop()
+
+    assert len(statements) == 1
+    assert output.getvalue()[:2] == b"PK"
+
+
+async def test_bulk_download_streams_only_owned_files(client, db: Session, tmp_path):
+    owner_id, ids = seed(db)
+    for doc in crud.document.get_multi_by_ids(db, ids=ids):
+        path = tmp_path / f"{doc.id}.docx"
+        path.write_bytes(b"docx %d" % doc.id)
+        doc.generated_file_path = str(path)
+    db.commit()
+
+    login = await client.post(
+        "/api/v1/login/access-token",
+        data={"username": "bulk_owner@example.com", "password": "password123"},
+    )
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+    res = await client.post("/api/v1/documents/bulk-download", headers=headers, json={"ids": ids, "format": "docx"})
+    assert res.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(res.content)) as archive:
+        assert archive.namelist() == [f"Doc {i}.docx" for i in range(0, 20, 2)]
+
+    res = await client.post("/api/v1/documents/bulk-download", headers=headers, json={"ids": ids[1::2], "format": "docx"})
+    assert res.status_code == 400
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+from httpx import AsyncClient
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+
+USER_EMAIL = "cursor_test@example.com"
+USER_PASSWORD = "password123"
+
+
+async def login(client: AsyncClient) -> dict:
+    res = await client.post(
+        "/api/v1/login/access-token",
+        data={"username": USER_EMAIL, "password": USER_PASSWORD},
+    )
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+def seed(db: Session):
+    user = crud.user.create(db, obj_in=schemas.UserCreate(email=USER_EMAIL, password=USER_PASSWORD))
+    template = models.Template(title="T", file_path="t.docx", owner_id=user.id)
+    db.add(template)
+    db.flush()
+    # Several documents share a timestamp, so the id breaks the tie
+    db.add_all([
+        models.Document(
+            title=f"Contrato {i:02d}" if i % 3 else f"Poder {i:02d}",
+            generated_file_path=f"doc{i}.docx", user_id=user.id, template_id=template.id,
+            created_at=datetime(2024, 1, 1 + i // 4),
+        )
+        for i in range(22)
+    ])
+    # The newest ones use the database default, stored in another text format
+    db.add_all([
+        models.Document(
+            title=f"Contrato {i:02d}" if i % 3 else f"Poder {i:02d}", generated_file_path=f"doc{i}.docx",
+            user_id=user.id, template_id=template.id,
+        )
+        for i in range(22, 25)
+    ])
+    db.commit()
+
+
+async def test_cursor_pages_cover_every_document_once(client: AsyncClient, db: Session):
+    seed(db)
+    headers = await login(client)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 7} if cursor is None else {"limit": 7, "cursor": cursor}
+        res = await client.get("/api/v1/documents/", headers=headers, params=params)
+        assert res.status_code == 200
+        seen.extend(res.json())
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == 25
+    assert len({d["id"] for d in seen}) == 25
+    keys = [(d["created_at"], d["id"]) for d in seen]
+    assert keys == sorted(keys, reverse=True)
+
+
+async def test_cursor_survives_deleting_the_last_document_of_a_page(client: AsyncClient, db: Session):
+    seed(db)
+    headers = await login(client)
+
+    first = await client.get("/api/v1/documents/", headers=headers, params={"limit": 10})
+    cursor = first.headers["X-Next-Cursor"]
+    last_id = first.json()[-1]["id"]
+    db.query(models.Document).filter(models.Document.id == last_id).delete()
+    db.commit()
+
+    second = await client.get("/api/v1/documents/", headers=headers, params={"limit": 10, "cursor": cursor})
+    assert second.status_code == 200
+    ids = [d["id"] for d in first.json()] + [d["id"] for d in second.json()]
+    assert len(second.json()) == 10
+    assert len(set(ids)) == 20
+
+    res = await client.get("/api/v1/documents/", headers=headers, params={"cursor": "not-a-cursor"})
+    assert res.status_code == 400
+
+
+async def test_title_search_uses_index_and_short_queries_fall_back(client: AsyncClient, db: Session):
+    seed(db)
+    headers = await login(client)
+
+    res = await client.get("/api/v1/documents/", headers=headers, params={"search": "poder"})
+    assert sorted(d["title"] for d in res.json()) == [f"Poder {i:02d}" for i in range(0, 25, 3)]
+
+    db.query(models.Document).filter(models.Document.title == "Poder 00").update({"title": "Renombrado"})
+    db.commit()
+    res = await client.get("/api/v1/documents/", headers=headers, params={"search": "poder"})
+    assert len(res.json()) == 8
+
+    res = await client.get("/api/v1/documents/", headers=headers, params={"search": "24"})
+    assert [d["title"] for d in res.json()] == ["Poder 24"]
@@ -0,0 +1,43 @@
+from httpx import AsyncClient
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.models.extractor import ExtractorProject
+
+USER_PASSWORD = "password123"
+
+
+async def login(client: AsyncClient, email: str) -> dict:
+    res = await client.post("/api/v1/login/access-token", data={"username": email, "password": USER_PASSWORD})
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def setup(client: AsyncClient, db: Session):
+    owner = crud.user.create(db, obj_in=schemas.UserCreate(
+        email="project_owner@example.com", password=USER_PASSWORD, has_extractor_access=True
+    ))
+    crud.user.create(db, obj_in=schemas.UserCreate(
+        email="project_other@example.com", password=USER_PASSWORD, has_extractor_access=True
+    ))
+    project = ExtractorProject(name="P", owner_id=owner.id)
+    db.add(project)
+    db.commit()
+    return project.id, await login(client, "project_owner@example.com"), await login(client, "project_other@example.com")
+
+
+async def test_queue_only_on_own_projects(client: AsyncClient, db: Session):
+    project_id, owner, other = await setup(client, db)
+    url = f"/api/v1/extractor/projects/{project_id}/queue"
+
+    assert (await client.get(url, headers=other)).status_code == 404
+    assert (await client.get(url, headers=owner)).status_code == 200
+
+
+async def test_classification_stats_only_on_own_projects(client: AsyncClient, db: Session):
+    project_id, owner, other = await setup(client, db)
+    url = f"/api/v1/extractor/projects/{project_id}/classification-stats"
+
+    assert (await client.get(url, headers=other)).status_code == 404
+    res = await client.get(url, headers=owner)
+    assert res.status_code == 200
+    assert res.json()["total"] == 0
@@ -0,0 +1,32 @@
+from httpx import AsyncClient
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.models.extractor import ExtractorProject
+
+USER_PASSWORD = "password123"
+
+
+async def login(client: AsyncClient, email: str) -> dict:
+    res = await client.post("/api/v1/login/access-token", data={"username": email, "password": USER_PASSWORD})
+    return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def test_apply_rules_only_on_own_projects(client: AsyncClient, db: Session):
+    owner = crud.user.create(db, obj_in=schemas.UserCreate(
+        email="rules_owner@example.com", password=USER_PASSWORD, has_extractor_access=True
+    ))
+    crud.user.create(db, obj_in=schemas.UserCreate(
+        email="rules_other@example.com", password=USER_PASSWORD, has_extractor_access=True
+    ))
+    project = ExtractorProject(name="P", owner_id=owner.id)
+    db.add(project)
+    db.commit()
+    url = f"/api/v1/extractor/projects/{project.id}/rules/apply"
+
+    res = await client.post(url, headers=await login(client, "rules_other@example.com"))
+    assert res.status_code == 404
+
+    res = await client.post(url, headers=await login(client, "rules_owner@example.com"))
+    assert res.status_code == 200
+    assert res.json() == {"alerts_created": 0}
@@ -0,0 +1,84 @@
+from httpx import AsyncClient
+from sqlalchemy.orm import Session
+
+from app import crud, schemas
+from app.models.extractor import DocType, ExtractedDocument, ExtractionAlert, ExtractorProject
+
+USER_EMAIL = "summary_test@example.com"
+USER_PASSWORD = "password123"
+
+
+async def setup(client: AsyncClient, db: Session):
+    user = crud.user.create(db, obj_in=schemas.UserCreate(
+        email=USER_EMAIL, password=USER_PASSWORD, has_extractor_access=True
+    ))
+    project = ExtractorProject(name="P", owner_id=user.id)
+    db.add(project)
+    db.flush()
+    doc_type = DocType(project_id=project.id, name="Factura")
+    db.add(doc_type)
+    db.flush()
+    docs = [
+        ExtractedDocument(
+            project_id=project.id, file_path=f"/tmp/{i}.pdf", file_name=f"{i}.pdf",
+            status="completed" if i < 4 else "error", review_status="pending" if i % 2 else "approved",
+            doc_type_id=doc_type.id if i < 3 else None, ocr_text="x" * 10000,
+        )
+        for i in range(5)
+    ]
+    db.add_all(docs)
+    db.flush()
+    db.add_all([
+        ExtractionAlert(document_id=docs[1].id, rule_name="r1", is_resolved=False),
+        ExtractionAlert(document_id=docs[1].id, rule_name="r2", is_resolved=True),
+        ExtractionAlert(document_id=docs[3].id, rule_name="r1", is_resolved=False),
+    ])
+    db.commit()
+
+    res = await client.post(
+        "/api/v1/login/access-token",
+        data={"username": USER_EMAIL, "password": USER_PASSWORD},
+    )
+    return project.id, doc_type.id, [d.id for d in docs], {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+
+async def test_summary_lists_projection_with_alert_counts(client: AsyncClient, db: Session):
+    project_id, doc_type_id, ids, headers = await setup(client, db)
+
+    res = await client.get(f"/api/v1/extractor/projects/{project_id}/documents/summary", headers=headers)
+    assert res.status_code == 200
+    assert res.headers["X-Total-Count"] == "5"
+    rows = res.json()
+    assert [r["id"] for r in rows] == ids
+    assert "ocr_text" not in rows[0] and "field_values" not in rows[0]
+    assert rows[0]["doc_type_name"] == "Factura" and rows[4]["doc_type_name"] is None
+    assert [(r["alert_count"], r["open_alert_count"]) for r in rows] == [(0, 0), (2, 1), (0, 0), (1, 1), (0, 0)]
+
+
+async def test_summary_filters_and_pages(client: AsyncClient, db: Session):
+    project_id, doc_type_id, ids, headers = await setup(client, db)
+    url = f"/api/v1/extractor/projects/{project_id}/documents/summary"
+
+    res = await client.get(url, headers=headers, params={"status": "completed", "review_status": "pending"})
+    assert [r["id"] for r in res.json()] == [ids[1], ids[3]]
+
+    res = await client.get(url, headers=headers, params={"doc_type_id": doc_type_id, "skip": 1, "limit": 1})
+    assert res.headers["X-Total-Count"] == "3"
+    assert [r["id"] for r in res.json()] == [ids[1]]
+
+
+async def test_summary_of_another_users_project_is_not_found(client: AsyncClient, db: Session):
+    project_id, doc_type_id, ids, headers = await setup(client, db)
+    crud.user.create(db, obj_in=schemas.UserCreate(
+        email="summary_other@example.com", password=USER_PASSWORD, has_extractor_access=True
+    ))
+    res = await client.post(
+        "/api/v1/login/access-token",
+        data={"username": "summary_other@example.com", "password": USER_PASSWORD},
+    )
+
+    res = await client.get(
+        f"/api/v1/extractor/projects/{project_id}/documents/summary",
+        headers={"Authorization": f"Bearer {res.json()['access_token']}"},
+    )
+    assert res.status_code == 404
@@ -72,3 +72,27 @@ async def test_templates_crud(client: AsyncClient, db: Session):
     # Verify it's gone
     get_again = await client.get(f"/api/v1/templates/{template_id}", headers=headers)
     assert get_again.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_batch_job_is_scoped_to_its_template(client: AsyncClient, db: Session):
+    from app.services.batch_generation import BatchJob, batch_generation_service
+
+    user = crud.user.create(db, obj_in=schemas.UserCreate(email="batch_scope@example.com", password=USER_PASSWORD))
+    login_response = await client.post(
+        "/api/v1/login/access-token",
+        data={"username": "batch_scope@example.com", "password": USER_PASSWORD},
+    )
+    headers = {"Authorization": f"Bearer {login_response.json()['access_token']}"}
+
+    job = BatchJob(template_id=7, user_id=user.id)
+    batch_generation_service._jobs[job.id] = job
+    try:
+        response = await client.get(f"/api/v1/templates/7/batch-generate/{job.id}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["template_id"] == 7
+
+        response = await client.get(f"/api/v1/templates/8/batch-generate/{job.id}", headers=headers)
+        assert response.status_code == 404
+    finally:
+        batch_generation_service._jobs.pop(job.id, None)
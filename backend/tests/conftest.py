@@ -1,13 +1,15 @@
 import pytest
 from httpx import AsyncClient, ASGITransport
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from typing import AsyncGenerator
 
 from main import app
 from app.db.base import Base
+from app.db.fts import setup_document_search, setup_extraction_search
 from app.api.deps import get_db
+from app.services.user_cache import user_cache
 
 # Use in-memory SQLite for tests
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -22,9 +24,18 @@ TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engin
 @pytest.fixture(scope="session")
 def db_engine():
     Base.metadata.create_all(bind=engine)
+    setup_document_search(engine)
+    setup_extraction_search(engine)
     yield engine
     Base.metadata.drop_all(bind=engine)
 
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    # Each test rolls its users back, so ids are reused between tests
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
 @pytest.fixture(scope="function")
 def db(db_engine):
     connection = db_engine.connect()
@@ -35,6 +46,29 @@ def db(db_engine):
     transaction.rollback()
     connection.close()
 
+@pytest.fixture(scope="function")
+def session_factory(db_engine):
+    """
+    For code that opens and commits its own sessions (workers, caches). The
+    rows are really committed, so every table is emptied afterwards.
+    """
+    yield TestingSessionLocal
+    with db_engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+@pytest.fixture(scope="function")
+def sql_statements(db_engine):
+    """SQL statements run on the test engine during the test."""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db_engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(db_engine, "before_cursor_execute", record)
+
 @pytest.fixture(scope="function")
 async def client(db) -> AsyncGenerator[AsyncClient, None]:
     def override_get_db():
@@ -0,0 +1,79 @@
+import io
+import os
+import time
+
+import openpyxl
+from docx import Document
+
+from app import models
+from app.services.batch_generation import BatchGenerationService
+
+
+def make_workbook(rows):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["output_filename", "name", "amount"])
+    for row in rows:
+        ws.append(row)
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+class FakeTemplate:
+    def __init__(self, id, title, file_path):
+        self.id = id
+        self.title = title
+        self.file_path = file_path
+
+
+def test_batch_job_renders_rows_and_saves_in_bulk(tmp_path, session_factory):
+    template_path = str(tmp_path / "batch_tpl.docx")
+    doc = Document()
+    doc.add_paragraph("{{ name }} debe {{ amount + 1 }}")
+    doc.save(template_path)
+
+    content = make_workbook([
+        ["batch_test_a", "Ana", 10],
+        [None, None, None],
+        ["batch_test_b", "Luis", "no es numero"],
+        ["batch_test_c", "Eva", 30],
+    ])
+
+    service = BatchGenerationService(max_workers=2, chunk_size=2)
+    # Total seen by progress readers while rows are still being pulled
+    totals = []
+    iter_rows = service._iter_rows
+
+    def rows_with_totals(job, *args):
+        for row in iter_rows(job, *args):
+            totals.append(job.total)
+            yield row
+
+    service._iter_rows = rows_with_totals
+    try:
+        job = service.submit(session_factory, FakeTemplate(99, "Batch", template_path), 7, content)
+        deadline = time.time() + 60
+        while not job.finished and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        service.shutdown()
+
+    result = job.to_dict()
+    assert result["status"] == "completed"
+    assert result["total"] == 3
+    assert totals == [3, 3, 3]
+    assert result["success"] == 2
+    assert result["failed"] == 1
+    assert result["errors"][0].startswith("Row 4:")
+
+    db = session_factory()
+    saved = db.query(models.Document).order_by(models.Document.title).all()
+    assert [d.title for d in saved] == ["batch_test_a", "batch_test_c"]
+    assert {d["id"] for d in result["generated_docs"]} == {d.id for d in saved}
+
+    rendered = Document(saved[0].generated_file_path)
+    assert rendered.paragraphs[0].text == "Ana debe 11"
+    for d in saved:
+        os.remove(d.generated_file_path)
+    db.close()
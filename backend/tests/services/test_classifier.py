@@ -0,0 +1,117 @@
+import asyncio
+import json
+
+import pytest
+
+from app.models.extractor import DocType
+from app.services.ai import classifier as classifier_module
+from app.services.ai.classifier import ClassifierService
+
+TEXTS = {
+    10: "RESOLUCIÓN No. 123 por medio de la cual se resuelve un recurso",
+    11: "DERECHO DE PETICIÓN dirigido a la entidad para solicitar copias",
+    12: "Acta de reunión del comité de conciliación de la entidad",
+}
+
+
+@pytest.fixture
+def doc_types():
+    return [
+        DocType(id=1, name="Resolución", aliases='["Resolucion"]'),
+        DocType(id=2, name="Derecho de Petición"),
+        DocType(id=3, name="Otro"),
+    ]
+
+
+@pytest.fixture
+def llm_calls(monkeypatch):
+    calls = []
+    responses = []
+    sessions = []
+
+    async def complete(db, provider, messages, model, **kwargs):
+        calls.append(messages[1]["content"])
+        sessions.append(db)
+        return responses.pop(0)
+
+    monkeypatch.setattr(classifier_module.llm_service, "complete", complete)
+    return calls, responses, sessions
+
+
+@pytest.mark.asyncio
+async def test_classify_many_maps_answers_by_id(doc_types, llm_calls):
+    calls, responses, sessions = llm_calls
+    responses.append(json.dumps({"resultados": [
+        {"id": "12", "tipo": "Otro", "confianza": 0.6},
+        {"id": "10", "tipo": "resolucion", "confianza": 0.95},
+        {"id": "11", "tipo": "Derecho de Petición", "confianza": 0.9},
+    ]}))
+
+    results = await ClassifierService().classify_many(None, TEXTS, doc_types, "openai", "gpt-4o-mini")
+
+    assert results == {10: (1, 0.95), 11: (2, 0.9), 12: (3, 0.6)}
+    assert len(calls) == 1
+    assert calls[0].count("Tipos documentales disponibles") == 1
+
+
+@pytest.mark.asyncio
+async def test_classify_many_falls_back_to_single_calls(doc_types, llm_calls):
+    calls, responses, sessions = llm_calls
+    responses.append(json.dumps({"resultados": [{"id": "10", "tipo": "Resolución", "confianza": 0.9}]}))
+    responses.append(json.dumps({"tipo": "Derecho de Petición", "confianza": 0.8}))
+    responses.append("no es json")
+
+    results = await ClassifierService().classify_many(None, TEXTS, doc_types, "openai", "gpt-4o-mini")
+
+    assert results[10] == (1, 0.9)
+    assert results[11] == (2, 0.8)
+    assert results[12] == (None, 0.0)
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_classify_batched_groups_concurrent_calls(db, doc_types, llm_calls, monkeypatch):
+    calls, responses, sessions = llm_calls
+    responses.append(json.dumps({"resultados": [
+        {"id": str(i), "tipo": tipo, "confianza": 0.9}
+        for i, tipo in enumerate(["Resolución", "Derecho de Petición", "Otro"])
+    ]}))
+    monkeypatch.setattr(classifier_module.settings, "CLASSIFY_BATCH_SIZE", 3)
+    monkeypatch.setattr(classifier_module.settings, "CLASSIFY_BATCH_WINDOW_SECONDS", 5)
+
+    service = ClassifierService()
+    results = await asyncio.wait_for(asyncio.gather(*[
+        service.classify_batched(db, text, doc_types, "openai", "gpt-4o-mini")
+        for text in TEXTS.values()
+    ]), timeout=2)
+
+    assert results == [(1, 0.9), (2, 0.9), (3, 0.9)]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_classify_batched_caches_each_document(db, doc_types, llm_calls, monkeypatch):
+    calls, responses, sessions = llm_calls
+    monkeypatch.setattr(classifier_module.settings, "CLASSIFY_BATCH_SIZE", 2)
+    monkeypatch.setattr(classifier_module.settings, "CLASSIFY_BATCH_WINDOW_SECONDS", 0.1)
+    service = ClassifierService()
+    texts = list(TEXTS.values())
+
+    responses.append(json.dumps({"resultados": [
+        {"id": "0", "tipo": "Resolución", "confianza": 0.9},
+        {"id": "1", "tipo": "Derecho de Petición", "confianza": 0.8},
+    ]}))
+    await asyncio.wait_for(asyncio.gather(*[
+        service.classify_batched(db, text, doc_types, "openai", "gpt-4o-mini") for text in texts[:2]
+    ]), timeout=2)
+    # The flush runs on its own session, not on the first caller's
+    assert sessions[0] is not None and sessions[0] is not db
+
+    # A later batch with different companions still reuses the cached answers
+    responses.append(json.dumps({"tipo": "Otro", "confianza": 0.7}))
+    results = await asyncio.wait_for(asyncio.gather(*[
+        service.classify_batched(db, text, doc_types, "openai", "gpt-4o-mini") for text in texts[1:]
+    ]), timeout=2)
+    assert results == [(2, 0.8), (3, 0.7)]
+    assert len(calls) == 2
+    assert texts[1] not in calls[1]
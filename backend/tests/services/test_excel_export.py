@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+
+import pytest
+from openpyxl import load_workbook
+
+from app.models.extractor import ExtractorProject, DocType, ExtractedDocument, DocumentFieldValue
+from app.services.ai import excel_export
+from app.services.ai.excel_export import (
+    stream_project_csv, stream_project_excel, stream_project_json, stream_project_ndjson
+)
+
+
+@pytest.fixture
+def project(db, monkeypatch):
+    monkeypatch.setattr(excel_export.settings, "EXPORT_WINDOW_SIZE", 3)
+    project = ExtractorProject(name="P", owner_id=1)
+    db.add(project)
+    db.flush()
+    resolucion = DocType(project_id=project.id, name="Resolución: 2024")
+    tutela = DocType(project_id=project.id, name="Tutela")
+    db.add_all([resolucion, tutela])
+    db.flush()
+    for i in range(10):
+        doc = ExtractedDocument(
+            project_id=project.id, file_path=f"/{i}.pdf", file_name=f"doc{i}.pdf",
+            status="completed" if i != 9 else "error",
+            review_status="approved" if i % 2 == 0 else "pending",
+            doc_type_id=resolucion.id if i < 6 else tutela.id,
+        )
+        db.add(doc)
+        db.flush()
+        db.add(DocumentFieldValue(document_id=doc.id, field_name="numero", field_label="Número", raw_value=str(100 + i)))
+        if i % 3 == 0:
+            db.add(DocumentFieldValue(document_id=doc.id, field_name="ciudad", field_label="", raw_value="Bogotá"))
+    db.commit()
+    return project
+
+
+def test_csv_export_streams_all_rows(db, project):
+    chunks = list(stream_project_csv(db, project.id, "all"))
+
+    assert len(chunks) > 2
+    content = b"".join(chunks)
+    assert content.startswith(b"\xef\xbb\xbf")
+    rows = list(csv.reader(io.StringIO(content.decode("utf-8-sig"))))
+    assert rows[0] == ["ID", "Archivo", "Tipo", "Estado", "Número", "ciudad"]
+    assert len(rows) == 1 + 9
+    assert rows[1][4:] == ["100", "Bogotá"]
+    assert rows[2][4:] == ["101", ""]
+
+
+def test_json_and_ndjson_exports(db, project):
+    data = json.loads(b"".join(stream_project_json(db, project.id, "approved")))
+    lines = b"".join(stream_project_ndjson(db, project.id, "approved")).decode("utf-8").splitlines()
+
+    assert [d["file_name"] for d in data] == ["doc0.pdf", "doc2.pdf", "doc4.pdf", "doc6.pdf", "doc8.pdf"]
+    assert data[0]["fields"] == {"numero": "100", "ciudad": "Bogotá"}
+    assert [json.loads(line) for line in lines] == data
+    assert json.loads(b"".join(stream_project_json(db, 999, "all"))) == []
+
+
+def test_excel_export_uses_constant_queries_per_window(db, project, sql_statements):
+    content = b"".join(stream_project_excel(db, project.id, "all"))
+
+    workbook = load_workbook(io.BytesIO(content))
+    assert workbook.sheetnames == ["Resumen", "Resolución 2024", "Tutela"]
+    rows = list(workbook["Resolución 2024"].values)
+    assert rows[0] == ("ID", "Archivo", "Fecha", "Estado", "Número", "ciudad")
+    assert len(rows) == 1 + 6
+    assert len(list(workbook["Tutela"].values)) == 1 + 3
+    # doc types + per sheet: columns, 2 windows of (docs, values) and the empty last window
+    assert len(sql_statements) <= 1 + 2 * (1 + 3 * 2)
@@ -0,0 +1,150 @@
+import json
+
+import pytest
+
+from app.models.extractor import DocField, DocType
+from app.services.ai import extractor as extractor_module
+from app.services.ai.extractor import ExtractorService, split_text_chunks
+from app.services.ai.ocr_service import join_pages
+
+
+def long_document(pages=12, chars_per_page=3000):
+    return join_pages(
+        (n, f"Contenido de la página {n}. " + "x" * chars_per_page) for n in range(1, pages + 1)
+    )
+
+
+def test_split_text_chunks_follows_page_markers_with_overlap():
+    text = long_document()
+
+    chunks = split_text_chunks(text, max_chars=10000, overlap=200)
+
+    assert len(chunks) > 1
+    assert all(len(c) <= 10000 + 200 for c in chunks)
+    assert chunks[0].startswith("--- PÁGINA 1 ---")
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.startswith(previous[-200:])
+        # Each new chunk starts at a page boundary right after the overlap
+        assert chunk[200:].startswith("--- PÁGINA ")
+    for n in range(1, 13):
+        assert any(f"--- PÁGINA {n} ---" in c for c in chunks)
+
+
+def test_split_text_chunks_without_markers_cuts_by_size():
+    chunks = split_text_chunks("párrafo\n" * 5000, max_chars=4000, overlap=0)
+
+    assert "".join(chunks) == "párrafo\n" * 5000
+    assert all(len(c) <= 4000 for c in chunks)
+
+
+@pytest.mark.asyncio
+async def test_long_documents_are_extracted_by_chunks_and_merged(monkeypatch):
+    fields = [
+        DocField(id=1, name="numero", label="Número", is_multi=False),
+        DocField(id=2, name="firmante", label="Firmante", is_multi=False),
+        DocField(id=3, name="anexos", label="Anexos", is_multi=True),
+    ]
+    calls = []
+
+    async def complete(db, provider, messages, model, **kwargs):
+        chunk = messages[1]["content"]
+        calls.append(chunk)
+        first = "--- PÁGINA 1 ---" in chunk
+        last = "--- PÁGINA 12 ---" in chunk
+        return json.dumps({"campos": [
+            # The header number has low confidence only in later chunks
+            {"name": "numero", "value": "123" if first else "999", "confidence": 0.9 if first else 0.7},
+            {"name": "firmante", "value": "Ana Pérez" if last else None, "confidence": 0.8 if last else 0.0},
+            {"name": "anexos", "value": f"Anexo {len(calls)}", "confidence": 0.6},
+        ]})
+
+    monkeypatch.setattr(extractor_module.llm_service, "complete", complete)
+    monkeypatch.setattr(extractor_module.settings, "RETRIEVAL_ENABLED", False)
+    monkeypatch.setattr(extractor_module.settings, "EXTRACT_CHUNK_THRESHOLD_CHARS", 20000)
+    monkeypatch.setattr(extractor_module.settings, "EXTRACT_CHUNK_CHARS", 10000)
+
+    results = await ExtractorService().extract_fields(
+        None, long_document(), fields, DocType(name="Resolución"), "openai", "gpt-4o"
+    )
+
+    by_name = {r["field_name"]: r for r in results}
+    assert len(calls) > 1
+    assert by_name["numero"]["raw_value"] == "123"
+    assert by_name["firmante"]["raw_value"] == "Ana Pérez"
+    assert by_name["anexos"]["raw_value"].split("; ") == [f"Anexo {i}" for i in range(1, len(calls) + 1)]
+
+
+@pytest.mark.asyncio
+async def test_retrieval_sends_only_relevant_passages(monkeypatch):
+    filler = "Considerando que la entidad adelantó las actuaciones del caso conforme a la ley. " * 30
+    pages = [(1, "RESOLUCIÓN No. 456 de 2024\nPor la cual se resuelve un recurso")]
+    pages += [(n, filler) for n in range(2, 40)]
+    pages.insert(20, (21, "El valor de la sanción impuesta asciende a 15000000 pesos.\n" + filler))
+    text = join_pages(pages)
+    fields = [
+        DocField(id=1, name="numero_resolucion", label="Número de resolución"),
+        DocField(id=2, name="valor_sancion", label="Valor de la sanción", aliases='["multa"]'),
+        DocField(id=3, name="fecha_notificacion", label="Fecha de notificación"),
+    ]
+    calls = []
+
+    async def complete(db, provider, messages, model, **kwargs):
+        calls.append(messages[1]["content"])
+        requested = [f.name for f in fields if f'"{f.name}"' in messages[0]["content"]]
+        values = {"numero_resolucion": "456", "valor_sancion": "15000000", "fecha_notificacion": None}
+        return json.dumps({"campos": [
+            {"name": name, "value": values[name], "confidence": 0.9 if values[name] else 0.0}
+            for name in requested
+        ]})
+
+    monkeypatch.setattr(extractor_module.llm_service, "complete", complete)
+    monkeypatch.setattr(extractor_module.settings, "RETRIEVAL_MIN_CHARS", 10000)
+    monkeypatch.setattr(extractor_module.settings, "EXTRACT_CHUNK_THRESHOLD_CHARS", 10 ** 6)
+
+    results = await ExtractorService().extract_fields(
+        None, text, fields, DocType(name="Resolución"), "openai", "gpt-4o"
+    )
+
+    assert [r["field_name"] for r in results] == ["numero_resolucion", "valor_sancion", "fecha_notificacion"]
+    assert [r["raw_value"] for r in results] == ["456", "15000000", "No encontrado"]
+    # First call: only the header and the matching passages
+    assert "[Página 1]" in calls[0] and "[Página 21]" in calls[0]
+    assert len(calls[0]) < len(text) / 3
+    # "fecha_notificacion" matched no passage: retried with the full text
+    assert len(calls) == 2
+    assert calls[1].startswith("Texto del documento:\n--- PÁGINA 1 ---")
+    assert len(calls[1]) > len(calls[0]) * 3
+
+
+@pytest.mark.asyncio
+async def test_retrieval_accepts_not_found_from_well_matched_passages(monkeypatch):
+    filler = "Considerando que la entidad adelantó las actuaciones del caso conforme a la ley. " * 30
+    pages = [(1, "RESOLUCIÓN No. 456 de 2024\nPor la cual se resuelve un recurso")]
+    pages += [(n, filler) for n in range(2, 40)]
+    # The notification section exists but the date was left blank
+    pages.insert(10, (11, "Constancia de notificación personal. Fecha de notificación: ____\n" + filler))
+    fields = [
+        DocField(id=1, name="numero_resolucion", label="Número de resolución"),
+        DocField(id=2, name="fecha_notificacion", label="Fecha de notificación"),
+    ]
+    calls = []
+
+    async def complete(db, provider, messages, model, **kwargs):
+        calls.append(messages[1]["content"])
+        values = {"numero_resolucion": "456", "fecha_notificacion": None}
+        return json.dumps({"campos": [
+            {"name": f.name, "value": values[f.name], "confidence": 0.9 if values[f.name] else 0.0}
+            for f in fields if f'"{f.name}"' in messages[0]["content"]
+        ]})
+
+    monkeypatch.setattr(extractor_module.llm_service, "complete", complete)
+    monkeypatch.setattr(extractor_module.settings, "RETRIEVAL_MIN_CHARS", 10000)
+    monkeypatch.setattr(extractor_module.settings, "EXTRACT_CHUNK_THRESHOLD_CHARS", 10 ** 6)
+
+    results = await ExtractorService().extract_fields(
+        None, join_pages(pages), fields, DocType(name="Resolución"), "openai", "gpt-4o"
+    )
+
+    assert [r["raw_value"] for r in results] == ["456", "No encontrado"]
+    assert len(calls) == 1
+    assert "[Página 11]" in calls[0]
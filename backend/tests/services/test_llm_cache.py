@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.models.extractor import LLMCacheEntry
+from app.services.ai.llm_cache import LLMResponseCache, llm_cache
+from app.services.ai.llm_provider import LLMProvider
+
+
+def test_cache_key_normalizes_messages():
+    cache = LLMResponseCache(ttl_hours=1, max_entries=10)
+    a = cache.make_key("openai", "gpt-4o", [{"role": "user", "content": "Hola  \r\nmundo\n"}], 0.0, True)
+    b = cache.make_key("openai", "gpt-4o", [{"role": "user", "content": "Hola\nmundo"}], 0.0, True)
+    c = cache.make_key("openai", "gpt-4o", [{"role": "user", "content": "Hola\nmundo"}], 0.0, False)
+    assert a == b
+    assert a != c
+
+
+@pytest.mark.asyncio
+async def test_complete_hits_cache_and_honours_opt_out(db: Session, monkeypatch):
+    provider = LLMProvider()
+    calls = []
+
+    async def fake_complete(db, provider_name, messages, model, temperature, json_mode):
+        calls.append(messages)
+        return '{"tipo": "Factura"}'
+
+    monkeypatch.setattr(provider, "_complete", fake_complete)
+    messages = [{"role": "user", "content": "clasifica esto"}]
+
+    first = await provider.complete(db, "openai", messages, "gpt-4o-mini", json_mode=True)
+    second = await provider.complete(db, "openai", messages, "gpt-4o-mini", json_mode=True)
+    assert first == second == '{"tipo": "Factura"}'
+    assert len(calls) == 1
+
+    await provider.complete(db, "openai", messages, "gpt-4o-mini", json_mode=True, use_cache=False)
+    # Non-deterministic calls are never cached
+    await provider.complete(db, "openai", messages, "gpt-4o-mini", temperature=0.9)
+    await provider.complete(db, "openai", messages, "gpt-4o-mini", temperature=0.9)
+    assert len(calls) == 4
+
+
+def test_cache_evicts_expired_and_least_recently_used(db: Session):
+    cache = LLMResponseCache(ttl_hours=1, max_entries=2)
+    now = datetime.utcnow()
+    db.add_all([
+        LLMCacheEntry(key="old", provider="openai", model="m", response="x",
+                      created_at=now - timedelta(hours=2), last_hit_at=now),
+        LLMCacheEntry(key="a", provider="openai", model="m", response="x",
+                      created_at=now, last_hit_at=now - timedelta(minutes=3)),
+        LLMCacheEntry(key="b", provider="openai", model="m", response="x",
+                      created_at=now, last_hit_at=now - timedelta(minutes=2)),
+        LLMCacheEntry(key="c", provider="openai", model="m", response="x",
+                      created_at=now, last_hit_at=now - timedelta(minutes=1)),
+    ])
+    db.commit()
+
+    assert cache.evict(db) == 2
+    assert sorted(k for (k,) in db.query(LLMCacheEntry.key).all()) == ["b", "c"]
+    assert cache.get(db, "old") is None
+
+
+@pytest.mark.asyncio
+async def test_unparseable_response_is_not_cached(db: Session, monkeypatch):
+    provider = LLMProvider()
+    responses = ['{"tipo": "Fact', '{"tipo": "Factura"}']
+    calls = []
+
+    async def fake_complete(db, provider_name, messages, model, temperature, json_mode):
+        calls.append(messages)
+        return responses[len(calls) - 1]
+
+    monkeypatch.setattr(provider, "_complete", fake_complete)
+    messages = [{"role": "user", "content": "clasifica esto otra vez"}]
+
+    # 1. A truncated answer fails the caller's parser and is not stored
+    with pytest.raises(json.JSONDecodeError):
+        await provider.complete(db, "openai", messages, "gpt-4o-mini", json_mode=True, validate=json.loads)
+    # 2. The retry reaches the model again and its valid answer is cached
+    retry = await provider.complete(db, "openai", messages, "gpt-4o-mini", json_mode=True, validate=json.loads)
+    again = await provider.complete(db, "openai", messages, "gpt-4o-mini", json_mode=True, validate=json.loads)
+    assert retry == again == '{"tipo": "Factura"}'
+    assert len(calls) == 2
+
+
+def test_invalid_cached_entry_is_discarded(db: Session):
+    provider = LLMProvider()
+    messages = [{"role": "user", "content": "bloques"}]
+    key = llm_cache.make_key("openai", "gpt-4o-mini", messages, 0.1, True)
+    llm_cache.put(db, key, "openai", "gpt-4o-mini", "{no es json")
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return '{"conditional_blocks": []}'
+
+    content = provider.cached(db, "openai", "gpt-4o-mini", messages, 0.1, True, fetch, validate=json.loads)
+    assert content == '{"conditional_blocks": []}'
+    assert len(calls) == 1
+    assert llm_cache.get(db, key) == content
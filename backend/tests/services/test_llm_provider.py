@@ -0,0 +1,67 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.services.ai.llm_provider import LLMProvider
+
+
+@pytest.mark.asyncio
+async def test_complete_reuses_async_client_per_key(monkeypatch):
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "ok"},
+                "finish_reason": "stop",
+            }],
+        })
+
+    provider = LLMProvider()
+    created = []
+
+    def fake_http_client():
+        created.append(1)
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(provider, "_http_client", fake_http_client)
+    monkeypatch.setattr(provider, "_get_api_key", lambda db, key_name: "sk-test")
+
+    messages = [{"role": "user", "content": "hola"}]
+    results = await asyncio.gather(*[
+        provider.complete(None, "openai", messages, "gpt-4o-mini", use_cache=False) for _ in range(3)
+    ])
+
+    assert results == ["ok", "ok", "ok"]
+    assert len(requests) == 3
+    assert len(created) == 1
+    await provider.aclose()
+
+
+@pytest.mark.asyncio
+async def test_rotated_key_closes_and_evicts_old_client(monkeypatch):
+    provider = LLMProvider()
+    api_key = {"value": "sk-old"}
+    monkeypatch.setattr(provider, "_http_client", lambda: httpx.AsyncClient())
+    monkeypatch.setattr(provider, "_get_api_key", lambda db, key_name: api_key["value"])
+
+    old = provider._get_openai_client(None)
+    assert provider._get_openai_client(None) is old
+
+    api_key["value"] = "sk-new"
+    new = provider._get_openai_client(None)
+    assert new is not old
+    assert list(provider._clients) == [("openai", "sk-new")]
+
+    await asyncio.gather(*provider._closing)
+    assert old.is_closed()
+    assert not new.is_closed()
+    await provider.aclose()
@@ -0,0 +1,117 @@
+import pytest
+
+from app.models.extractor import ExtractorProject, DocType, ExtractedDocument
+from app.services.ai import pipeline as pipeline_module
+from app.services.ai.local_classifier import LocalClassifier
+
+
+@pytest.fixture
+def project(db):
+    project = ExtractorProject(name="P", owner_id=1)
+    db.add(project)
+    db.flush()
+    db.add_all([
+        DocType(project_id=project.id, name="Resolución", aliases='["Resolucion administrativa"]'),
+        DocType(project_id=project.id, name="Derecho de Petición", aliases='["Petición"]'),
+        DocType(project_id=project.id, name="Contrato", description="Contratos de prestación de servicios"),
+        DocType(project_id=project.id, name="Otro"),
+    ])
+    db.commit()
+    return project
+
+
+def types(db, project):
+    return db.query(DocType).filter(DocType.project_id == project.id).all()
+
+
+def type_id(db, name):
+    return db.query(DocType).filter(DocType.name == name).one().id
+
+
+@pytest.mark.asyncio
+async def test_keyword_in_heading_needs_tfidf_agreement(db, project):
+    classifier = LocalClassifier()
+    # The heading names a type but the body reads like a contract
+    contract = "REF. RESOLUCIÓN No. 0456 DE 2024\nContratos de prestación de servicios profesionales"
+    resolution = "REPÚBLICA DE COLOMBIA\nRESOLUCIÓN No. 0456 DE 2024\nResolucion administrativa que decide un recurso"
+
+    found, confidence, source = await classifier.classify(db, project.id, contract, types(db, project))
+    assert (found, source) == (type_id(db, "Resolución"), "local_keyword")
+    # Below the default threshold: the LLM still decides
+    assert confidence == classifier.KEYWORD_CONFIDENCE < 0.9
+
+    result = await classifier.classify(db, project.id, resolution, types(db, project))
+    assert result == (type_id(db, "Resolución"), classifier.KEYWORD_AGREEMENT_CONFIDENCE, "local_keyword")
+
+
+@pytest.mark.asyncio
+async def test_keyword_outside_headings_is_ignored(db, project):
+    classifier = LocalClassifier()
+    text = "Señores, en atención a otro asunto les remitimos la documentación solicitada el mes pasado."
+
+    type_found, confidence, source = await classifier.classify(db, project.id, text, types(db, project))
+
+    assert source != "local_keyword"
+
+
+@pytest.mark.asyncio
+async def test_tfidf_learns_from_approved_documents(db, project):
+    classifier = LocalClassifier()
+    acta = "Acta de liquidación bilateral del convenio interadministrativo, saldo a favor y paz y salvo"
+    unseen = "Se suscribe la presente acta de liquidación bilateral del convenio con saldo a favor"
+
+    _, before, _ = await classifier.classify(db, project.id, unseen, types(db, project))
+
+    db.add_all([
+        ExtractedDocument(
+            project_id=project.id, file_path=f"/a{i}.pdf", file_name=f"a{i}.pdf",
+            doc_type_id=type_id(db, "Contrato"), review_status="approved",
+            classification_source="llm", ocr_text=acta,
+        ) for i in range(3)
+    ])
+    db.commit()
+
+    found, after, source = await classifier.classify(db, project.id, unseen, types(db, project))
+
+    assert found == type_id(db, "Contrato")
+    assert source == "local_tfidf"
+    assert after > before
+    assert after > 0.5
+
+
+@pytest.mark.asyncio
+async def test_weak_single_type_similarity_falls_through_to_llm(db, monkeypatch):
+    project = ExtractorProject(name="P", owner_id=1)
+    db.add(project)
+    db.flush()
+    db.add_all([
+        DocType(project_id=project.id, name="Resolución", description="Acto administrativo, indica el asunto"),
+        DocType(project_id=project.id, name="Derecho de petición"),
+        DocType(project_id=project.id, name="Otro"),
+    ])
+    db.commit()
+    other = type_id(db, "Otro")
+    llm_calls = []
+
+    async def classify(db, text, doc_types, provider, model, **kwargs):
+        llm_calls.append(text)
+        return other, 0.8
+
+    monkeypatch.setattr(pipeline_module.classifier_service, "classify_batched", classify)
+    monkeypatch.setattr(pipeline_module, "local_classifier", LocalClassifier())
+    # Each one shares only "asunto" with the description of Resolución
+    unrelated = [
+        "Contrato de arrendamiento de vivienda urbana. Asunto: canon mensual, depósito y duración del contrato.",
+        "Factura electrónica de venta No. 881. Asunto: suministro de papelería, subtotal, IVA y total a pagar.",
+    ]
+    for i, text in enumerate(unrelated):
+        _, confidence, source = await LocalClassifier().classify(db, project.id, text, types(db, project))
+        assert source is None or confidence < 0.5
+
+        doc = ExtractedDocument(project_id=project.id, file_path=f"/u{i}.pdf", file_name=f"u{i}.pdf", ocr_text=text)
+        db.add(doc)
+        db.commit()
+        await pipeline_module.ExtractionPipeline()._stage_classify(db, doc, project)
+        assert (doc.doc_type_id, doc.classification_source) == (other, "llm")
+
+    assert llm_calls == unrelated
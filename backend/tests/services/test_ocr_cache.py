@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy.orm import Session
+
+from app.models.extractor import OCRCacheEntry
+from app.services.ai.ocr_service import OCRService
+
+
+@pytest.mark.asyncio
+async def test_get_text_reuses_result_for_same_content(db: Session, monkeypatch):
+    service = OCRService()
+    calls = []
+
+    async def fake_extract(db, file_path):
+        calls.append(file_path)
+        return {"text": "Resolución 123 " * 20, "page_count": 1, "provider": "pymupdf"}
+
+    monkeypatch.setattr(service, "extract_text", fake_extract)
+
+    first = await service.get_text(db, "/proyecto_a/scan.pdf", file_hash="abc")
+    second = await service.get_text(db, "/proyecto_b/copia.pdf", file_hash="abc")
+
+    assert first == second
+    assert calls == ["/proyecto_a/scan.pdf"]
+    assert db.query(OCRCacheEntry).filter(OCRCacheEntry.file_hash == "abc").one().hits == 1
+
+
+@pytest.mark.asyncio
+async def test_get_text_does_not_cache_degraded_results(db: Session, monkeypatch):
+    service = OCRService()
+    calls = []
+
+    async def fake_extract(db, file_path):
+        calls.append(file_path)
+        # Scanned PDF with Azure unavailable: almost no text
+        return {"text": "p. 1", "page_count": 3, "provider": "pymupdf", "scanned_pages": [1, 2, 3]}
+
+    monkeypatch.setattr(service, "extract_text", fake_extract)
+
+    await service.get_text(db, "/scan.pdf", file_hash="def")
+    await service.get_text(db, "/scan.pdf", file_hash="def")
+
+    assert len(calls) == 2
+    assert db.query(OCRCacheEntry).count() == 0
+
+
+@pytest.mark.asyncio
+async def test_get_text_caches_documents_with_blank_pages(db: Session, monkeypatch):
+    service = OCRService()
+    calls = []
+
+    async def fake_extract(db, file_path):
+        calls.append(file_path)
+        # Cover and signature pages without images: little text, nothing to OCR
+        return {"text": "Contrato de obra", "page_count": 3, "provider": "pymupdf", "scanned_pages": []}
+
+    monkeypatch.setattr(service, "extract_text", fake_extract)
+    monkeypatch.setattr("app.services.ai.ocr_service.settings.OCR_ROUTING_MODE", "page")
+
+    await service.get_text(db, "/contrato.pdf", file_hash="ghi")
+    await service.get_text(db, "/contrato.pdf", file_hash="ghi")
+
+    assert len(calls) == 1
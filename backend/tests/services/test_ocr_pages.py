@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import fitz
+import pytest
+
+from app.services.ai import ocr_service as ocr_module
+from app.services.ai.ocr_service import (
+    OCRService, azure_page_texts, join_pages, mark_pages, split_page_ranges, split_pages
+)
+
+
+def make_pdf(path, scanned_pages, blank_pages=()):
+    doc = fitz.open()
+    scan = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 20, 20), False)
+    scan.clear_with(200)
+    for i in range(7):
+        page = doc.new_page()
+        if i in scanned_pages:
+            page.insert_image(page.rect, pixmap=scan)
+        elif i not in blank_pages:
+            page.insert_text((72, 72), f"Página digital {i + 1}. " + "Considerando que el contrato " * 3)
+    doc.save(str(path))
+    doc.close()
+
+
+def test_split_page_ranges_covers_all_pages():
+    assert split_page_ranges(0, 4, 16) == []
+    assert split_page_ranges(10, 4, 16) == [(0, 10)]
+    assert split_page_ranges(7, 4, 2) == [(0, 2), (2, 4), (4, 6), (6, 7)]
+    assert split_page_ranges(100, 3, 16) == [(0, 34), (34, 68), (68, 100)]
+
+
+def test_page_markers_are_only_added_for_prompts():
+    text = join_pages([(1, "Portada"), (2, ""), (3, "Anexo")])
+
+    assert text == "Portada\f\fAnexo"
+    assert split_pages(text) == [(1, "Portada"), (2, ""), (3, "Anexo")]
+    assert mark_pages(text) == "--- PÁGINA 1 ---\nPortada\n--- PÁGINA 3 ---\nAnexo"
+    # Text stored with the old inline markers still splits by page
+    assert split_pages("--- PÁGINA 1 ---\nUno\n--- PÁGINA 2 ---\nDos") == [(1, "Uno"), (2, "Dos")]
+
+
+def test_azure_page_text_comes_from_content_spans():
+    span = lambda offset, length: SimpleNamespace(offset=offset, length=length)
+    result = SimpleNamespace(content="Primera página\nSegunda página", pages=[
+        SimpleNamespace(spans=[span(0, 14)], lines=[]),
+        SimpleNamespace(spans=[span(15, 14)], lines=[]),
+    ])
+
+    assert azure_page_texts(result) == ["Primera página", "Segunda página"]
+
+
+@pytest.mark.asyncio
+async def test_extract_pdf_pages_in_order_with_scanned_flags(tmp_path, monkeypatch):
+    pdf = tmp_path / "expediente.pdf"
+    make_pdf(pdf, scanned_pages={2, 5}, blank_pages={6})
+    monkeypatch.setattr(ocr_module.settings, "OCR_WORKERS", 3)
+    monkeypatch.setattr(ocr_module.settings, "OCR_MIN_PAGES_PER_SHARD", 2)
+
+    service = OCRService()
+    try:
+        pages = await service.extract_pdf_pages(str(pdf))
+        sync_pages = service.extract_pdf_pages_sync(str(pdf))
+    finally:
+        service.shutdown()
+
+    assert [p["page"] for p in pages] == list(range(1, 8))
+    assert [p["page"] for p in pages if p["scanned"]] == [3, 6]
+    assert "Página digital 1." in pages[0]["text"]
+    # A page without text or images is blank, not scanned
+    assert pages[6]["text"].strip() == ""
+    assert sync_pages == pages
+
+
+@pytest.mark.asyncio
+async def test_extract_text_sends_only_scanned_pages_to_azure(tmp_path, monkeypatch):
+    pdf = tmp_path / "contrato_con_anexos.pdf"
+    make_pdf(pdf, scanned_pages={2, 5}, blank_pages={6})
+    monkeypatch.setattr(ocr_module.settings, "OCR_ROUTING_MODE", "page")
+
+    service = OCRService()
+    sent = []
+
+    async def fake_analyze(db, document):
+        sent.append(document)
+        with fitz.open(stream=document, filetype="pdf") as sub:
+            count = len(sub)
+        return SimpleNamespace(pages=[
+            SimpleNamespace(lines=[SimpleNamespace(content=f"Anexo escaneado {i + 1}")])
+            for i in range(count)
+        ])
+
+    monkeypatch.setattr(service, "_analyze_with_azure", fake_analyze)
+    try:
+        result = await service.extract_text(None, str(pdf))
+    finally:
+        service.shutdown()
+
+    assert len(sent) == 1 and isinstance(sent[0], bytes)
+    assert result["provider"] == "pymupdf+azure_di"
+    assert result["scanned_pages"] == [3, 6]
+    assert result["page_count"] == 7
+    text = result["text"]
+    assert text.index("Página digital 2") < text.index("Anexo escaneado 1") < text.index("Página digital 4")
+    assert text.index("Página digital 5") < text.index("Anexo escaneado 2")
+    # Stored text has no page markers; blank pages keep their place
+    assert "PÁGINA" not in text
+    pages = text.split("\f")
+    assert len(pages) == 7 and pages[6] == ""
+
+
+@pytest.mark.asyncio
+async def test_azure_requests_overlap_under_concurrency_cap(tmp_path, monkeypatch):
+    images = []
+    for i in range(5):
+        path = tmp_path / f"scan{i}.png"
+        path.write_bytes(b"png")
+        images.append(str(path))
+    monkeypatch.setattr(ocr_module.settings, "AZURE_OCR_CONCURRENCY", 2)
+
+    service = OCRService()
+    state = {"active": 0, "max_active": 0}
+
+    class FakePoller:
+        async def result(self):
+            await asyncio.sleep(0.05)
+            state["active"] -= 1
+            return SimpleNamespace(content="texto escaneado", pages=[SimpleNamespace(lines=[])])
+
+    class FakeClient:
+        async def begin_analyze_document(self, model_id, document, polling_interval):
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+            return FakePoller()
+
+    def fake_client(endpoint, key):
+        return FakeClient()
+
+    monkeypatch.setattr(service, "_get_setting", lambda db, key_name: "configurado")
+    monkeypatch.setattr(service, "_get_azure_client", fake_client)
+
+    results = await asyncio.gather(*[service.extract_text(None, path) for path in images])
+
+    assert all(r == {"text": "texto escaneado", "page_count": 1, "provider": "azure_di"} for r in results)
+    assert state["max_active"] == 2
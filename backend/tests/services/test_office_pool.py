@@ -0,0 +1,137 @@
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+from app.core.config import Settings
+from app.services import office_pool as office_pool_module
+from app.services.office_pool import (
+    OfficeConversionTimeout, OfficePoolBusy, OfficePoolError, OfficeWorkerPool
+)
+
+
+class FakeProcess:
+    def __init__(self, cmd, **kwargs):
+        self.cmd = cmd
+        self.pid = 1000
+        self.returncode = None
+        self.terminated = False
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.terminated = True
+        self.returncode = 0
+
+    def kill(self):
+        self.returncode = -9
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+
+@pytest.fixture
+def fake_office(tmp_path, monkeypatch):
+    """LibreOffice replaced by a fake resident process and a fake --convert-to."""
+    state = {"processes": [], "conversions": 0, "mode": "ok", "gate": None, "started": threading.Event()}
+
+    def popen(cmd, **kwargs):
+        process = FakeProcess(cmd)
+        state["processes"].append(process)
+        return process
+
+    def run(cmd, capture_output=True, text=True, timeout=None):
+        docx_path = cmd[-1]
+        output_dir = cmd[cmd.index("--outdir") + 1]
+        if "warmup" not in docx_path:
+            state["conversions"] += 1
+            state["started"].set()
+            if state["gate"] is not None:
+                state["gate"].wait(5)
+            if state["mode"] == "fail":
+                return subprocess.CompletedProcess(cmd, 1, "", "boom")
+            if state["mode"] == "timeout":
+                raise subprocess.TimeoutExpired(cmd, timeout)
+        Path(output_dir, Path(docx_path).stem + ".pdf").write_bytes(b"%PDF-")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+    monkeypatch.setattr(Settings, "TEMP_DIR", property(lambda self: str(temp_dir)))
+    monkeypatch.setattr(office_pool_module, "find_office_binary", lambda: "/usr/bin/soffice")
+    monkeypatch.setattr(office_pool_module.subprocess, "Popen", popen)
+    monkeypatch.setattr(office_pool_module.subprocess, "run", run)
+    return state
+
+
+def make_docx(tmp_path, name="doc.docx"):
+    path = tmp_path / name
+    path.write_bytes(b"docx")
+    return str(path)
+
+
+def test_busy_pool_rejects_without_blocking(tmp_path, fake_office):
+    pool = OfficeWorkerPool(size=1, max_jobs=100, job_timeout=5, queue_size=0)
+    pool.start()
+    fake_office["gate"] = threading.Event()
+    docx = make_docx(tmp_path)
+
+    first = threading.Thread(target=pool.convert, args=(docx, str(tmp_path / "a.pdf")))
+    first.start()
+    assert fake_office["started"].wait(5)
+
+    with pytest.raises(OfficePoolBusy):
+        pool.convert(docx, str(tmp_path / "b.pdf"))
+
+    fake_office["gate"].set()
+    first.join()
+    fake_office["gate"] = None
+    # The slot is free again once the running job is done
+    assert pool.convert(docx, str(tmp_path / "b.pdf")) == str(tmp_path / "b.pdf")
+    assert os.path.exists(tmp_path / "a.pdf")
+    pool.shutdown()
+
+
+def test_worker_is_recycled_after_max_jobs(tmp_path, fake_office):
+    pool = OfficeWorkerPool(size=1, max_jobs=3, job_timeout=5, queue_size=0)
+    pool.start()
+    docx = make_docx(tmp_path)
+    first_process = fake_office["processes"][0]
+
+    # The warm-up counts as the first job
+    pool.convert(docx, str(tmp_path / "1.pdf"))
+    assert len(fake_office["processes"]) == 1
+    pool.convert(docx, str(tmp_path / "2.pdf"))
+
+    assert first_process.terminated
+    assert len(fake_office["processes"]) == 2
+    assert pool._workers[0].jobs_done == 0
+    pool.shutdown()
+
+
+def test_failed_and_hung_conversions_release_the_worker(tmp_path, fake_office):
+    pool = OfficeWorkerPool(size=1, max_jobs=100, job_timeout=5, queue_size=0)
+    pool.start()
+    docx = make_docx(tmp_path)
+
+    fake_office["mode"] = "fail"
+    with pytest.raises(OfficePoolError):
+        pool.convert(docx, str(tmp_path / "x.pdf"))
+    assert len(fake_office["processes"]) == 1
+
+    # A timeout restarts the resident instance
+    fake_office["mode"] = "timeout"
+    with pytest.raises(OfficeConversionTimeout):
+        pool.convert(docx, str(tmp_path / "x.pdf"))
+    assert fake_office["processes"][0].terminated
+    assert len(fake_office["processes"]) == 2
+
+    fake_office["mode"] = "ok"
+    assert pool.convert(docx, str(tmp_path / "x.pdf")) == str(tmp_path / "x.pdf")
+    assert pool._idle.qsize() == 1
+    # Per-job output dirs are removed whatever the outcome
+    assert not [d for d in os.listdir(tmp_path / "temp") if d.startswith("pdf_job_")]
+    pool.shutdown()
@@ -0,0 +1,181 @@
+import asyncio
+import socket
+
+import pytest
+
+from app.models.extractor import (
+    ExtractorProject, DocType, DocField, ExtractedDocument, ProcessingJob
+)
+from app.services.ai import pipeline as pipeline_module
+from app.services.ai.pipeline import ExtractionPipeline
+
+
+@pytest.fixture
+def fake_stages(monkeypatch):
+    calls = {"ocr": 0, "active_ocr": 0, "max_active_ocr": 0}
+
+    async def get_text(db, file_path, file_hash=None):
+        calls["ocr"] += 1
+        calls["active_ocr"] += 1
+        calls["max_active_ocr"] = max(calls["max_active_ocr"], calls["active_ocr"])
+        await asyncio.sleep(0.02)
+        calls["active_ocr"] -= 1
+        return {"text": f"texto de {file_path}", "page_count": 1, "provider": "pymupdf"}
+
+    async def classify(db, text, doc_types, provider, model, **kwargs):
+        return doc_types[0].id, 0.95
+
+    async def extract_fields(db, text, fields, doc_type, provider, model, **kwargs):
+        return [{
+            "field_id": f.id, "field_name": f.name, "field_label": f.label,
+            "raw_value": "123", "confidence": 0.9, "source_text": "123",
+        } for f in fields]
+
+    async def apply_rules(db, document_id):
+        return 0
+
+    monkeypatch.setattr(pipeline_module.ocr_service, "get_text", get_text)
+    monkeypatch.setattr(pipeline_module.classifier_service, "classify_batched", classify)
+    monkeypatch.setattr(pipeline_module.extractor_service, "extract_fields", extract_fields)
+    monkeypatch.setattr(pipeline_module.rules_engine, "apply_rules", apply_rules)
+    monkeypatch.setattr(pipeline_module.settings, "PIPELINE_OCR_CONCURRENCY", 2)
+    return calls
+
+
+def seed(db, n_docs):
+    project = ExtractorProject(name="P", owner_id=1, confidence_threshold=0.7)
+    db.add(project)
+    db.flush()
+    doc_type = DocType(project_id=project.id, name="Factura")
+    db.add(doc_type)
+    db.flush()
+    db.add(DocField(doc_type_id=doc_type.id, name="numero", label="Número"))
+    docs = [
+        ExtractedDocument(project_id=project.id, file_path=f"/tmp/doc{i}.pdf", file_name=f"doc{i}.pdf")
+        for i in range(n_docs)
+    ]
+    db.add_all(docs)
+    db.commit()
+    return project.id, [d.id for d in docs]
+
+
+async def wait_until_done(session_factory, timeout=10):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        db = session_factory()
+        pending = db.query(ProcessingJob).filter(ProcessingJob.status.in_(["queued", "running"])).count()
+        db.close()
+        if not pending:
+            return
+        await asyncio.sleep(0.05)
+    raise AssertionError("pipeline did not finish in time")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_processes_queue_with_stage_limits(session_factory, fake_stages):
+    db = session_factory()
+    project_id, doc_ids = seed(db, 6)
+
+    pipeline = ExtractionPipeline()
+    pipeline.start(session_factory)
+    try:
+        assert pipeline.enqueue(db, doc_ids, project_id) == 6
+        await wait_until_done(session_factory)
+    finally:
+        await pipeline.stop()
+
+    db.expire_all()
+    docs = db.query(ExtractedDocument).all()
+    assert all(d.status == "completed" for d in docs)
+    assert all(d.review_status == "approved" for d in docs)
+    assert all(len(d.field_values) == 1 for d in docs)
+    assert fake_stages["ocr"] == 6
+    assert fake_stages["max_active_ocr"] <= 2
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_resumes_jobs_of_dead_worker(session_factory, fake_stages):
+    db = session_factory()
+    project_id, doc_ids = seed(db, 1)
+    # A job left "running" by a process that no longer exists, already past OCR
+    db.add(ProcessingJob(
+        document_id=doc_ids[0], project_id=project_id, stage="classify",
+        status="running", attempts=1, locked_by=f"{socket.gethostname()}:999999999",
+    ))
+    db.commit()
+
+    pipeline = ExtractionPipeline()
+    pipeline.start(session_factory)
+    try:
+        await wait_until_done(session_factory)
+    finally:
+        await pipeline.stop()
+
+    db.expire_all()
+    job = db.query(ProcessingJob).one()
+    assert job.status == "completed"
+    assert job.attempts == 2
+    assert fake_stages["ocr"] == 0
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_pipeline_requeues_own_jobs_after_restart(session_factory, fake_stages):
+    db = session_factory()
+    project_id, doc_ids = seed(db, 1)
+    pipeline = ExtractionPipeline()
+    # Same host and PID as a previous run (a restarted container is always PID 1)
+    db.add(ProcessingJob(
+        document_id=doc_ids[0], project_id=project_id, stage="ocr",
+        status="running", attempts=1, locked_by=pipeline.worker_id,
+    ))
+    db.commit()
+
+    pipeline.start(session_factory)
+    try:
+        await wait_until_done(session_factory, timeout=5)
+    finally:
+        await pipeline.stop()
+
+    db.expire_all()
+    assert db.query(ProcessingJob).one().status == "completed"
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_reenqueue_supersedes_running_job(session_factory, fake_stages, monkeypatch):
+    db = session_factory()
+    project_id, doc_ids = seed(db, 1)
+    gate = asyncio.Event()
+    started = asyncio.Event()
+    active = {"now": 0, "max": 0}
+
+    async def get_text(db, file_path, file_hash=None):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        started.set()
+        await gate.wait()
+        active["now"] -= 1
+        return {"text": "texto", "page_count": 1, "provider": "pymupdf"}
+
+    monkeypatch.setattr(pipeline_module.ocr_service, "get_text", get_text)
+
+    pipeline = ExtractionPipeline()
+    pipeline.start(session_factory)
+    try:
+        pipeline.enqueue(db, doc_ids, project_id)
+        await asyncio.wait_for(started.wait(), 5)
+        # Reprocessing while the first job is still in OCR
+        pipeline.enqueue(db, doc_ids, project_id)
+        await asyncio.sleep(0.1)
+        gate.set()
+        await wait_until_done(session_factory)
+    finally:
+        await pipeline.stop()
+
+    db.expire_all()
+    statuses = [job.status for job in db.query(ProcessingJob).order_by(ProcessingJob.id)]
+    assert statuses == ["superseded", "completed"]
+    assert active["max"] == 1
+    db.close()
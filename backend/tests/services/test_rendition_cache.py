@@ -0,0 +1,99 @@
+import os
+
+from app.services.rendition_cache import RenditionCache
+
+
+def fake_convert_factory(calls):
+    def convert(docx_path, pdf_path):
+        calls.append(docx_path)
+        with open(docx_path, "rb") as src, open(pdf_path, "wb") as dst:
+            dst.write(b"%PDF-" + src.read())
+    return convert
+
+
+def test_rendition_cache_hits_and_invalidation(tmp_path):
+    cache = RenditionCache(max_bytes=10 * 1024 * 1024, cache_dir=str(tmp_path / "renditions"))
+    docx_path = tmp_path / "doc.docx"
+    docx_path.write_bytes(b"version 1")
+    calls = []
+    convert = fake_convert_factory(calls)
+
+    # 1. First request converts, second one is served from the cache
+    first = cache.get_pdf(str(docx_path), convert, "lo-7.0")
+    second = cache.get_pdf(str(docx_path), convert, "lo-7.0")
+    assert first == second
+    assert len(calls) == 1
+
+    # 2. Rewriting the DOCX produces a new rendition and drops the stale one
+    docx_path.write_bytes(b"version 2")
+    third = cache.get_pdf(str(docx_path), convert, "lo-7.0")
+    assert third != first
+    assert len(calls) == 2
+    assert not os.path.exists(first)
+    with open(third, "rb") as f:
+        assert f.read() == b"%PDF-version 2"
+
+    # 3. A converter upgrade also invalidates the rendition
+    cache.get_pdf(str(docx_path), convert, "lo-7.1")
+    assert len(calls) == 3
+
+
+def test_rendition_cache_lru_eviction(tmp_path):
+    cache = RenditionCache(max_bytes=50, cache_dir=str(tmp_path / "renditions"))
+    calls = []
+    convert = fake_convert_factory(calls)
+
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"doc{i}.docx"
+        p.write_bytes(f"document number {i}".encode())
+        paths.append(str(p))
+
+    pdf0 = cache.get_pdf(paths[0], convert, "lo")
+    pdf1 = cache.get_pdf(paths[1], convert, "lo")
+    # Touch doc0 so doc1 becomes the least recently used entry
+    cache.get_pdf(paths[0], convert, "lo")
+    cache.get_pdf(paths[2], convert, "lo")
+
+    assert os.path.exists(pdf0)
+    assert not os.path.exists(pdf1)
+
+
+def test_rendition_cache_shared_keys_and_failures(tmp_path):
+    cache = RenditionCache(max_bytes=10 * 1024 * 1024, cache_dir=str(tmp_path / "renditions"))
+    calls = []
+    convert = fake_convert_factory(calls)
+    a = tmp_path / "a.docx"
+    b = tmp_path / "b.docx"
+    a.write_bytes(b"same bytes")
+    b.write_bytes(b"same bytes")
+
+    # 1. Two sources with identical bytes share one rendition
+    shared = cache.get_pdf(str(a), convert, "lo")
+    assert cache.get_pdf(str(b), convert, "lo") == shared
+    assert len(calls) == 1
+
+    # 2. Rewriting one of them keeps the rendition the other still uses
+    a.write_bytes(b"new bytes")
+    cache.get_pdf(str(a), convert, "lo")
+    assert os.path.exists(shared)
+    b.write_bytes(b"other bytes")
+    cache.get_pdf(str(b), convert, "lo")
+    assert not os.path.exists(shared)
+
+    # 3. Hits do not rewrite the index
+    index_path = os.path.join(cache.cache_dir, cache.INDEX_FILE)
+    mtime = os.stat(index_path).st_mtime_ns
+    os.utime(index_path, ns=(mtime - 10**9, mtime - 10**9))
+    cache.get_pdf(str(b), convert, "lo")
+    assert os.stat(index_path).st_mtime_ns == mtime - 10**9
+
+    # 4. A failed conversion does not leave its key lock behind
+    def broken(docx_path, pdf_path):
+        raise RuntimeError("converter crashed")
+
+    try:
+        cache.get_pdf(str(a), broken, "lo-broken")
+    except RuntimeError:
+        pass
+    assert cache._key_locks == {}
@@ -0,0 +1,143 @@
+import json
+
+import pytest
+
+from app.models.extractor import (
+    ExtractorProject, ExtractedDocument, DocumentFieldValue, ExtractionRule, ExtractionAlert
+)
+from app.services.ai.rules_engine import RulesEngine
+
+CONDITIONS = [
+    [{"field": "valor", "operator": ">", "value": "1000"}],
+    [{"field": "valor", "operator": "<", "value": "abc"}],
+    [{"field": "ciudad", "operator": "==", "value": "Bogotá"}],
+    [{"field": "ciudad", "operator": "!=", "value": "bogotá"}, {"field": "status", "operator": "==", "value": "completed"}],
+    [{"field": "asunto", "operator": "contains", "value": "TUTELA"}],
+    [{"field": "page_count", "operator": ">", "value": "3"}],
+    [{"field": "doc_type_id", "operator": "==", "value": "None"}],
+    [{"field": "status", "operator": "~", "value": "x"}],
+]
+
+
+def seed(db):
+    project = ExtractorProject(name="P", owner_id=1)
+    db.add(project)
+    db.flush()
+    rows = [
+        ("completed", 5, {"valor": "2500", "ciudad": "Bogotá", "asunto": "Acción de tutela"}),
+        ("completed", 2, {"valor": "No encontrado", "ciudad": "Cali"}),
+        ("error", None, {"valor": " 999 ", "asunto": "Derecho de petición"}),
+        ("completed", 10, {}),
+    ]
+    for status, pages, values in rows:
+        doc = ExtractedDocument(project_id=project.id, file_path="/x.pdf", file_name="x.pdf", status=status, page_count=pages)
+        db.add(doc)
+        db.flush()
+        for name, value in values.items():
+            db.add(DocumentFieldValue(document_id=doc.id, field_name=name, field_label=name, raw_value=value))
+    for i, conditions in enumerate(CONDITIONS):
+        db.add(ExtractionRule(project_id=project.id, name=f"R{i}", condition_json=json.dumps(conditions)))
+    db.commit()
+    return project
+
+
+def expected_alerts(db, engine):
+    """Per-document evaluation with evaluate_condition, as before compilation."""
+    expected = set()
+    for doc in db.query(ExtractedDocument).all():
+        field_map = {f.field_name: (f.normalized_value or f.raw_value or "") for f in doc.field_values}
+        doc_map = {
+            "status": doc.status,
+            "doc_type_id": str(doc.doc_type_id),
+            "classification_confidence": doc.classification_confidence,
+            "page_count": doc.page_count,
+        }
+        for rule in db.query(ExtractionRule).all():
+            conditions = json.loads(rule.condition_json)
+            if all(engine.evaluate_condition(c, field_map, doc_map) for c in conditions):
+                expected.add((doc.id, rule.id))
+    return expected
+
+
+def test_batch_rules_match_per_document_evaluation(db):
+    project = seed(db)
+    engine = RulesEngine()
+
+    created = engine.apply_rules_batch(db, project.id)
+
+    alerts = {(a.document_id, a.rule_id) for a in db.query(ExtractionAlert).all()}
+    assert alerts == expected_alerts(db, engine)
+    assert created == len(alerts) > 0
+    # Re-running does not duplicate alerts
+    assert engine.apply_rules_batch(db, project.id) == 0
+    assert db.query(ExtractionAlert).count() == created
+
+
+@pytest.mark.asyncio
+async def test_apply_rules_single_document_and_recompiles_on_change(db):
+    project = seed(db)
+    engine = RulesEngine()
+    first = db.query(ExtractedDocument).order_by(ExtractedDocument.id).first()
+
+    await engine.apply_rules(db, first.id)
+    compiled = engine.compile_rules(project.id, engine._active_rules(db, project.id))
+    assert engine.compile_rules(project.id, engine._active_rules(db, project.id)) is compiled
+
+    rule = db.query(ExtractionRule).filter(ExtractionRule.name == "R0").one()
+    rule.condition_json = json.dumps([{"field": "valor", "operator": ">", "value": "5000"}])
+    db.commit()
+    assert engine.compile_rules(project.id, engine._active_rules(db, project.id)) is not compiled
+
+    assert {a.document_id for a in db.query(ExtractionAlert).all()} == {first.id}
+
+
+@pytest.mark.asyncio
+async def test_llm_rules_share_one_prompt_and_cache_verdicts(db, monkeypatch):
+    from app.services.ai import rules_engine as rules_module
+
+    project = ExtractorProject(name="P", owner_id=1, connector_llm="anthropic", llm_extract_model="claude-x")
+    db.add(project)
+    db.flush()
+    rules = [
+        ExtractionRule(project_id=project.id, name=f"L{i}", logic_type="llm", prompt=f"¿Pregunta {i}?")
+        for i in range(3)
+    ]
+    docs = [
+        ExtractedDocument(project_id=project.id, file_path=f"/{i}.pdf", file_name=f"{i}.pdf",
+                          file_hash="mismo-contenido", ocr_text="Texto del expediente")
+        for i in range(2)
+    ]
+    db.add_all(rules + docs)
+    db.commit()
+    calls = []
+
+    async def complete(db, provider, messages, model, **kwargs):
+        calls.append((provider, model, messages[1]["content"]))
+        if "REGLAS:" in messages[1]["content"]:
+            # The merged answer omits the third rule
+            return json.dumps({"respuestas": [
+                {"id": rules[0].id, "respuesta": "SI"},
+                {"id": rules[1].id, "respuesta": "NO"},
+            ]})
+        return "SI"
+
+    monkeypatch.setattr(rules_module.llm_service, "complete", complete)
+    engine = RulesEngine()
+
+    assert await engine.apply_rules(db, docs[0].id) == 2
+    assert len(calls) == 2
+    assert all(provider == "anthropic" and model == "claude-x" for provider, model, _ in calls)
+    assert "¿Pregunta 2?" in calls[1][2] and "REGLAS:" not in calls[1][2]
+
+    # Same content in another document: verdicts come from the cache
+    assert await engine.apply_rules(db, docs[1].id) == 2
+    assert len(calls) == 2
+    alerts = db.query(ExtractionAlert).filter(ExtractionAlert.document_id == docs[1].id).all()
+    assert {a.rule_id for a in alerts} == {rules[0].id, rules[2].id}
+
+    # Same file, different text (reprocessed with another OCR): asked again
+    docs[0].ocr_text = "Texto del expediente corregido"
+    db.query(ExtractionAlert).delete()
+    db.commit()
+    await engine.apply_rules(db, docs[0].id)
+    assert len(calls) == 4
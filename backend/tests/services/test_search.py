@@ -0,0 +1,126 @@
+from app.db import fts
+from app.models.extractor import DocumentFieldValue, ExtractedDocument, ExtractorProject
+from app.services.ai.search import DocumentSearch
+
+
+def without_index(monkeypatch):
+    # As on a database without the FTS5 tables
+    monkeypatch.setattr(fts, "has_table", lambda db, name: False)
+
+
+def seed(db):
+    project = ExtractorProject(name="P", owner_id=1)
+    other = ExtractorProject(name="Q", owner_id=1)
+    db.add_all([project, other])
+    db.flush()
+    texts = [
+        "CONTRATO DE ARRENDAMIENTO de local comercial en Bogotá. El arrendatario pagará el arrendamiento cada mes.",
+        "Resolución sobre la licencia de construcción. Menciona un arrendamiento anterior.",
+        "Factura de servicios públicos.",
+    ]
+    docs = [
+        ExtractedDocument(project_id=project.id, file_path=f"/tmp/{i}.pdf", file_name=f"{i}.pdf",
+                          status="completed", ocr_text=t)
+        for i, t in enumerate(texts)
+    ]
+    docs.append(ExtractedDocument(project_id=other.id, file_path="/tmp/x.pdf", file_name="x.pdf",
+                                  status="completed", ocr_text="Contrato de arrendamiento de otro proyecto"))
+    db.add_all(docs)
+    db.flush()
+    db.add(DocumentFieldValue(document_id=docs[2].id, field_name="nit", field_label="NIT",
+                              raw_value="900123456-7", normalized_value="900123456-7"))
+    db.add(DocumentFieldValue(document_id=docs[0].id, field_name="ciudad", field_label="Ciudad",
+                              raw_value="Bogotá", normalized_value="Bogota"))
+    db.commit()
+    return project.id, [d.id for d in docs]
+
+
+def test_search_ranks_text_and_field_matches_with_snippets(db):
+    project_id, ids = seed(db)
+    search = DocumentSearch()
+
+    hits = search.search(db, project_id, "arrendamiento")
+    assert [h["document_id"] for h in hits] == [ids[0], ids[1]]
+    assert "«ARRENDAMIENTO»" in hits[0]["snippet"]
+
+    # Sin tildes encuentra "Bogotá", y el valor del campo suma al puntaje
+    hits = search.search(db, project_id, "bogota")
+    assert hits[0]["document_id"] == ids[0]
+    assert hits[0]["fields"][0]["field_name"] == "ciudad"
+
+    hits = search.search(db, project_id, "900123456")
+    assert [h["document_id"] for h in hits] == [ids[2]]
+    assert hits[0]["snippet"] is None and hits[0]["fields"][0]["field_label"] == "NIT"
+
+    assert search.search(db, project_id, "arrendamiento licencia")[0]["document_id"] == ids[1]
+    assert search.search(db, project_id, 'AND "OR (') == []
+
+
+def test_index_follows_reprocessing_and_manual_edits(db):
+    project_id, ids = seed(db)
+    search = DocumentSearch()
+
+    doc = db.get(ExtractedDocument, ids[2])
+    doc.ocr_text = "Otro texto"
+    db.query(DocumentFieldValue).filter(DocumentFieldValue.document_id == ids[2]).delete()
+    db.add(DocumentFieldValue(document_id=ids[2], field_name="nit", field_label="NIT", raw_value="800999"))
+    db.commit()
+
+    assert search.search(db, project_id, "facturas servicios") == []
+    assert search.search(db, project_id, "900123456") == []
+    assert [h["document_id"] for h in search.search(db, project_id, "800999")] == [ids[2]]
+
+    db.delete(db.get(ExtractedDocument, ids[0]))
+    db.commit()
+    assert [h["document_id"] for h in search.search(db, project_id, "arrendamiento")] == [ids[1]]
+
+
+def test_search_without_index_falls_back_to_ilike(db, monkeypatch):
+    project_id, ids = seed(db)
+    without_index(monkeypatch)
+
+    hits = DocumentSearch().search(db, project_id, "arrendamiento 900123456")
+    assert hits == []
+    hits = DocumentSearch().search(db, project_id, "arrendamiento")
+    assert sorted(h["document_id"] for h in hits) == [ids[0], ids[1]]
+    assert "ARRENDAMIENTO" in hits[-1]["snippet"]
+
+
+def seed_many(db):
+    project = ExtractorProject(name="P", owner_id=1)
+    db.add(project)
+    db.flush()
+    docs = [
+        ExtractedDocument(project_id=project.id, file_path=f"/tmp/{i}.pdf", file_name=f"{i}.pdf",
+                          ocr_text="contrato " * (i % 4 + 1) + "de obra" if i % 3 else "acta de entrega")
+        for i in range(12)
+    ]
+    docs[3].ocr_text = "acta de entrega del contrato"
+    db.add_all(docs)
+    db.flush()
+    # Matches only through a field, and through both text and a field
+    db.add(DocumentFieldValue(document_id=docs[0].id, field_name="objeto", field_label="Objeto", raw_value="contrato de obra"))
+    db.add(DocumentFieldValue(document_id=docs[1].id, field_name="objeto", field_label="Objeto", raw_value="contrato"))
+    db.add(DocumentFieldValue(document_id=docs[3].id, field_name="objeto", field_label="Objeto", raw_value="obra civil"))
+    db.commit()
+    return project.id, [d.id for d in docs]
+
+
+def test_fts_pages_are_consistent_and_match_ilike_semantics(db, monkeypatch):
+    project_id, ids = seed_many(db)
+    search = DocumentSearch()
+
+    everything = search.search(db, project_id, "contrato obra", limit=100)
+    paged = []
+    for offset in range(0, 12, 3):
+        paged += search.search(db, project_id, "contrato obra", limit=3, offset=offset)
+    assert [h["document_id"] for h in paged] == [h["document_id"] for h in everything]
+    scores = [h["score"] for h in everything]
+    assert scores == sorted(scores, reverse=True)
+
+    # Both paths: every word in the text, or every word in one field. Doc 3 has
+    # "contrato" in its text and "obra" only in a field, so neither matches it
+    expected = {ids[i] for i in range(12) if i % 3} | {ids[0]}
+    assert {h["document_id"] for h in everything} == expected
+    without_index(monkeypatch)
+    assert {h["document_id"] for h in search.search(db, project_id, "contrato obra", limit=100)} == expected
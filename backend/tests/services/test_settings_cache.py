@@ -0,0 +1,41 @@
+from sqlalchemy import event
+
+from app.models.extractor import ExtractorSetting
+from app.services.ai.settings_cache import SettingsCache
+
+
+def test_settings_are_loaded_once_and_reloaded_after_invalidate(db, sql_statements, monkeypatch):
+    monkeypatch.setenv("AZURE_DI_ENDPOINT", "https://env.example.com")
+    db.add_all([ExtractorSetting(key="openai_api_key", value="sk-db"), ExtractorSetting(key="azure_di_key", value="")])
+    db.commit()
+
+    sql_statements.clear()
+
+    cache = SettingsCache(ttl_seconds=60)
+    assert cache.get(db, "openai_api_key") == "sk-db"
+    assert cache.get(db, "azure_di_endpoint") == "https://env.example.com"
+    assert cache.get(db, "azure_di_key") == ""
+    assert len(sql_statements) == 1
+
+    db.query(ExtractorSetting).filter(ExtractorSetting.key == "openai_api_key").update({"value": "sk-new"})
+    db.commit()
+    assert cache.get(db, "openai_api_key") == "sk-db"
+    cache.invalidate()
+    assert cache.get(db, "openai_api_key") == "sk-new"
+
+
+def test_load_started_before_invalidate_is_not_kept(db):
+    db.add(ExtractorSetting(key="openai_api_key", value="sk-old"))
+    db.commit()
+    cache = SettingsCache(ttl_seconds=60)
+
+    calls = []
+
+    def invalidate_during_load(conn, cursor, statement, *args):
+        if not calls:
+            calls.append(statement)
+            cache.invalidate()
+
+    event.listen(db.get_bind(), "before_cursor_execute", invalidate_during_load)
+    assert cache.get(db, "openai_api_key") == "sk-old"
+    assert cache._values is None
@@ -0,0 +1,80 @@
+import io
+import os
+
+import pytest
+from docx import Document
+from docxtpl import DocxTemplate
+from jinja2 import TemplateSyntaxError
+
+from app.services.template_cache import TemplateCache
+
+
+def make_template(path, body_text, header_text=None):
+    doc = Document()
+    if header_text:
+        doc.sections[0].header.paragraphs[0].text = header_text
+    doc.add_paragraph(body_text)
+    doc.save(path)
+
+
+def render_text(tpl, context):
+    tpl.render(context)
+    out = io.BytesIO()
+    tpl.save(out)
+    out.seek(0)
+    rendered = Document(out)
+    body = "\n".join(p.text for p in rendered.paragraphs)
+    header = "\n".join(p.text for p in rendered.sections[0].header.paragraphs)
+    return body, header
+
+
+def test_template_cache_renders_independent_clones(tmp_path):
+    path = str(tmp_path / "tpl.docx")
+    make_template(path, "Hola {{ name }}", header_text="Ref {{ ref }}")
+    cache = TemplateCache(max_entries=4)
+
+    body1, header1 = render_text(cache.get(1, path), {"name": "Ana", "ref": "A-1"})
+    body2, header2 = render_text(cache.get(1, path), {"name": "Luis", "ref": "B-2"})
+
+    assert body1 == "Hola Ana" and header1 == "Ref A-1"
+    assert body2 == "Hola Luis" and header2 == "Ref B-2"
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_template_cache_invalidates_on_change_and_evicts(tmp_path):
+    path = str(tmp_path / "tpl.docx")
+    make_template(path, "Version uno {{ x }}")
+    cache = TemplateCache(max_entries=1)
+    cache.get(1, path)
+
+    make_template(path, "Version dos {{ x }}")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    body, _ = render_text(cache.get(1, path), {"x": "!"})
+    assert body == "Version dos !"
+    assert cache.stats()["misses"] == 2
+
+    other = str(tmp_path / "other.docx")
+    make_template(other, "Otra {{ x }}")
+    cache.get(2, other)
+    assert cache.stats()["entries"] == 1
+    cache.get(1, path)
+    assert cache.stats()["misses"] == 4
+
+
+def test_template_errors_keep_docx_context(tmp_path):
+    path = str(tmp_path / "broken.docx")
+    make_template(path, "Hola {{ name }}")
+    doc = Document(path)
+    doc.add_paragraph("{% if %}roto{% endif %}")
+    doc.save(path)
+
+    with pytest.raises(TemplateSyntaxError) as plain:
+        DocxTemplate(path).render({})
+    with pytest.raises(TemplateSyntaxError) as cached:
+        TemplateCache(max_entries=1).get(1, path)
+
+    # Same lines docxtpl reports, with the offending paragraph among them
+    assert list(cached.value.docx_context) == list(plain.value.docx_context)
+    assert any("{% if %}roto" in line for line in cached.value.docx_context)
@@ -0,0 +1,48 @@
+from app import crud, schemas
+from app.services import user_cache as user_cache_module
+from app.services.user_cache import UserCache
+
+
+def test_cached_user_skips_query_and_update_invalidates(session_factory, sql_statements, monkeypatch):
+    cache = UserCache(max_entries=10, ttl=60)
+    monkeypatch.setattr(user_cache_module, "user_cache", cache)
+    monkeypatch.setattr(crud.crud_user, "user_cache", cache)
+
+    db = session_factory()
+    user_id = crud.user.create(db, obj_in=schemas.UserCreate(email="cache@example.com", password="pw")).id
+    db.close()
+
+    db = session_factory()
+    assert cache.get(db, str(user_id)).email == "cache@example.com"
+    db.close()
+
+    db = session_factory()
+    sql_statements.clear()
+    user = cache.get(db, str(user_id))
+    assert sql_statements == []
+    assert user.email == "cache@example.com" and user in db
+
+    crud.user.update(db, db_obj=user, obj_in={"full_name": "Renamed"})
+    db.close()
+
+    db = session_factory()
+    assert cache.get(db, str(user_id)).full_name == "Renamed"
+    db.close()
+
+
+def test_entries_expire_and_are_bounded(session_factory):
+    db = session_factory()
+    ids = [
+        crud.user.create(db, obj_in=schemas.UserCreate(email=f"u{i}@example.com", password="pw")).id
+        for i in range(3)
+    ]
+
+    cache = UserCache(max_entries=2, ttl=60)
+    for user_id in ids:
+        cache.get(db, user_id)
+    assert list(cache._entries) == [str(i) for i in ids[1:]]
+
+    expired = UserCache(max_entries=2, ttl=0)
+    expired.get(db, ids[0])
+    assert not expired._entries
+    db.close()
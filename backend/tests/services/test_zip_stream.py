@@ -0,0 +1,45 @@
+import io
+import threading
+import time
+import zipfile
+
+from app.services import zip_stream
+from app.services.zip_stream import prefetch, stream_zip
+
+
+def test_stream_zip_yields_entries_before_central_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(zip_stream.settings, "EXPORT_CHUNK_BYTES", 1024)
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.pdf"
+        path.write_bytes(bytes([i]) * 5000)
+        paths.append(str(path))
+
+    chunks = list(stream_zip([("a.pdf", paths[0]), ("skipped.pdf", None), ("b.pdf", paths[1]), ("c.pdf", paths[2])]))
+
+    assert len(chunks) > 3
+    assert all(len(c) <= 1024 + 200 for c in chunks[:-1])
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["a.pdf", "b.pdf", "c.pdf"]
+        assert archive.read("c.pdf") == bytes([2]) * 5000
+
+
+def test_prefetch_keeps_order_and_bounds_work_in_flight():
+    lock = threading.Lock()
+    started = []
+
+    def convert(item):
+        with lock:
+            started.append(item)
+        time.sleep(0.01 * (item % 3))
+        return item * 10
+
+    results = prefetch(convert, range(20), workers=2)
+    first = next(results)
+    time.sleep(0.05)
+
+    assert first == (0, 0)
+    # Nothing beyond the look-ahead window is converted while the consumer waits
+    assert len(started) <= 5
+    assert list(results) == [(i, i * 10) for i in range(1, 20)]
@@ -0,0 +1,31 @@
+import api from './client'
+
+const SUMMARY_PAGE_SIZE = 1000
+
+const summaryUrl = (projectId) => `/extractor/projects/${projectId}/documents/summary`
+
+export const extractorAPI = {
+    // One page of the document summary plus the total from X-Total-Count
+    getSummaryPage: async (projectId, params = {}) => {
+        const res = await api.get(summaryUrl(projectId), { params })
+        return { items: res.data, total: Number(res.headers['x-total-count'] ?? res.data.length) }
+    },
+
+    // Every document of the project, fetched page by page until X-Total-Count
+    getAllSummaries: async (projectId, params = {}) => {
+        const items = []
+        for (;;) {
+            const page = await extractorAPI.getSummaryPage(projectId, {
+                ...params, skip: items.length, limit: SUMMARY_PAGE_SIZE,
+            })
+            items.push(...page.items)
+            if (page.items.length === 0 || items.length >= page.total) return items
+        }
+    },
+
+    // Only the count: a single row is requested and X-Total-Count is read
+    countDocuments: async (projectId, params = {}) => {
+        const page = await extractorAPI.getSummaryPage(projectId, { ...params, limit: 1 })
+        return page.total
+    },
+}
@@ -18,5 +18,6 @@ export const templatesAPI = {
     downloadBatchTemplate: (id) => api.get(`/templates/${id}/batch-template`, { responseType: 'blob' }),
     batchGenerate: (id, formData) => api.post(`/templates/${id}/batch-generate`, formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
-    })
+    }),
+    getBatchJob: (id, jobId) => api.get(`/templates/${id}/batch-generate/${jobId}`)
 }
@@ -31,6 +31,8 @@ const ProjectWizard = ({ onClose, onCreated }) => {
     llm_extract_model: 'gpt-4o',
     root_folder: '', file_mode: 'analyze',
     confidence_threshold: 0.7,
+    llm_cache_enabled: true,
+    local_classify_threshold: 0.9,
   });
 
   const update = (key, value) => setData(prev => ({ ...prev, [key]: value }));
@@ -237,6 +239,27 @@ const ProjectWizard = ({ onClose, onCreated }) => {
                   Clasificaciones por debajo de este umbral irán a revisión humana
                 </p>
               </div>
+
+              <div>
+                <label className="label-ei">
+                  Clasificación local sin IA desde: {Math.round(data.local_classify_threshold * 100)}%
+                </label>
+                <input type="range" min={50} max={105} step={5}
+                       value={data.local_classify_threshold * 100}
+                       onChange={e => update('local_classify_threshold', parseInt(e.target.value) / 100)}
+                       className="w-full accent-blue-500" />
+                <p className="text-xs mt-1" style={{ color: 'var(--ei-text-muted)' }}>
+                  Por palabras clave y documentos aprobados; por encima de 100% siempre se usa la IA
+                </p>
+              </div>
+
+              <label className="flex items-center gap-2 text-xs" style={{ color: 'var(--ei-text-primary)' }}>
+                <input type="checkbox"
+                       checked={data.llm_cache_enabled}
+                       onChange={e => update('llm_cache_enabled', e.target.checked)}
+                       className="accent-blue-500" />
+                Reutilizar respuestas de IA en reprocesos (caché)
+              </label>
             </div>
           )}
 
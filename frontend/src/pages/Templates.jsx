@@ -36,6 +36,7 @@ function Templates() {
     const [batchFile, setBatchFile] = useState(null)
     const [batchLoading, setBatchLoading] = useState(false)
     const [batchResults, setBatchResults] = useState(null)
+    const [batchProgress, setBatchProgress] = useState(null)
 
     useEffect(() => {
         loadTemplates()
@@ -506,18 +507,32 @@ function Templates() {
                                                     const formData = new FormData()
                                                     formData.append('file', batchFile)
                                                     const response = await templatesAPI.batchGenerate(batchTarget.id, formData)
-                                                    setBatchResults(response.data)
-                                                    toast.success("Proceso completado")
+                                                    let job = response.data
+                                                    setBatchProgress(job)
+                                                    while (job.status === 'queued' || job.status === 'running') {
+                                                        await new Promise(resolve => setTimeout(resolve, 1000))
+                                                        job = (await templatesAPI.getBatchJob(batchTarget.id, job.job_id)).data
+                                                        setBatchProgress(job)
+                                                    }
+                                                    if (job.status === 'failed') {
+                                                        toast.error(job.detail || "Error en la generación masiva")
+                                                    } else {
+                                                        setBatchResults(job)
+                                                        toast.success("Proceso completado")
+                                                    }
                                                 } catch (e) {
                                                     console.error(e)
                                                     const errorMsg = e.response?.data?.detail || "Error en la generación masiva"
                                                     toast.error(errorMsg)
                                                 } finally {
                                                     setBatchLoading(false)
+                                                    setBatchProgress(null)
                                                 }
                                             }}
                                         >
-                                            {batchLoading ? 'Procesando...' : '🚀 Generar Documentos'}
+                                            {batchLoading
+                                                ? (batchProgress ? `Procesando... ${batchProgress.processed}/${batchProgress.total}` : 'Procesando...')
+                                                : '🚀 Generar Documentos'}
                                         </button>
                                     </div>
                                 </>
@@ -6,6 +6,7 @@ import {
   CheckCircle, AlertCircle, Clock, Trash2, RotateCw
 } from 'lucide-react';
 import api from '../../api/client';
+import { extractorAPI } from '../../api/extractor';
 import { useToast } from '../../context/ToastContext';
 
 const DocumentExplorer = () => {
@@ -27,10 +28,10 @@ const DocumentExplorer = () => {
   const fetchData = async () => {
     try {
       const [docsRes, typesRes] = await Promise.all([
-        api.get(`/extractor/projects/${projectId}/documents`),
+        extractorAPI.getAllSummaries(projectId),
         api.get(`/extractor/projects/${projectId}/types`),
       ]);
-      setDocs(docsRes.data);
+      setDocs(docsRes);
       setDocTypes(typesRes.data);
     } catch (err) {
       toast.error('Error al cargar documentos');
@@ -5,6 +5,7 @@ import {
   CheckCircle, Filter, AlertCircle, Loader2
 } from 'lucide-react';
 import api from '../../api/client';
+import { extractorAPI } from '../../api/extractor';
 import { useToast } from '../../context/ToastContext';
 
 const ExportResults = () => {
@@ -22,9 +23,10 @@ const ExportResults = () => {
 
   const fetchStats = async () => {
     try {
-      const res = await api.get(`/extractor/projects/${projectId}/documents`);
-      const total = res.data.length;
-      const approved = res.data.filter(d => d.review_status === 'approved').length;
+      const [total, approved] = await Promise.all([
+        extractorAPI.countDocuments(projectId),
+        extractorAPI.countDocuments(projectId, { review_status: 'approved' }),
+      ]);
       setStats({ total, approved });
     } catch {
       toast.error('Error al cargar estadísticas de exportación');
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import api from '../../api/client';
+import { extractorAPI } from '../../api/extractor';
 import { 
   FileText, Inbox, Database, ShieldAlert, BarChart2,
   AlertCircle, CheckCircle2, Clock, Upload, ChevronRight, FolderOpen, RotateCw, Loader2
@@ -31,7 +32,7 @@ const ProjectDetail = () => {
     try {
       const [projRes, docsRes, rulesRes] = await Promise.all([
         api.get(`/extractor/projects/${projectId}`),
-        api.get(`/extractor/projects/${projectId}/documents`),
+        extractorAPI.getAllSummaries(projectId),
         api.get(`/extractor/projects/${projectId}/rules`)
       ]);
       
@@ -39,8 +40,8 @@ const ProjectDetail = () => {
         setProject(projRes.data);
       }
       
-      if (docsRes && docsRes.data) {
-        updateStats(docsRes.data);
+      if (docsRes) {
+        updateStats(docsRes);
       }
 
       if (rulesRes && Array.isArray(rulesRes.data)) {
@@ -172,8 +173,7 @@ const ProjectDetail = () => {
   const startPolling = () => {
     const interval = setInterval(async () => {
         try {
-            const res = await api.get(`/extractor/projects/${projectId}/documents`);
-            const docs = res.data;
+            const docs = await extractorAPI.getAllSummaries(projectId);
             updateStats(docs);
             
             const processing = docs.filter(d => d.status === 'processing');